@@ -9,12 +9,13 @@ from flask import Flask, jsonify, request, make_response
 from flask_cors import CORS
 from bson.json_util import dumps
 
+from scraper.constant import RECIPE_PROJECTION
 from scraper.database import Database, ALL_RECIPES, FAVOURITES
 from scraper.scraper import scrape_food_recipe_page, get_starting_url_soup
 
 from api.utils import is_content_type_json, is_dict_value_type_valid
-from api.query import query, MALFORMED_QUERY_STRING, OBJECT_NOT_EXIST, OBJECT_NOT_MATCH, \
-    FIELD_NOT_EXIST, VALUE_TYPE_ERROR, OPERATOR_NOT_APPLICABLE
+from api.query import search_page, MALFORMED_QUERY_STRING, OBJECT_NOT_EXIST, OBJECT_NOT_MATCH, \
+    FIELD_NOT_EXIST, VALUE_TYPE_ERROR, OPERATOR_NOT_APPLICABLE, INVALID_PAGE
 
 app = Flask(__name__)
 CORS(app)
@@ -76,9 +77,10 @@ def get_recipe_by_id(id_input, table_type):
     # try to get recipes by id
     recipe_doc = None
     if table_type == ALL_RECIPES:
-        recipe_doc = mongo_db.all_recipes_tb.find_one({'id': recipe_id}, {'_id': 0})
+        recipe_doc = mongo_db.all_recipes_tb.find_one({'id': recipe_id}, RECIPE_PROJECTION)
     if table_type == FAVOURITES:
-        recipe_doc = mongo_db.favourites_tb.find_one({'id': recipe_id}, {'_id': 0})
+        # favourite merged with the recipe it refers to
+        recipe_doc = mongo_db.get_favourite(recipe_id)
     # no recipe is found, return with error
     if not recipe_doc:
         return proceed_to_output({'GET error': f'Recipes with id {recipe_id} is not found'},
@@ -89,15 +91,20 @@ def get_recipe_by_id(id_input, table_type):
     return proceed_to_output(recipe_dict, OK, is_to_web)
 
 
-# http://127.0.0.1:5000/api/search?q={query_string} Example: /search?q=all.id:123
+# http://127.0.0.1:5000/api/search?q={query_string}&limit={limit}&sort={sort}&cursor={cursor}
+# Example: /search?q=all.name:&limit=10&sort=-popularity
 @app.route('/api/search', methods=['GET'])
-def get_by_query(query_string_input=DEFAULT_INPUT):
+def get_by_query(query_string_input=DEFAULT_INPUT, limit=None, sort=None, cursor=None):
     """
-    Get search results based on the specified query string.
+    Get a page of search results based on the specified query string, with has_more,
+    and the cursor to pass to get the next page.
     Errors should be reported if invalid search query.
 
     Parameters:
     query_string_input (str): query string for api given from local
+    limit (str): max number of results given from local
+    sort (str): sort of the results given from local, e.g. -popularity for descending
+    cursor (str): cursor of the page given from local
     """
     # get query string and determine the output method: to web or to local
     is_to_web = True
@@ -106,8 +113,11 @@ def get_by_query(query_string_input=DEFAULT_INPUT):
         is_to_web = False
     else:
         query_string = request.args.get('q')
-    # Parse and execute query string and get result documents
-    documents = query(query_string, mongo_db)
+        limit = request.args.get('limit')
+        sort = request.args.get('sort')
+        cursor = request.args.get('cursor')
+    # Parse and execute query string and get a page of result documents
+    documents = search_page(query_string, mongo_db, limit, sort, cursor)
     # Handle all the errors
     if documents is None:
         return proceed_to_output({'GET error': 'Result is not found in database'},
@@ -129,14 +139,16 @@ def get_by_query(query_string_input=DEFAULT_INPUT):
     if documents == OPERATOR_NOT_APPLICABLE:
         return proceed_to_output({'GET error': 'Comparison operators not applicable for string'},
                                  BAD_REQUEST, is_to_web)
-    if documents.count() == 0:
+    if documents == INVALID_PAGE:
+        return proceed_to_output({'GET error': 'Limit, sort or cursor is not valid'},
+                                 BAD_REQUEST, is_to_web)
+    # Process output
+    res = json.loads(dumps(documents['results']))
+    # a page after the first one may be empty if the results after it were deleted
+    if not res and cursor is None:
         return proceed_to_output({'GET error': 'Result is not found in database'},
                                  NOT_FOUND, is_to_web)
-    # Process output
-    res = []
-    for doc in documents:
-        res.append(json.loads(dumps(doc)))
-    return proceed_to_output(res, OK, is_to_web)
+    return proceed_to_output(dict(documents, results=res), OK, is_to_web)
 
 
 # http://127.0.0.1:5000/api/food?id={attr_value}
@@ -192,16 +204,6 @@ def put_recipe_by_id(id_input, json_file_input, table_type):
                                  is_to_web)
     recipe_id = arg
 
-    # try to find recipe by id from table
-    recipe_doc = None
-    if table_type == ALL_RECIPES:
-        recipe_doc = mongo_db.all_recipes_tb.find_one({'id': recipe_id}, {'_id': 0})
-    if table_type == FAVOURITES:
-        recipe_doc = mongo_db.favourites_tb.find_one({'id': recipe_id}, {'_id': 0})
-    # recipe with id is not found, return with error
-    if not recipe_doc:
-        return proceed_to_output({'PUT error': f'Recipe with id {recipe_id} is not found'},
-                                 NOT_FOUND, is_to_web)
     # Load json content from correct position
     if json_file_input != DEFAULT_INPUT:
         with open(json_file_input, 'r') as file:
@@ -226,8 +228,11 @@ def put_recipe_by_id(id_input, json_file_input, table_type):
         return proceed_to_output({'JSON value type error': 'Incorrect value type in json'},
                                  BAD_REQUEST, is_to_web)
     recipe_dict['id'] = recipe_id
-    # update the table
-    mongo_db.update_on_tb(recipe_dict, table_type)
+    # update the table in one round trip, which also finds whether the recipe exists
+    if not mongo_db.update_on_tb(recipe_dict, table_type):
+        # recipe with id is not found, return with error
+        return proceed_to_output({'PUT error': f'Recipe with id {recipe_id} is not found'},
+                                 NOT_FOUND, is_to_web)
     return proceed_to_output({'PUT success': f'Recipe with id {recipe_id} is updated'}, OK,
                              is_to_web)
 
@@ -306,20 +311,13 @@ def post_recipe(json_file_input, table_type):
         # If 'id' is empty, error
         response_dict['POST input error'] = 'Invalid recipe id'
         return proceed_to_output(response_dict, BAD_REQUEST, to_web)
-    if table_type == ALL_RECIPES:
-        if mongo_db.is_recipe_exists_in_tb(recipe_dict, ALL_RECIPES):
-            # If value of 'id' already exists, error
-            response_dict['POST input error'] = f'Recipe with id {recipe_id} already exists ' \
-                                                f'in all recipes table'
-            return proceed_to_output(response_dict, BAD_REQUEST, to_web)
-    if table_type == FAVOURITES:
-        if mongo_db.is_recipe_exists_in_tb(recipe_dict, FAVOURITES):
-            # If value of 'id' already exists, error
-            response_dict['POST input error'] = f'Recipe with id {recipe_id} already exists ' \
-                                                f'in favourite recipes table'
-            return proceed_to_output(response_dict, BAD_REQUEST, to_web)
-    # insert recipe into specified table
-    mongo_db.insert_into_tb(recipe_dict, table_type)
+    # insert recipe into specified table in one round trip, unless its id already exists
+    if not mongo_db.insert_into_tb(recipe_dict, table_type):
+        # If value of 'id' already exists, error
+        table_name = 'all recipes' if table_type == ALL_RECIPES else 'favourite recipes'
+        response_dict['POST input error'] = f'Recipe with id {recipe_id} already exists ' \
+                                            f'in {table_name} table'
+        return proceed_to_output(response_dict, BAD_REQUEST, to_web)
     response_dict['POST success'] = f'Recipe with id {recipe_id} is inserted'
     return proceed_to_output(response_dict, OK, to_web)
 
@@ -346,20 +344,20 @@ def post_scrape(url_input=DEFAULT_INPUT):
     url_str = arg
     # ready for service
     response_dict = {}
-    if get_starting_url_soup(url_str):
-        # url given is valid, scrape recipe page
-        recipe_dict = scrape_food_recipe_page(url_str)
+    soup = get_starting_url_soup(url_str)
+    if soup:
+        # url given is valid, scrape recipe page without fetching it again
+        recipe_dict = scrape_food_recipe_page(url_str, soup)
         if not recipe_dict:
             # recipe scrape error
             response_dict['POST scrape error'] = 'Recipe url given cannot be scraped'
             return proceed_to_output(response_dict, NOT_FOUND, to_web)
         recipe_id = recipe_dict['id']
-        if mongo_db.is_recipe_exists_in_tb(recipe_dict, ALL_RECIPES):
+        # insert into all recipes table, unless its id already exists
+        if not mongo_db.insert_into_tb(recipe_dict, ALL_RECIPES):
             # recipe with id already exists, cannot insert
             response_dict['POST input error'] = f'Recipe with id {recipe_id} already exists'
             return proceed_to_output(response_dict, BAD_REQUEST, to_web)
-        # insert into all recipes table
-        mongo_db.insert_into_tb(recipe_dict, ALL_RECIPES)
         response_dict['POST success'] = f'Recipe with id {recipe_id} is inserted'
     else:
         # url invalid
@@ -416,16 +414,16 @@ def delete_recipe_by_id(id_input, table_type):
     recipe_id = arg
     # try to find recipe by id
     if table_type == ALL_RECIPES:
-        recipe_doc = mongo_db.all_recipes_tb.find_one({'id': recipe_id}, {'_id': 0})
+        recipe_doc = mongo_db.all_recipes_tb.find_one({'id': recipe_id}, RECIPE_PROJECTION)
     if table_type == FAVOURITES:
-        recipe_doc = mongo_db.favourites_tb.find_one({'id': recipe_id}, {'_id': 0})
+        recipe_doc = mongo_db.favourites_tb.find_one({'id': recipe_id}, RECIPE_PROJECTION)
     # recipe does not exist
     if not recipe_doc:
         return proceed_to_output({'DELETE error': f'Recipe with id {recipe_id} is not found'},
                                  NOT_FOUND, is_to_web)
-    # delete recipe with id
+    # delete recipe with id, a favourite of it keeps its content
     if table_type == ALL_RECIPES:
-        mongo_db.all_recipes_tb.delete_one({'id': recipe_id})
+        mongo_db.delete_recipe(recipe_id)
     if table_type == FAVOURITES:
         mongo_db.favourites_tb.delete_one({'id': recipe_id})
     return proceed_to_output({'DELETE success': f'Recipe with id {recipe_id} is deleted'}, OK,
@@ -448,4 +446,5 @@ def proceed_to_output(response, status, is_to_web):
 
 
 if __name__ == '__main__':
+    mongo_db.ensure_indexes()
     app.run(debug=True)
@@ -4,12 +4,40 @@ Program supports the following query string:
 . operator to specify a field of an object. For example, all.prep time
 : operator to specify if a field contains search words. For example, all.prep time:20
 AND, OR, and NOT logical operators. For example, all.prep time: NOT 10 AND all.cook time: 40
+NOT binds tighter than AND, which binds tighter than OR, parentheses group conditions.
+NOT before a condition or a group negates it. For example, NOT (all.name: cake OR all.name: pie)
 One-side unbounded comparison operators >, <. For example, all.cook time: > 30
+Two-side range BETWEEN, bounds included. For example, all.cook time: BETWEEN 10 AND 30
+Name, description, ingredients and instructions are searched by words, in any order,
+a word matches the words it begins, e.g. all.name: chick bake matches Baked Chicken.
+Field text searches the words in all of them. For example, all.text: tomato soup
+Query strings are parsed into a Query of Condition, validated once, then compiled into
+a single mongoDB filter. Compiled filters are kept in QUERY_CACHE by query string.
+Recipes found by words are ranked by relevance, the most relevant first.
+Results are read in pages by search_page, sorted by id, a numeric attribute or relevance.
+Each page ends with an opaque cursor holding the sort key of its last result,
+the next page is sought from it, so reading a page costs the same wherever it is.
+Relevance is not stored, so a page sorted by it ranks at most SEARCH_RANK_CANDIDATES recipes.
 """
-from scraper.database import ATTRIBUTES
+import base64
+import binascii
+import collections
+import heapq
+import json
+import re
+import threading
+
+import pymongo
+
+from scraper.constant import RECIPE_PROJECTION, QUERY_CACHE_SIZE, TEXT_ATTRIBUTES, \
+    SEARCH_TERMS_FIELDS, SEARCH_PAGE_SIZE, SEARCH_MAX_LIMIT, SEARCH_RANK_CANDIDATES
+from scraper.database import ATTRIBUTES, NUMERIC_ATTRIBUTES
+from scraper.text_search import search_terms_of, terms_field_of, prefix_range_of, relevance_of
 
 ALL_RECIPES_STR = 'all'
 FAVOURITE_RECIPES_STR = 'fav'
+# field searching the words of all TEXT_ATTRIBUTES
+TEXT_FIELD = 'text'
 LOGICAL_OPERATORS = ['AND', 'OR']
 LOGICAL_OPERATOR_SIGNS = ['$and', '$or']
 COMPARISON_OPERATORS = ['<', '>']
@@ -25,92 +53,622 @@ OBJECT_NOT_MATCH = -3
 FIELD_NOT_EXIST = -4
 VALUE_TYPE_ERROR = -5
 OPERATOR_NOT_APPLICABLE = -6
+INVALID_PAGE = -7
+# operators of a Condition other than COMPARISON_OPERATOR_SIGNS
+CONTAINS = 'contains'
+EQUALS = 'equals'
+SEARCH = 'search'
+NOT_EQUALS = 'not equals'
+BETWEEN = 'between'
+# AND or OR followed by the start of a condition or a group, spaces around them are optional
+LOGICAL_OPERATOR_PATTERN = re.compile(
+    r'(AND|OR)(?=\s*(?:NOT[\s(]|\(\s*(?:NOT[\s(]|\(|[^\s.:()]+\s*\.)|[^\s.:()]+\s*\.[^:]*:))')
+# characters where a condition may end
+CONDITION_END_PATTERN = re.compile(r'[()]|AND|OR')
+# NOT negating the condition or group after it
+NOT_PATTERN = re.compile(r'NOT(?=[\s(])')
+BETWEEN_PATTERN = re.compile(r'BETWEEN\s+(\S+)\s+AND\s+(\S+)')
+# sorts of search results: relevance, the most relevant first, or a field of SORT_FIELDS,
+# descending if written after DESCENDING_SIGN, e.g. -popularity
+RELEVANCE = 'relevance'
+SORT_FIELDS = {'id'} | NUMERIC_ATTRIBUTES
+DESCENDING_SIGN = '-'
+# projection of recipes found by words, with the search terms to rank them by
+SEARCH_PROJECTION = {field: flag for field, flag in RECIPE_PROJECTION.items()
+                     if field not in SEARCH_TERMS_FIELDS}
+
+
+class Condition:
+    """
+    Condition on one field of a query string, e.g. cook time: > 30.
+    The value is of the type stored in the field: int for NUMERIC_ATTRIBUTES, str otherwise.
+    """
+
+    def __init__(self, field, operator, value):
+        """
+        Parameters:
+        field (str): field of the recipes
+        operator (str): CONTAINS, SEARCH, EQUALS, NOT_EQUALS, BETWEEN
+            or one of COMPARISON_OPERATOR_SIGNS
+        value (int, str or tuple): value the field is compared to, (low, high) for BETWEEN,
+            the words searched for SEARCH
+        """
+        self.field = field
+        self.operator = operator
+        self.value = value
+
+    def compile(self):
+        """
+        Get the mongoDB filter of the condition
+        """
+        if self.operator == EQUALS:
+            return {self.field: self.value}
+        if self.operator == NOT_EQUALS:
+            return {self.field: {'$ne': self.value}}
+        if self.operator in COMPARISON_OPERATOR_SIGNS:
+            if self.field in NUMERIC_ATTRIBUTES:
+                # a range on the stored int, which the index of the field serves
+                return {self.field: {self.operator: self.value}}
+            return {'$expr': {self.operator: [{'$toInt': f'${self.field}'}, self.value]}}
+        if self.operator == BETWEEN:
+            low, high = self.value
+            if self.field in NUMERIC_ATTRIBUTES:
+                return {self.field: {'$gte': low, '$lte': high}}
+            return {'$expr': {'$and': [{'$gte': [{'$toInt': f'${self.field}'}, low]},
+                                       {'$lte': [{'$toInt': f'${self.field}'}, high]}]}}
+        if self.operator == SEARCH:
+            return self.compile_search()
+        # search for contain, characters of the content are not special
+        return {self.field: {'$regex': '.*' + re.escape(self.value) + '.*'}}
+
+    def compile_search(self):
+        """
+        Get the mongoDB filter of a search by words: every term of the words is the prefix
+        of a term of the field, looked up in the index of its terms field.
+        Content with no term, e.g. only stop words, is searched as contained.
+        """
+        attributes = TEXT_ATTRIBUTES if self.field == TEXT_FIELD else (self.field,)
+        terms = search_terms_of(self.value)
+        if not terms:
+            regex = {'$regex': '.*' + re.escape(self.value) + '.*'}
+            return join_filters('$or', [{attribute: regex} for attribute in attributes])
+        return join_filters('$and', [
+            join_filters('$or', [{terms_field_of(attribute): {'$elemMatch': prefix_range_of(term)}}
+                                 for attribute in attributes])
+            for term in terms])
+
+    def __eq__(self, other):
+        return isinstance(other, Condition) and (self.field, self.operator, self.value) \
+            == (other.field, other.operator, other.value)
+
+    def __repr__(self):
+        return f'Condition({self.field!r}, {self.operator!r}, {self.value!r})'
+
+
+def join_filters(operator, filters):
+    """
+    Join mongoDB filters by $and or $or, a single filter is returned as it is
+    """
+    if len(filters) == 1:
+        return filters[0]
+    return {operator: filters}
+
+
+class LogicalExpression:
+    """
+    Conditions or expressions joined by AND or OR
+    """
+
+    def __init__(self, operator, operands):
+        """
+        Parameters:
+        operator (str): one of LOGICAL_OPERATOR_SIGNS
+        operands (list): Condition, LogicalExpression or Negation joined
+        """
+        self.operator = operator
+        self.operands = operands
+
+    def compile(self):
+        """
+        Get the mongoDB filter of the expression
+        """
+        return {self.operator: [operand.compile() for operand in self.operands]}
+
+    def __eq__(self, other):
+        return isinstance(other, LogicalExpression) \
+            and (self.operator, self.operands) == (other.operator, other.operands)
+
+    def __repr__(self):
+        return f'LogicalExpression({self.operator!r}, {self.operands!r})'
+
+
+class Negation:
+    """
+    Negation of a condition or an expression by NOT
+    """
+
+    def __init__(self, operand):
+        """
+        Parameters:
+        operand: Condition, LogicalExpression or Negation negated
+        """
+        self.operand = operand
+
+    def compile(self):
+        """
+        Get the mongoDB filter of the negation, mongoDB has no top level $not
+        """
+        return {'$nor': [self.operand.compile()]}
+
+    def __eq__(self, other):
+        return isinstance(other, Negation) and self.operand == other.operand
+
+    def __repr__(self):
+        return f'Negation({self.operand!r})'
+
+
+class Query:
+    """
+    Parsed query string: the object searched, and the expression of its conditions
+    """
+
+    def __init__(self, obj, expression):
+        """
+        Parameters:
+        obj (str): ALL_RECIPES_STR or FAVOURITE_RECIPES_STR
+        expression: Condition, LogicalExpression or Negation
+        """
+        self.obj = obj
+        self.expression = expression
+
+    def compile(self):
+        """
+        Get the object and the mongoDB filter of the query
+        """
+        return self.obj, self.expression.compile()
+
+    def __eq__(self, other):
+        return isinstance(other, Query) \
+            and (self.obj, self.expression) == (other.obj, other.expression)
+
+    def __repr__(self):
+        return f'Query({self.obj!r}, {self.expression!r})'
+
+
+class QueryStringParser:
+    """
+    Recursive descent parser of a query string, by the grammar:
+    expression = and_expression ('OR' and_expression)*
+    and_expression = not_expression ('AND' not_expression)*
+    not_expression = 'NOT' not_expression | '(' expression ')' | condition
+    condition = obj '.' field ':' content
+    Errors are returned as the error values of this module.
+    """
+
+    def __init__(self, query_string):
+        """
+        Parameters:
+        query_string (str): query string for search
+        """
+        self.query_string = query_string
+        self.position = 0
+        self.obj = ''
+
+    def parse(self):
+        """
+        Get the Query of the whole query string, or the first error found
+        """
+        expression = self.parse_expression()
+        if is_error_occur(expression):
+            return expression
+        self.skip_spaces()
+        if self.position != len(self.query_string):
+            # a parenthesis closing no group
+            return MALFORMED_QUERY_STRING
+        return Query(self.obj, expression)
+
+    def parse_expression(self):
+        """
+        Parse conditions joined by OR, which binds the least
+        """
+        return self.parse_operands('OR', self.parse_and_expression)
+
+    def parse_and_expression(self):
+        """
+        Parse conditions joined by AND
+        """
+        return self.parse_operands('AND', self.parse_not_expression)
+
+    def parse_operands(self, logical_operator, parse_operand):
+        """
+        Parse operands joined by logical_operator, a single operand is returned as it is
+
+        Parameters:
+        logical_operator (str): one of LOGICAL_OPERATORS
+        parse_operand (function): method parsing one operand
+        """
+        operands = []
+        while True:
+            operand = parse_operand()
+            if is_error_occur(operand):
+                return operand
+            operands.append(operand)
+            self.skip_spaces()
+            found = LOGICAL_OPERATOR_PATTERN.match(self.query_string, self.position)
+            if not found or found.group(1) != logical_operator:
+                break
+            self.position = found.end()
+        if len(operands) == 1:
+            return operands[0]
+        return LogicalExpression(LOGICAL_OPERATOR_SIGNS[LOGICAL_OPERATORS.index(logical_operator)],
+                                 operands)
+
+    def parse_not_expression(self):
+        """
+        Parse a negation, a group in parentheses or a condition
+        """
+        self.skip_spaces()
+        found = NOT_PATTERN.match(self.query_string, self.position)
+        if found:
+            self.position = found.end()
+            operand = self.parse_not_expression()
+            if is_error_occur(operand):
+                return operand
+            return Negation(operand)
+        if self.query_string.startswith('(', self.position):
+            self.position += 1
+            expression = self.parse_expression()
+            if is_error_occur(expression):
+                return expression
+            self.skip_spaces()
+            if not self.query_string.startswith(')', self.position):
+                return MALFORMED_QUERY_STRING
+            self.position += 1
+            return expression
+        return self.parse_condition_string()
+
+    def parse_condition_string(self):
+        """
+        Parse the condition up to the next logical operator or parenthesis closing its group.
+        Parentheses in the content of the condition are kept if they are balanced.
+        """
+        start = self.position
+        end = len(self.query_string)
+        nesting = 0
+        for found in CONDITION_END_PATTERN.finditer(self.query_string, self.position):
+            if found.group() == '(':
+                nesting += 1
+            elif found.group() == ')':
+                if nesting == 0:
+                    end = found.start()
+                    break
+                nesting -= 1
+            elif LOGICAL_OPERATOR_PATTERN.match(self.query_string, found.start()):
+                end = found.start()
+                break
+        self.position = end
+        parsed = parse_term(self.query_string[start:end])
+        if is_error_occur(parsed):
+            return parsed
+        curr_obj, condition = parsed
+        # check if all obj part are the same, return OBJECT_NOT_MATCH error if not
+        if self.obj and self.obj != curr_obj:
+            return OBJECT_NOT_MATCH
+        self.obj = curr_obj
+        return condition
+
+    def skip_spaces(self):
+        while self.query_string[self.position:self.position + 1].isspace():
+            self.position += 1
+
+
+class QueryCache:
+    """
+    Least recently used cache of compiled queries by query string, with hit and miss counts.
+    Errors of invalid query strings are cached too. Safe to share between threads.
+    Filters are shared by every lookup of the same query string and must not be modified.
+    """
+
+    def __init__(self, max_size):
+        """
+        Parameters:
+        max_size (int): max number of query strings kept, 0 to not cache
+        """
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._compiled = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, query_string, compile_function):
+        """
+        Get the compiled query of query_string, compiled by compile_function if not cached
+
+        Parameters:
+        query_string (str): normalized query string
+        compile_function (function): function compiling a query string
+        """
+        with self._lock:
+            if query_string in self._compiled:
+                self.hits += 1
+                self._compiled.move_to_end(query_string)
+                return self._compiled[query_string]
+            self.misses += 1
+        compiled = compile_function(query_string)
+        if self.max_size > 0:
+            with self._lock:
+                self._compiled[query_string] = compiled
+                while len(self._compiled) > self.max_size:
+                    self._compiled.popitem(last=False)
+        return compiled
+
+    def stats(self):
+        """
+        Get the hits, misses and number of query strings cached
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._compiled)}
+
+    def clear(self):
+        """
+        Remove every compiled query and reset the counts
+        """
+        with self._lock:
+            self._compiled.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+QUERY_CACHE = QueryCache(QUERY_CACHE_SIZE)
 
 
 def query(query_string, mongo_db):
     """
     Query the database and return cursor according to the query.
+    Favourites are returned merged with the recipes they refer to.
     If error happens during the process, then related error is returned.
 
     Parameters:
     query_string (str): query string for search
     mongo_db (object): database object
     """
-    has_logical_operator = False
-    # check if query string contain logical operator
-    for operator in LOGICAL_OPERATORS:
-        if query_string.find(operator) != NOT_EXIST:
-            has_logical_operator = True
-    if has_logical_operator:
-        # need to first divide at AND/OR, then parse
-        res = divide_query_string_and_parse(query_string)
-    else:
-        # parse directly
-        res = parse_single_query(query_string)
+    res = compiled_query(query_string)
     # check error
     if is_error_occur(res):
         return res
     # process the query in table and return cursor
     query_obj, my_query = res
+    searches = searches_of(my_query)
+    projection = SEARCH_PROJECTION if searches else RECIPE_PROJECTION
     if query_obj == ALL_RECIPES_STR:
-        return mongo_db.all_recipes_tb.find(my_query, {'_id': 0})
-    return mongo_db.favourites_tb.find(my_query, {'_id': 0})
+        documents = mongo_db.all_recipes_tb.find(my_query, projection)
+    else:
+        documents = mongo_db.find_favourites(my_query, projection=projection)
+    if not searches:
+        return documents
+    return rank(documents, searches)
 
 
-def divide_query_string_and_parse(query_string):
+def search_page(query_string, mongo_db, limit=None, sort=None, cursor=None):
     """
-    Divide query string into two query at AND/OR.
-    Then parse the query separately.
-    Check error after calling each helper functions.
+    Get a page of the results of the query string, sorted by sort and by id for equal values.
+    The page starts after the result the cursor was made for, at the first result if None.
+    One result more than limit is read to know whether more pages follow, with no count.
+    Return a dict of the results, has_more, and the cursor of the next page, None if it is the last.
+    If error happens during the process, then related error is returned.
 
     Parameters:
     query_string (str): query string for search
+    mongo_db (object): database object
+    limit (str): max number of results, SEARCH_PAGE_SIZE if None
+    sort (str): a field of SORT_FIELDS, id if None, or RELEVANCE if words are searched
+    cursor (str): cursor of the page returned by the previous page
+    """
+    res = compiled_query(query_string)
+    if is_error_occur(res):
+        return res
+    query_obj, my_query = res
+    searches = searches_of(my_query)
+    page = parse_page(limit, sort, cursor, bool(searches))
+    if is_error_occur(page):
+        return page
+    limit, sort, after = page
+    if sort == RELEVANCE:
+        documents = ranked_page(query_obj, my_query, mongo_db, searches, limit + 1, after)
+    else:
+        field, direction = sort_of(sort)
+        keys = [(field, direction)] + ([('id', direction)] if field != 'id' else [])
+        if after:
+            my_query = {'$and': [my_query, after_filter(field, direction, *after)]}
+        if query_obj == ALL_RECIPES_STR:
+            documents = list(mongo_db.all_recipes_tb.find(my_query, RECIPE_PROJECTION)
+                             .sort(keys).limit(limit + 1))
+        else:
+            documents = list(mongo_db.find_favourites(my_query, sort=keys, limit=limit + 1))
+    has_more = len(documents) > limit
+    documents = documents[:limit]
+    next_cursor = None
+    if has_more:
+        last = documents[-1]
+        value = relevance_of(last, searches) if sort == RELEVANCE else last.get(sort_of(sort)[0])
+        next_cursor = cursor_of(sort, value, last.get('id'))
+    for document in documents:
+        for terms_field in SEARCH_TERMS_FIELDS:
+            document.pop(terms_field, None)
+    return {'results': documents, 'has_more': has_more, 'cursor': next_cursor}
+
+
+def parse_page(limit, sort, cursor, is_search):
+    """
+    Parse the limit, sort and cursor of a page, INVALID_PAGE is returned if one is not valid.
+    Return the limit as int, the sort and the sort key of the cursor, None if there is no cursor.
+
+    Parameters:
+    limit (str): max number of results, SEARCH_PAGE_SIZE if None
+    sort (str): sort of the results, id if None
+    cursor (str): cursor of the page
+    is_search (bool): whether the query searches words, which may be sorted by relevance
     """
-    for i, logical_operator in enumerate(LOGICAL_OPERATORS):
-        if query_string.find(logical_operator) != NOT_EXIST:
-            obj_to_query = ''
-            condition_list = []
-            query_list = query_string.split(logical_operator)
-            for curr_query in query_list:
-                curr_query = curr_query.strip()
-                # separate curr_query in str format obj.field:content into three parts
-                parts = parser(curr_query)
-                if is_error_occur(parts):
-                    return parts
-                curr_obj, curr_field, curr_content = parts
-                # check if current obj part exists. i.e. either 'all' or 'fav'
-                if curr_obj not in (ALL_RECIPES_STR, FAVOURITE_RECIPES_STR):
-                    return OBJECT_NOT_EXIST
-                # check if all obj part are the same
-                if not obj_to_query:
-                    # initialize obj_to_query
-                    obj_to_query = curr_obj
-                else:
-                    # check if match, return OBJECT_NOT_MATCH error if not
-                    if obj_to_query != curr_obj:
-                        return OBJECT_NOT_MATCH
-                # check if field exists, return FIELD_NOT_EXIST error if not
-                if curr_field not in ATTRIBUTES:
-                    return FIELD_NOT_EXIST
-                # find query condition by combining field and content
-                curr_condition = field_content_to_query(curr_field, curr_content)
-                if is_error_occur(curr_condition):
-                    return curr_condition
-                condition_list.append(curr_condition)
-            # process the query
-            my_query = {LOGICAL_OPERATOR_SIGNS[i]: condition_list}
-            return obj_to_query, my_query
+    if limit is None:
+        limit = SEARCH_PAGE_SIZE
+    elif not str(limit).isdecimal() or not 1 <= int(limit) <= SEARCH_MAX_LIMIT:
+        return INVALID_PAGE
+    if sort is None:
+        sort = 'id'
+    if sort == RELEVANCE and not is_search or sort != RELEVANCE \
+            and sort_of(sort)[0] not in SORT_FIELDS:
+        return INVALID_PAGE
+    if cursor is None:
+        return int(limit), sort, None
+    try:
+        cursor_sort, value, recipe_id = json.loads(base64.urlsafe_b64decode(cursor))
+    except (binascii.Error, ValueError, TypeError):
+        return INVALID_PAGE
+    # a cursor of another sort starts nowhere in this order
+    if cursor_sort != sort:
+        return INVALID_PAGE
+    return int(limit), sort, (value, recipe_id)
 
 
-def parse_single_query(query_string):
+def sort_of(sort):
     """
-    Parse the query directly.
-    Check error after calling each helper functions.
+    Get the field and direction of a sort other than RELEVANCE
+    """
+    if sort.startswith(DESCENDING_SIGN):
+        return sort[len(DESCENDING_SIGN):], pymongo.DESCENDING
+    return sort, pymongo.ASCENDING
+
+
+def cursor_of(sort, value, recipe_id):
+    """
+    Get the opaque cursor of the page after the result with value in sort and recipe_id
+    """
+    return base64.urlsafe_b64encode(json.dumps([sort, value, recipe_id]).encode()).decode()
+
+
+def after_filter(field, direction, value, recipe_id):
+    """
+    Get the mongoDB filter of the results after the one with value in field and recipe_id,
+    in the order of field and id. A missing field is null, first in ascending order as in mongoDB.
+    The filter is ranges on the index of field and id, which seeks the first result of the page.
+    """
+    after_id = {'$gt' if direction == pymongo.ASCENDING else '$lt': recipe_id}
+    if field == 'id':
+        return {'id': after_id}
+    if direction == pymongo.ASCENDING:
+        if value is None:
+            return {'$or': [{field: {'$ne': None}}, {field: None, 'id': after_id}]}
+        return {'$or': [{field: {'$gt': value}}, {field: value, 'id': after_id}]}
+    if value is None:
+        return {field: None, 'id': after_id}
+    return {'$or': [{field: {'$lt': value}}, {field: value, 'id': after_id}, {field: None}]}
+
+
+def ranked_page(query_obj, my_query, mongo_db, searches, number, after):
+    """
+    Get the number most relevant documents found by words, after the relevance and id of after.
+    Relevance is not stored, so the documents found are ranked, keeping number in memory.
+    Only the first SEARCH_RANK_CANDIDATES found in the order of the index are ranked,
+    which bounds the cost of a page whatever the number of recipes a word is found in.
+    """
+    if query_obj == ALL_RECIPES_STR:
+        documents = mongo_db.all_recipes_tb.find(my_query, SEARCH_PROJECTION) \
+            .limit(SEARCH_RANK_CANDIDATES)
+    else:
+        documents = mongo_db.find_favourites(my_query, projection=SEARCH_PROJECTION,
+                                             limit=SEARCH_RANK_CANDIDATES)
+    # the most relevant first, then by id
+    keyed = ((-relevance_of(document, searches), document.get('id'), document)
+             for document in documents)
+    if after:
+        relevance, recipe_id = after
+        keyed = (item for item in keyed if item[:2] > (-relevance, recipe_id))
+    return [document for _, _, document in heapq.nsmallest(number, keyed,
+                                                           key=lambda item: item[:2])]
+
+
+def searches_of(my_query):
+    """
+    Get the text attributes and terms searched by words in a compiled filter, for relevance.
+    Words under $nor are not searched for.
+
+    Parameters:
+    my_query (dict): compiled filter
+    """
+    searches = []
+    for key, condition in my_query.items():
+        if key in ('$and', '$or'):
+            for sub_query in condition:
+                searches += searches_of(sub_query)
+        elif key in SEARCH_TERMS_FIELDS and '$elemMatch' in condition:
+            attribute = TEXT_ATTRIBUTES[SEARCH_TERMS_FIELDS.index(key)]
+            searches.append((attribute, condition['$elemMatch']['$gte']))
+    return searches
+
+
+def rank(documents, searches):
+    """
+    Get the documents sorted by relevance, the most relevant first, without their search terms.
+    Documents of the same relevance keep their order.
+
+    Parameters:
+    documents: documents found, with their search terms
+    searches (list): pairs of text attribute and term searched
+    """
+    ranked = sorted(documents, key=lambda document: relevance_of(document, searches),
+                    reverse=True)
+    for document in ranked:
+        for field in SEARCH_TERMS_FIELDS:
+            document.pop(field, None)
+    return ranked
+
+
+def compiled_query(query_string):
+    """
+    Get the object and the mongoDB filter of the query string, or the error of parsing it.
+    Query strings are looked up in QUERY_CACHE without their surrounding spaces.
 
     Parameters:
     query_string (str): query string for search
     """
-    parts = parser(query_string)
+    if not isinstance(query_string, str):
+        return MALFORMED_QUERY_STRING
+    return QUERY_CACHE.get(query_string.strip(), compile_query_string)
+
+
+def compile_query_string(query_string):
+    """
+    Parse the query string and compile it, return the error of parsing if any
+
+    Parameters:
+    query_string (str): query string for search
+    """
+    parsed = parse(query_string)
+    if is_error_occur(parsed):
+        return parsed
+    return parsed.compile()
+
+
+def parse(query_string):
+    """
+    Parse the query string into a Query, return the error if it is not valid
+
+    Parameters:
+    query_string (str): query string for search
+    """
+    return QueryStringParser(query_string).parse()
+
+
+def parse_term(query_string):
+    """
+    Parse one condition in format obj.field:content into its object and Condition.
+    Check error after calling each helper functions.
+
+    Parameters:
+    query_string (str): query string of one condition
+    """
+    # separate query_string in str format obj.field:content into three parts
+    parts = parser(query_string.strip())
     if is_error_occur(parts):
         return parts
     curr_obj, curr_field, curr_content = parts
@@ -118,14 +676,39 @@ def parse_single_query(query_string):
     if curr_obj not in (ALL_RECIPES_STR, FAVOURITE_RECIPES_STR):
         return OBJECT_NOT_EXIST
     # check if field exists, return FIELD_NOT_EXIST error if not
-    if curr_field not in ATTRIBUTES:
+    if curr_field not in ATTRIBUTES and curr_field != TEXT_FIELD:
         return FIELD_NOT_EXIST
     # find query condition by combining field and content
-    curr_condition = field_content_to_query(curr_field, curr_content)
-    if is_error_occur(curr_condition):
-        return curr_condition
-    # object is not valid
-    return curr_obj, curr_condition
+    condition = parse_condition(curr_field, curr_content)
+    if is_error_occur(condition):
+        return condition
+    return curr_obj, condition
+
+
+def divide_query_string_and_parse(query_string):
+    """
+    Parse a query string of conditions joined by logical operators.
+    Check error after calling each helper functions.
+
+    Parameters:
+    query_string (str): query string for search
+    """
+    return compile_query_string(query_string)
+
+
+def parse_single_query(query_string):
+    """
+    Parse the query of one condition directly.
+    Check error after calling each helper functions.
+
+    Parameters:
+    query_string (str): query string for search
+    """
+    parsed = parse_term(query_string)
+    if is_error_occur(parsed):
+        return parsed
+    curr_obj, condition = parsed
+    return curr_obj, condition.compile()
 
 
 def parser(query_string):
@@ -149,10 +732,12 @@ def parser(query_string):
     return obj.strip(), field.strip(), content.strip()
 
 
-def field_content_to_query(field, content):
+def parse_condition(field, content):
     """
-    Convert content section into query which is used in mongo_db.collection.find().
+    Parse content section into a Condition on field, with a value of the type stored in field.
+    Two-side range BETWEEN. For example, book.rating_count: BETWEEN 100 AND 200.
     NOT logical operators. For example, book.rating_count: NOT 123.
+    NOT of a string field other than id is the Negation of the condition without NOT.
     One-side unbounded comparison operators <, >. For example, book.rating_count: > 123.
     Single content without operators. For example, book.book_id: 123.
 
@@ -160,10 +745,29 @@ def field_content_to_query(field, content):
     field (str): field string in query string
     content (str): content string in query string
     """
+    # BETWEEN content
+    between = BETWEEN_PATTERN.fullmatch(content.strip())
+    if between:
+        type_checks = [check_content_type(field, bound) for bound in between.groups()]
+        if VALUE_TYPE_ERROR in type_checks:
+            return VALUE_TYPE_ERROR
+        if CANNOT_BE_COMPARED in type_checks:
+            return OPERATOR_NOT_APPLICABLE
+        return Condition(field, BETWEEN, tuple(int(bound) for bound in between.groups()))
     # NOT content
     if content.find('NOT') != NOT_EXIST:
         not_content = content.split('NOT')[1].strip()
-        return {field: {'$ne': not_content}}
+        if field in NUMERIC_ATTRIBUTES:
+            # numeric fields are stored as int
+            if check_content_type(field, not_content) != CAN_BE_COMPARED:
+                return VALUE_TYPE_ERROR
+            return Condition(field, NOT_EQUALS, int(not_content))
+        if field == 'id':
+            return Condition(field, NOT_EQUALS, not_content)
+        # recipes not matched by the content without NOT are searched,
+        # e.g. recipes without the words for text, not only those not equal to them
+        operator = SEARCH if field in TEXT_ATTRIBUTES or field == TEXT_FIELD else CONTAINS
+        return Negation(Condition(field, operator, not_content))
     # >, < content
     for i, operator in enumerate(COMPARISON_OPERATORS):
         if content.find(operator) != NOT_EXIST:
@@ -173,19 +777,38 @@ def field_content_to_query(field, content):
                 return type_check
             if type_check == CANNOT_BE_COMPARED:
                 return OPERATOR_NOT_APPLICABLE
-            return {'$expr': {COMPARISON_OPERATOR_SIGNS[i]: [{'$toInt': f'${field}'},
-                                                             int(com_content)]}}
+            return Condition(field, COMPARISON_OPERATOR_SIGNS[i], int(com_content))
     # single content
     content = content.strip()
     type_check = check_content_type(field, content)
     if is_error_occur(type_check):
         return type_check
-    if field in {'id', 'yields', 'prep time', 'cook time', 'popularity'}:
+    if field in NUMERIC_ATTRIBUTES:
+        if type_check != CAN_BE_COMPARED:
+            return VALUE_TYPE_ERROR
+        # search for exact match of the stored int
+        return Condition(field, EQUALS, int(content))
+    if field == 'id':
         # search for exact match
-        return {field: content}
-    # search for contain
-    condition = {'$regex': '.*' + content + '.*'}
-    return {field: condition}
+        return Condition(field, EQUALS, content)
+    if field in TEXT_ATTRIBUTES or field == TEXT_FIELD:
+        # search for words
+        return Condition(field, SEARCH, content)
+    return Condition(field, CONTAINS, content)
+
+
+def field_content_to_query(field, content):
+    """
+    Convert content section into query which is used in mongo_db.collection.find().
+
+    Parameters:
+    field (str): field string in query string
+    content (str): content string in query string
+    """
+    condition = parse_condition(field, content)
+    if is_error_occur(condition):
+        return condition
+    return condition.compile()
 
 
 def check_content_type(field, content):
@@ -202,9 +825,9 @@ def check_content_type(field, content):
     content = content.strip()
     if not content:
         return CANNOT_BE_COMPARED
-    if field in {'id', 'yields', 'prep time', 'cook time', 'popularity'}:
+    if field == 'id' or field in NUMERIC_ATTRIBUTES:
         # Content value for these field should be integer
-        if not content.isnumeric():
+        if not content.isdecimal():
             return VALUE_TYPE_ERROR
         return CAN_BE_COMPARED
     # Value of other fields is not int, cannot be compared
@@ -219,6 +842,6 @@ def is_error_occur(return_value):
     return_value: value returned from functions in this file
     """
     if isinstance(return_value, int) \
-            and OPERATOR_NOT_APPLICABLE <= return_value <= MALFORMED_QUERY_STRING:
+            and INVALID_PAGE <= return_value <= MALFORMED_QUERY_STRING:
         return True
     return False
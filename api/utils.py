@@ -3,6 +3,8 @@ Utils module for api
 """
 from flask import request
 
+from scraper.database import NUMERIC_ATTRIBUTES
+
 
 def is_content_type_json():
     """
@@ -16,17 +18,22 @@ def is_content_type_json():
 def is_dict_value_type_valid(dic):
     """
     Check whether value type of the dict is string or list,
-    and whether fields supposed to store number indeed store number.
+    and whether fields supposed to store number indeed store number, as int or str.
 
     Parameters:
     dic (dict): dictionary given to check its value type
     """
     for key in dic:
+        value = dic[key]
+        # value of these keys should be int, given as int or str of digits
+        if key in NUMERIC_ATTRIBUTES:
+            if isinstance(value, bool):
+                return False
+            if not (isinstance(value, int) and value >= 0) \
+                    and not (isinstance(value, str) and value.isdecimal()):
+                return False
+            continue
         # value should be str or list
-        if not isinstance(dic[key], str) and not isinstance(dic[key], list):
+        if not isinstance(value, str) and not isinstance(value, list):
             return False
-        # value of these keys should be int
-        if key in {'yields', 'prep time', 'cook time', 'popularity'}:
-            if not dic[key].isnumeric():
-                return False
     return True
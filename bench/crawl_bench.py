@@ -0,0 +1,115 @@
+"""
+Benchmark crawl throughput of scrape_many against the local stub server.
+The sequential path (concurrency 1) is compared with the concurrent path.
+Recipes are stored in memory, so only fetching and parsing is measured.
+
+Usage: python -m bench.crawl_bench [--recipes 100] [--latency 0.05] [--concurrency 1 4 8 16]
+"""
+import argparse
+import contextlib
+import io
+import os
+import time
+
+# point the scraper at the stub server before scraper.constant is imported
+STUB_PORT = int(os.getenv('STUB_PORT', '8765'))
+os.environ['FATSECRET_BASE_URL'] = f'http://127.0.0.1:{STUB_PORT}'
+# every run fetches from the stub server instead of the page cache
+os.environ['SCRAPER_CACHE_DIR'] = ''
+# requests are not paced, so the crawl itself is measured
+os.environ['SCRAPER_RATE_LIMIT_MAX'] = '0'
+
+from bench.stub_server import StubServer  # noqa: E402
+from scraper.constant import DEFAULT_URL  # noqa: E402
+from scraper.database import fingerprint_of, INSERTED, UPDATED, UNCHANGED  # noqa: E402
+from scraper.scraper import scrape_many  # noqa: E402
+
+
+class MemoryDatabase:
+    """
+    Stand-in of Database keeping recipes in a dict, used to leave mongoDB out of the timing
+    """
+
+    def __init__(self):
+        """
+        Initialize the empty table
+        """
+        self.all_recipes = {}
+
+    def get_recipe_ids(self, table_type):
+        """
+        Get the ids of all recipes in the table
+        """
+        return list(self.all_recipes)
+
+    def is_recipe_exists_in_tb(self, recipe_dict, table_type):
+        """
+        Check whether recipe exists in the table
+        """
+        return recipe_dict['id'] in self.all_recipes
+
+    def insert_into_tb(self, recipe_dict, table_type):
+        """
+        Insert the recipe into the table unless its id exists
+        """
+        if recipe_dict['id'] in self.all_recipes:
+            return False
+        self.all_recipes[recipe_dict['id']] = dict(recipe_dict)
+        return True
+
+    def store_scraped_recipe(self, recipe_dict, url):
+        """
+        Store the scraped recipe in the table, skip it if its content did not change
+        """
+        fingerprint = fingerprint_of(recipe_dict)
+        stored = self.all_recipes.get(recipe_dict['id'])
+        if stored and stored['fingerprint'] == fingerprint:
+            return UNCHANGED
+        self.all_recipes[recipe_dict['id']] = dict(recipe_dict, url=url, fingerprint=fingerprint)
+        return UPDATED if stored else INSERTED
+
+    def store_scraped_recipes(self, recipes):
+        """
+        Store a batch of scraped recipes in the table
+        """
+        return [self.store_scraped_recipe(recipe_dict, url) for recipe_dict, url in recipes]
+
+
+def run_crawl(target_number, concurrency):
+    """
+    Scrape target_number recipes with the given concurrency.
+    Return the elapsed seconds and the number of recipes stored.
+    """
+    mongo_db = MemoryDatabase()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        scrape_many(DEFAULT_URL, target_number, 'default', concurrency, mongo_db)
+    return time.perf_counter() - start, len(mongo_db.all_recipes)
+
+
+def main():
+    """
+    Run the benchmark and print one line per concurrency
+    """
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument('--recipes', type=int, default=100)
+    arg_parser.add_argument('--latency', type=float, default=0.05)
+    arg_parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 8, 16])
+    args = arg_parser.parse_args()
+
+    server = StubServer(catalogue_size=args.recipes, latency=args.latency, port=STUB_PORT).start()
+    try:
+        baseline = None
+        print(f'{args.recipes} recipes, {args.latency * 1000:.0f} ms latency per page')
+        for concurrency in args.concurrency:
+            elapsed, stored = run_crawl(args.recipes, concurrency)
+            if baseline is None:
+                baseline = elapsed
+            print(f'concurrency {concurrency:>3}: {stored} recipes in {elapsed:6.2f} s, '
+                  f'{stored / elapsed:7.1f} recipes/s, x{baseline / elapsed:.1f}')
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
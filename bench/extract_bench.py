@@ -0,0 +1,71 @@
+"""
+Benchmark extraction CPU time per page of the single-pass RecipeExtractor
+against calling every get_* extractor on the table.
+Pages are parsed before timing, so only extraction is measured.
+
+Usage: python -m bench.extract_bench [--corpus DIR] [--pages 200]
+"""
+import argparse
+import contextlib
+import io
+import time
+
+from bench.parse_bench import load_corpus
+from scraper.extractor import RECIPE_EXTRACTOR
+from scraper.scraper import parse_soup, RECIPE_PAGE_STRAINER, get_id, get_name, get_time, \
+    get_yields, get_popularity, get_description, get_ingredients, get_instructions, \
+    get_image_url, get_meal_type
+
+
+def extract_by_get_functions(table):
+    """
+    Build the recipe dict by calling every get_* extractor
+    """
+    recipe_id = get_id(table)
+    if not recipe_id:
+        return None
+    prep_time, cook_time = get_time(table)
+    values = [('id', recipe_id), ('name', get_name(table)),
+              ('description', get_description(table)), ('image url', get_image_url(table)),
+              ('yields', get_yields(table)), ('prep time', prep_time), ('cook time', cook_time),
+              ('meal types', get_meal_type(table)), ('ingredients', get_ingredients(table)),
+              ('instructions', get_instructions(table)), ('popularity', get_popularity(table))]
+    return {field: value for field, value in values if value}
+
+
+def time_extraction(extract, tables, rounds):
+    """
+    Return the outputs and mean CPU microseconds per page of extract over tables
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        outputs = [extract(table) for table in tables]
+        start = time.process_time()
+        for _ in range(rounds):
+            for table in tables:
+                extract(table)
+        elapsed = time.process_time() - start
+    return outputs, elapsed * 1e6 / (rounds * len(tables))
+
+
+def main():
+    """
+    Run the benchmark and print CPU time per page of both extractors
+    """
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument('--corpus', default=None)
+    arg_parser.add_argument('--pages', type=int, default=200)
+    arg_parser.add_argument('--rounds', type=int, default=5)
+    args = arg_parser.parse_args()
+
+    tables = [parse_soup(html, RECIPE_PAGE_STRAINER).find('table', class_='generic')
+              for html in load_corpus(args.corpus, args.pages)]
+    expected, get_us = time_extraction(extract_by_get_functions, tables, args.rounds)
+    outputs, single_pass_us = time_extraction(RECIPE_EXTRACTOR.extract, tables, args.rounds)
+    print(f'{len(tables)} pages')
+    print(f'get_* extractors   {get_us:8.1f} us/page')
+    print(f'single pass        {single_pass_us:8.1f} us/page, x{get_us / single_pass_us:.1f}, '
+          f'output {"identical" if outputs == expected else "DIFFERENT"}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark per-page latency of the pooled HttpClient against a fresh urlopen connection per page.
+Pages are fetched one at a time from the stub server over https with a self-signed certificate,
+so the cost of the TCP and TLS handshakes shows in the latency.
+
+Usage: python -m bench.http_bench [--pages 200]
+"""
+import argparse
+import os
+import ssl
+import statistics
+import subprocess
+import tempfile
+import time
+from urllib.request import urlopen
+
+from bench.stub_server import StubServer, recipe_id_of
+from scraper.http_client import HttpClient
+
+
+def make_certfile(directory):
+    """
+    Create a self-signed certificate for 127.0.0.1 with openssl and return the PEM file
+    """
+    certfile = os.path.join(directory, 'stub.pem')
+    subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+                    '-subj', '/CN=127.0.0.1', '-addext', 'subjectAltName=IP:127.0.0.1',
+                    '-keyout', certfile, '-out', certfile],
+                   check=True, capture_output=True)
+    return certfile
+
+
+def time_pages(fetch, urls):
+    """
+    Fetch every url by fetch and return the latency of each page in milliseconds
+    """
+    latencies = []
+    for url in urls:
+        start = time.perf_counter()
+        fetch(url)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def report(label, latencies):
+    """
+    Print mean and percentiles of latencies
+    """
+    ordered = sorted(latencies)
+    print(f'{label:<18} mean {statistics.mean(ordered):6.2f} ms, '
+          f'p50 {ordered[len(ordered) // 2]:6.2f} ms, '
+          f'p99 {ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]:6.2f} ms')
+
+
+def main():
+    """
+    Run the benchmark and print the latency of both clients
+    """
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument('--pages', type=int, default=200)
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        certfile = make_certfile(directory)
+        server = StubServer(catalogue_size=args.pages, certfile=certfile).start()
+        try:
+            context = ssl.create_default_context(cafile=certfile)
+            urls = [f'{server.base_url}/recipes/{recipe_id_of(i)}-stub-recipe/Default.aspx'
+                    for i in range(args.pages)]
+
+            def fetch_by_urlopen(url):
+                with urlopen(url, context=context) as response:
+                    return response.read()
+
+            client = HttpClient(ssl_context=context)
+            report('urlopen', time_pages(fetch_by_urlopen, urls))
+            report('pooled HttpClient', time_pages(client.get, urls))
+            client.close()
+        finally:
+            server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""
+Benchmark lookup of recipes by id against the local mongod as the table grows.
+Each size is measured without indexes, then with the INDEXES of the recipe tables.
+Recipes are written to a bench table of the database, dropped after the run.
+
+Usage: python -m bench.lookup_bench [--sizes 1000 10000 100000] [--lookups 1000]
+"""
+import argparse
+import random
+import time
+
+from scraper.database import Database, INDEXES, ALL_RECIPES
+
+BENCH_TABLE = 'lookup_bench_table'
+
+
+def time_lookups(table, size, lookups):
+    """
+    Get the mean seconds of find_one by a random id
+    """
+    recipe_ids = [str(random.randrange(size)) for _ in range(lookups)]
+    start = time.perf_counter()
+    for recipe_id in recipe_ids:
+        table.find_one({'id': recipe_id}, {'_id': 0})
+    return (time.perf_counter() - start) / lookups
+
+
+def main():
+    """
+    Run the benchmark and print one line per table size
+    """
+    arg_parser = argparse.ArgumentParser(description=__doc__,
+                                         formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    arg_parser.add_argument('--lookups', type=int, default=1000)
+    args = arg_parser.parse_args()
+
+    table = Database().food_recipe_db[BENCH_TABLE]
+    try:
+        print(f'{"recipes":>8} {"no index ms":>12} {"indexed ms":>11}')
+        for size in args.sizes:
+            table.drop()
+            for start in range(0, size, 10000):
+                table.insert_many([{'id': str(index), 'name': f'Recipe {index}',
+                                    'meal types': ['Dinner'], 'popularity': 95}
+                                   for index in range(start, min(size, start + 10000))])
+            scan = time_lookups(table, size, args.lookups)
+            table.create_indexes(INDEXES[ALL_RECIPES])
+            indexed = time_lookups(table, size, args.lookups)
+            print(f'{size:>8} {scan * 1000:>12.3f} {indexed * 1000:>11.3f}')
+    finally:
+        table.drop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmark parse time and memory of the parser backends, with and without restricted parse.
+The corpus is every .html file in --corpus, or pages generated like the stub server if not given.
+Output of the get_* extractors is checked to be identical for every configuration.
+
+Usage: python -m bench.parse_bench [--corpus DIR] [--pages 200]
+"""
+import argparse
+import contextlib
+import glob
+import importlib.util
+import io
+import os
+import time
+import tracemalloc
+
+from bench.stub_server import recipe_page_html
+from scraper.scraper import parse_soup, RECIPE_PAGE_STRAINER, get_id, get_name, get_time, \
+    get_yields, get_popularity, get_description, get_ingredients, get_instructions, \
+    get_image_url, get_meal_type
+
+EXTRACTORS = [get_id, get_name, get_time, get_yields, get_popularity, get_description,
+              get_ingredients, get_instructions, get_image_url, get_meal_type]
+
+
+def load_corpus(corpus_dir, pages):
+    """
+    Get the list of pages as bytes
+    """
+    if corpus_dir:
+        corpus = []
+        for path in sorted(glob.glob(os.path.join(corpus_dir, '*.html'))):
+            with open(path, 'rb') as file:
+                corpus.append(file.read())
+        return corpus
+    return [recipe_page_html(index).encode('utf-8') for index in range(pages)]
+
+
+def extract_all(html, parser, restricted):
+    """
+    Parse the page and get the output of every get_* extractor
+    """
+    soup = parse_soup(html, RECIPE_PAGE_STRAINER, parser, restricted)
+    table = soup.find('table', class_='generic')
+    if not table:
+        return None
+    return [extractor(table) for extractor in EXTRACTORS]
+
+
+def run(corpus, parser, restricted):
+    """
+    Return the outputs, mean milliseconds per page, and peak KiB of parsing one page
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        outputs = [extract_all(html, parser, restricted) for html in corpus]
+        elapsed = time.perf_counter() - start
+        peak = 0
+        for html in corpus[:20]:
+            tracemalloc.start()
+            extract_all(html, parser, restricted)
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+    return outputs, elapsed * 1000 / len(corpus), peak / 1024
+
+
+def main():
+    """
+    Run the benchmark and print one line per configuration
+    """
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument('--corpus', default=None)
+    arg_parser.add_argument('--pages', type=int, default=200)
+    args = arg_parser.parse_args()
+
+    corpus = load_corpus(args.corpus, args.pages)
+    parsers = ['html.parser']
+    if importlib.util.find_spec('lxml') is not None:
+        parsers.append('lxml')
+    expected = None
+    print(f'{len(corpus)} pages')
+    for parser in parsers:
+        for restricted in (False, True):
+            outputs, ms_per_page, peak_kib = run(corpus, parser, restricted)
+            if expected is None:
+                expected = outputs
+            label = f'{parser}{" restricted" if restricted else ""}'
+            print(f'{label:<24} {ms_per_page:6.2f} ms/page, peak {peak_kib:8.1f} KiB, '
+                  f'output {"identical" if outputs == expected else "DIFFERENT"}')
+
+
+if __name__ == '__main__':
+    main()
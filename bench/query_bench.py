@@ -0,0 +1,61 @@
+"""
+Benchmark the cost of turning query strings of the web api into mongoDB filters.
+Each query string is parsed and compiled every time, then looked up in a warm QUERY_CACHE.
+A mix of the strings the frontend sends with distinct searches shows the hit ratio of the cache.
+
+Usage: python -m bench.query_bench [--rounds 20000]
+"""
+import argparse
+import random
+import time
+
+from api.query import QUERY_CACHE, compile_query_string, compiled_query
+
+QUERY_STRINGS = ['all.name:', 'fav.name:', 'all.id: 52389300', 'all.cook time: > 30',
+                 'all.prep time: NOT 10 AND all.cook time: 40',
+                 'all.name: chicken OR all.name: beef OR all.name: pork',
+                 'fav.meal types: Dessert AND fav.yields: 4 AND fav.popularity: > 50',
+                 'NOT (all.name: cake OR all.name: pie) AND all.cook time: BETWEEN 10 AND 30']
+
+
+def mean_us(function, query_strings, rounds):
+    """
+    Get the mean microseconds of calling function on each query string
+    """
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for query_string in query_strings:
+            function(query_string)
+    return (time.perf_counter() - start) * 1e6 / (rounds * len(query_strings))
+
+
+def main():
+    """
+    Run the benchmark and print the mean microseconds per query string
+    """
+    arg_parser = argparse.ArgumentParser(description=__doc__,
+                                         formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--rounds', type=int, default=20000)
+    args = arg_parser.parse_args()
+
+    print(f'{"query string":<76}{"parse+compile":>14}{"cached":>10}  (us per query)')
+    for query_string in QUERY_STRINGS:
+        QUERY_CACHE.clear()
+        uncached = mean_us(compile_query_string, [query_string], args.rounds)
+        cached = mean_us(compiled_query, [query_string], args.rounds)
+        print(f'{query_string:<76}{uncached:>14.2f}{cached:>10.2f}')
+
+    # nine in ten searches are the strings of the frontend, the others are distinct
+    QUERY_CACHE.clear()
+    rng = random.Random(0)
+    mix = [rng.choice(QUERY_STRINGS) if rng.random() < 0.9 else f'all.name: search {index}'
+           for index in range(args.rounds)]
+    mix_us = mean_us(compiled_query, mix, 1)
+    stats = QUERY_CACHE.stats()
+    print(f'mix of {len(mix)} searches: {mix_us:.2f} us per query, '
+          f'hit ratio {stats["hits"] / (stats["hits"] + stats["misses"]):.2f}, '
+          f'{stats["size"]} cached')
+
+
+if __name__ == '__main__':
+    main()
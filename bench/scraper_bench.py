@@ -0,0 +1,182 @@
+"""
+Benchmark every crawl mode of the scraper against the local stub server.
+Each mode runs in its own process, so its peak RSS is measured alone.
+Reported per mode: recipes/s, p50 and p99 latency of page fetches, and peak RSS.
+Recipes are stored in memory, so mongoDB is left out of the timing.
+
+Modes:
+sequential    scrape_many with concurrency 1
+concurrent    scrape_many through the staged pipeline
+meal-types    scrape_all_meal_types over worker processes
+scrape-one    scrape_one for each recipe url
+api-scrape    POST /api/scrape for each recipe url, through the flask test client
+
+Usage: python -m bench.scraper_bench [--recipes 120] [--latency 0.02] [--error-rate 0]
+       [--modes sequential concurrent ...]
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench.stub_server import StubServer, recipe_id_of
+
+MODES = ['sequential', 'concurrent', 'meal-types', 'scrape-one', 'api-scrape']
+
+
+def percentile(values, part):
+    """
+    Get the value below which part of the sorted values are, nearest rank
+    """
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(part * len(values)))]
+
+
+def record_fetch_latency(latency_dir):
+    """
+    Time every page fetch of HttpClient.get, one file of latencies per process in latency_dir.
+    Files are used because worker processes of meal-types exit without returning their data.
+    """
+    from scraper.http_client import HttpClient  # pylint: disable=import-outside-toplevel
+    get = HttpClient.get
+    files = {}
+
+    def timed_get(client, url):
+        start = time.perf_counter()
+        try:
+            return get(client, url)
+        finally:
+            elapsed = time.perf_counter() - start
+            if os.getpid() not in files:
+                files[os.getpid()] = open(os.path.join(latency_dir, str(os.getpid())), 'a')
+            files[os.getpid()].write(f'{elapsed}\n')
+            files[os.getpid()].flush()
+
+    HttpClient.get = timed_get
+
+
+def run_mode(mode, recipes, base_url):
+    """
+    Run one crawl mode in this process, return the number of recipes stored
+    """
+    # pylint: disable=import-outside-toplevel
+    import contextlib
+    import io
+
+    import scraper.scraper
+    from bench.crawl_bench import MemoryDatabase
+    from scraper.constant import DEFAULT_URL, MEAL_TYPES
+
+    # every Database created by the scraper keeps recipes in memory
+    scraper.scraper.Database = MemoryDatabase
+    recipe_urls = [f'{base_url}/recipes/{recipe_id_of(index)}-stub-recipe/Default.aspx'
+                   for index in range(recipes)]
+    with contextlib.redirect_stdout(io.StringIO()):
+        if mode == 'sequential':
+            return scraper.scraper.scrape_many(DEFAULT_URL, recipes, 'default', 1)
+        if mode == 'concurrent':
+            return scraper.scraper.scrape_many(DEFAULT_URL, recipes, 'default')
+        if mode == 'meal-types':
+            per_meal_type = max(1, recipes // (len(MEAL_TYPES) - 1))
+            return sum(scraper.scraper.scrape_all_meal_types(per_meal_type).values())
+        if mode == 'scrape-one':
+            for recipe_url in recipe_urls:
+                scraper.scraper.scrape_one(recipe_url)
+            return recipes
+        if mode == 'api-scrape':
+            import api.flask_app
+            api.flask_app.mongo_db = MemoryDatabase()
+            client = api.flask_app.app.test_client()
+            for recipe_url in recipe_urls:
+                client.post('/api/scrape', query_string={'url': recipe_url})
+            return len(api.flask_app.mongo_db.all_recipes)
+    raise ValueError(f'unknown mode {mode}')
+
+
+def run_child(args):
+    """
+    Entry of the process of one mode: run it and print its measures as json
+    """
+    record_fetch_latency(args.latency_dir)
+    start = time.perf_counter()
+    stored = run_mode(args.child, args.recipes, os.environ['FATSECRET_BASE_URL'])
+    elapsed = time.perf_counter() - start
+    print(json.dumps({
+        'stored': stored,
+        'seconds': elapsed,
+        # kilobytes on Linux
+        'peak rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'peak worker rss': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    }))
+
+
+def measure(mode, args, base_url):
+    """
+    Run mode in a new process and get its measures
+    """
+    with tempfile.TemporaryDirectory() as work_dir:
+        latency_dir = os.path.join(work_dir, 'latency')
+        os.makedirs(latency_dir)
+        env = dict(os.environ, FATSECRET_BASE_URL=base_url, SCRAPER_CACHE_DIR='',
+                   SCRAPER_FRONTIER_DIR=os.path.join(work_dir, 'frontier'))
+        if not args.paced:
+            env['SCRAPER_RATE_LIMIT_MAX'] = '0'
+        completed = subprocess.run([sys.executable, '-m', 'bench.scraper_bench', '--child', mode,
+                                    '--recipes', str(args.recipes), '--latency-dir', latency_dir],
+                                   env=env, capture_output=True, text=True, check=True)
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        latencies = []
+        for name in os.listdir(latency_dir):
+            with open(os.path.join(latency_dir, name)) as file:
+                latencies.extend(float(line) for line in file)
+    latencies.sort()
+    result['p50'] = percentile(latencies, 0.50)
+    result['p99'] = percentile(latencies, 0.99)
+    result['pages'] = len(latencies)
+    return result
+
+
+def main():
+    """
+    Run the benchmark and print one line per mode
+    """
+    arg_parser = argparse.ArgumentParser(description=__doc__,
+                                         formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--recipes', type=int, default=120)
+    arg_parser.add_argument('--latency', type=float, default=0.02)
+    arg_parser.add_argument('--error-rate', type=float, default=0.0)
+    arg_parser.add_argument('--paced', action='store_true',
+                            help='pace requests with the rate limiter as a real crawl does')
+    arg_parser.add_argument('--modes', nargs='+', choices=MODES, default=MODES)
+    arg_parser.add_argument('--child', choices=MODES, help=argparse.SUPPRESS)
+    arg_parser.add_argument('--latency-dir', help=argparse.SUPPRESS)
+    args = arg_parser.parse_args()
+    if args.child:
+        run_child(args)
+        return
+
+    # meal types list only part of the catalogue each, so the catalogue is larger than needed
+    server = StubServer(catalogue_size=args.recipes * 2, latency=args.latency,
+                        error_rate=args.error_rate).start()
+    try:
+        print(f'{args.recipes} recipes, {args.latency * 1000:.0f} ms latency per page, '
+              f'{args.error_rate:.0%} errors')
+        print(f'{"mode":<12} {"recipes":>7} {"seconds":>8} {"recipes/s":>10} {"pages":>6} '
+              f'{"p50 ms":>7} {"p99 ms":>7} {"rss MB":>7} {"worker MB":>9}')
+        for mode in args.modes:
+            result = measure(mode, args, server.base_url)
+            print(f'{mode:<12} {result["stored"]:>7} {result["seconds"]:>8.2f} '
+                  f'{result["stored"] / result["seconds"]:>10.1f} {result["pages"]:>6} '
+                  f'{result["p50"] * 1000:>7.1f} {result["p99"] * 1000:>7.1f} '
+                  f'{result["peak rss"] / 1024:>7.1f} {result["peak worker rss"] / 1024:>9.1f}')
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
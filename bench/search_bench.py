@@ -0,0 +1,89 @@
+"""
+Benchmark searches by words on the embedded backend: the terms looked up in their index
+and ranked, against the regular expression matched on every recipe as searched before.
+Recipes are generated from a vocabulary of words, so common and rare words are both searched.
+Pages of search_page are timed for a broad word found in nearly every recipe too,
+their cost should not grow with the number of recipes.
+
+Usage: python -m bench.search_bench [--recipes 20000] [--rounds 20]
+"""
+import argparse
+import random
+import time
+
+from api.query import query, search_page
+from scraper.database import Database
+from scraper.embedded_store import EmbeddedClient
+from scraper.text_search import terms_values_of
+
+WORDS = ['chicken', 'beef', 'pork', 'tofu', 'rice', 'noodles', 'tomato', 'onion', 'garlic',
+         'lemon', 'butter', 'cream', 'cheese', 'apple', 'berry', 'chocolate', 'baked', 'fried',
+         'grilled', 'roasted', 'spicy', 'sweet', 'soup', 'salad', 'pie', 'cake', 'curry', 'stew']
+# query strings with the word of the old search, a common word, a rare word and two words
+SEARCHES = [('chicken', 'all.name: chicken'), ('cake', 'all.text: cake'),
+             ('rare', 'all.name: rare'), ('spicy', 'all.name: spicy AND all.name: soup')]
+# a prefix of many words, found in nearly every recipe, read by pages of each sort
+BROAD_SEARCH = 'all.text: c'
+PAGE_SORTS = ['id', '-id', 'relevance']
+
+
+def make_recipes(number, rng):
+    """
+    Get number recipes of random words, one in a thousand named with a rare word
+    """
+    recipes = []
+    for index in range(number):
+        name = ' '.join(rng.sample(WORDS, 3)) + (' rare' if index % 1000 == 0 else '')
+        recipe = {'id': str(index), 'name': name.title(),
+                  'description': ' '.join(rng.sample(WORDS, 8)),
+                  'ingredients': rng.sample(WORDS, 6), 'instructions': rng.sample(WORDS, 5)}
+        recipes.append(dict(recipe, **terms_values_of(recipe)))
+    return recipes
+
+
+def mean_ms(function, rounds):
+    """
+    Get the mean milliseconds of calling function, and its last result
+    """
+    start = time.perf_counter()
+    for _ in range(rounds):
+        result = function()
+    return (time.perf_counter() - start) * 1000 / rounds, result
+
+
+def main():
+    """
+    Run the benchmark and print the mean ms of each search
+    """
+    arg_parser = argparse.ArgumentParser(description=__doc__,
+                                         formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--recipes', type=int, default=20000)
+    arg_parser.add_argument('--rounds', type=int, default=20)
+    args = arg_parser.parse_args()
+
+    client = EmbeddedClient(':memory:')
+    mongo_db = Database(client)
+    mongo_db.ensure_indexes()
+    mongo_db.all_recipes_tb.insert_many(make_recipes(args.recipes, random.Random(0)))
+
+    print(f'{args.recipes} recipes, mean ms per search')
+    print(f'{"query string":<40}{"found":>8}{"terms":>10}{"regex":>10}')
+    for word, query_string in SEARCHES:
+        terms_ms, found = mean_ms(lambda: query(query_string, mongo_db), args.rounds)
+        regex_ms, _ = mean_ms(lambda: list(mongo_db.all_recipes_tb.find(
+            {'name': {'$regex': f'.*{word.title()}.*'}}, {'_id': 0})), args.rounds)
+        print(f'{query_string:<40}{len(found):>8}{terms_ms:>10.2f}{regex_ms:>10.2f}')
+
+    print(f'pages of {BROAD_SEARCH}, mean ms per page')
+    print(f'{"sort":<40}{"first":>10}{"next":>10}')
+    for sort in PAGE_SORTS:
+        first_ms, page = mean_ms(lambda: search_page(BROAD_SEARCH, mongo_db, sort=sort),
+                                 args.rounds)
+        next_ms, _ = mean_ms(lambda: search_page(BROAD_SEARCH, mongo_db, sort=sort,
+                                                 cursor=page['cursor']), args.rounds)
+        print(f'{sort:<40}{first_ms:>10.2f}{next_ms:>10.2f}')
+    client.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""
+Benchmark the storage backends of Database on the request mix of the web api.
+Requests go through the flask test client, so parsing, querying and output are measured too.
+Recipes are written to bench tables of each backend, dropped after the run.
+The mongo backend is skipped if the mongod of HOST and PORT is not running.
+
+Usage: python -m bench.storage_bench [--recipes 2000] [--requests 2000]
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import tempfile
+import time
+
+import pymongo
+
+import api.flask_app as flask_app
+from scraper.database import Database, get_mongo_client
+from scraper.embedded_store import EmbeddedClient
+from scraper.text_search import terms_values_of
+
+BENCH_RECIPES_TABLE = 'storage_bench_recipes_table'
+BENCH_FAVOURITES_TABLE = 'storage_bench_favourites_table'
+# kinds of request of the web api with their share of the requests
+REQUEST_MIX = [('GET food', 50), ('GET search', 20), ('GET favourite', 15), ('PUT food', 10),
+               ('POST and DELETE favourite', 5)]
+SEARCHES = ['all.name: Recipe 1{}', 'all.prep time: {}', 'all.meal types: Dinner AND all.id: {}',
+            'fav.name: Recipe {}']
+
+
+def make_recipes(number):
+    """
+    Get number recipes as the web api stores them
+    """
+    return [{'id': str(index), 'name': f'Recipe {index}', 'description': 'Bench recipe',
+             'yields': 2, 'prep time': index % 60, 'cook time': 20,
+             'meal types': ['Dinner'], 'ingredients': ['flour', 'water', 'salt'],
+             'instructions': ['Mix', 'Bake'], 'popularity': 95}
+            for index in range(number)]
+
+
+def is_mongod_running():
+    """
+    Check whether the mongod of the shared client answers within 1 second
+    """
+    host, port = get_mongo_client().topology_description.server_descriptions().popitem()[0]
+    try:
+        pymongo.MongoClient(host, port, serverSelectionTimeoutMS=1000).admin.command('ping')
+    except pymongo.errors.PyMongoError:
+        return False
+    return True
+
+
+def prepare_database(client, recipes):
+    """
+    Get a Database of client on the bench tables, filled with recipes and a tenth as favourites
+    """
+    mongo_db = Database(client)
+    mongo_db.all_recipes_tb = mongo_db.food_recipe_db[BENCH_RECIPES_TABLE]
+    mongo_db.favourites_tb = mongo_db.food_recipe_db[BENCH_FAVOURITES_TABLE]
+    mongo_db.all_recipes_tb.drop()
+    mongo_db.favourites_tb.drop()
+    mongo_db.ensure_indexes()
+    mongo_db.all_recipes_tb.insert_many([dict(recipe, **terms_values_of(recipe))
+                                         for recipe in recipes])
+    mongo_db.favourites_tb.insert_many([{'id': recipe['id']} for recipe in recipes[::10]])
+    return mongo_db
+
+
+def send_request(test_client, kind, rng, number):
+    """
+    Send one request of kind about a random recipe of the number stored
+    """
+    index = rng.randrange(number)
+    if kind == 'GET food':
+        test_client.get(f'/api/food?id={index}')
+    elif kind == 'GET search':
+        test_client.get('/api/search', query_string={'q': rng.choice(SEARCHES).format(index)})
+    elif kind == 'GET favourite':
+        test_client.get(f'/api/favourite?id={index - index % 10}')
+    elif kind == 'PUT food':
+        test_client.put(f'/api/food?id={index}', json={'name': f'Recipe {index} updated'})
+    else:
+        test_client.post('/api/favourite', json={'id': f'{number + index}',
+                                                 'name': f'My recipe {index}'})
+        test_client.delete(f'/api/favourite?id={number + index}')
+
+
+def run_mix(mongo_db, number, requests):
+    """
+    Send requests of REQUEST_MIX to the web api on mongo_db.
+    Return the total seconds and number of requests of each kind.
+    """
+    flask_app.mongo_db = mongo_db
+    test_client = flask_app.app.test_client()
+    rng = random.Random(0)
+    kinds = rng.choices([kind for kind, _ in REQUEST_MIX],
+                        weights=[share for _, share in REQUEST_MIX], k=requests)
+    timings = {kind: [0.0, 0] for kind, _ in REQUEST_MIX}
+    with contextlib.redirect_stdout(io.StringIO()):
+        for kind in kinds:
+            start = time.perf_counter()
+            send_request(test_client, kind, rng, number)
+            timings[kind][0] += time.perf_counter() - start
+            timings[kind][1] += 1
+    return timings
+
+
+def main():
+    """
+    Run the benchmark and print the mean ms of each kind of request on each backend
+    """
+    arg_parser = argparse.ArgumentParser(description=__doc__,
+                                         formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--recipes', type=int, default=2000)
+    arg_parser.add_argument('--requests', type=int, default=2000)
+    args = arg_parser.parse_args()
+
+    recipes = make_recipes(args.recipes)
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        backends = [('embedded', EmbeddedClient(os.path.join(directory, 'bench.sqlite3')))]
+        if is_mongod_running():
+            backends.insert(0, ('mongo', get_mongo_client()))
+        else:
+            print('mongod is not running, mongo backend is skipped')
+        for name, client in backends:
+            mongo_db = prepare_database(client, recipes)
+            try:
+                results[name] = run_mix(mongo_db, args.recipes, args.requests)
+            finally:
+                mongo_db.all_recipes_tb.drop()
+                mongo_db.favourites_tb.drop()
+        backends[-1][1].close()
+
+    print(f'{args.recipes} recipes, {args.requests} requests, mean ms per request')
+    print(f'{"request":<26}' + ''.join(f'{name:>10}' for name in results))
+    for kind, _ in REQUEST_MIX + [('all', 0)]:
+        means = []
+        for timings in results.values():
+            seconds, count = timings[kind] if kind != 'all' else \
+                [sum(timing[index] for timing in timings.values()) for index in (0, 1)]
+            means.append(seconds / count * 1000 if count else 0.0)
+        print(f'{kind:<26}' + ''.join(f'{mean:>10.3f}' for mean in means))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,294 @@
+"""
+Module for a local stand-in of the Fatsecret website.
+Serve generated listing pages and food recipe pages in the layout read by the scraper,
+so crawls can be benchmarked without hitting the live site.
+A part of the requests can be answered with errors, to exercise retries.
+
+Usage: python -m bench.stub_server [--port 8765] [--recipes 1000] [--latency 0.05]
+       [--error-rate 0.02] [--retry-after 1]
+then run the scraper with FATSECRET_BASE_URL=http://127.0.0.1:8765
+"""
+import argparse
+import hashlib
+import random
+import ssl
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+from scraper.constant import MEAL_TYPES
+
+# id of the first recipe in the catalogue
+FIRST_RECIPE_ID = 10000000
+# number of recipe rows on each listing page
+ROWS_PER_PAGE = 10
+# number of filler links on every page, so pages are about the size of real ones
+FILLER_LINKS = 200
+# status codes of the errors answered at error_rate
+ERROR_STATUSES = (429, 500, 503)
+# status codes sent with a Retry-After header if retry_after is set
+RETRY_AFTER_STATUSES = (429, 503)
+
+
+def recipe_id_of(index):
+    """
+    Get the recipe id of the recipe at index of the catalogue
+    """
+    return str(FIRST_RECIPE_ID + index)
+
+
+def meal_types_of(index):
+    """
+    Get the meal types of the recipe at index of the catalogue.
+    Every fourth recipe is tagged with two meal types.
+    """
+    meal_types = [MEAL_TYPES[1 + index % (len(MEAL_TYPES) - 1)]]
+    if index % 4 == 0:
+        meal_types.append(MEAL_TYPES[1 + (index + 1) % (len(MEAL_TYPES) - 1)])
+    return meal_types
+
+
+def filler_html():
+    """
+    Get the navigation links shown around the content of every page
+    """
+    links = ''.join(f'<li><a href="/foods/{i}/Default.aspx">Food {i}</a></li>'
+                    for i in range(FILLER_LINKS))
+    return f'<div class="nav"><ul>{links}</ul></div>'
+
+
+def recipe_page_html(index):
+    """
+    Get the html of the food recipe page of the recipe at index of the catalogue
+    """
+    recipe_id = recipe_id_of(index)
+    meal_tags = ''.join(f'<div class="tag">{meal_type.replace("-", " ").title()}</div>'
+                        for meal_type in meal_types_of(index))
+    ingredients = ''.join(f'<li>{i + 1} cup ingredient {i}</li>' for i in range(8))
+    instructions = ''.join(f'<li>Do step {i} of the recipe.</li>' for i in range(6))
+    return (
+        f'<html><head><title>Stub Recipe {recipe_id}</title></head><body>{filler_html()}'
+        f'<table class="generic"><tr><td>'
+        f'<div class="top"><h1 class="fn">Stub Recipe {recipe_id}</h1></div>'
+        f'<div class="imgFrame"><a href="/Diary.aspx?pa=recipe&rid={recipe_id}">'
+        f'<img src="https://m.ftscrt.com/static/recipe/{recipe_id}.jpg"/></a></div>'
+        f'<span class="summary">Generated recipe number {index}.</span>'
+        f'<div id="servings"><div class="yield">{index % 6 + 1} servings</div></div>'
+        f'<div id="cooktime"><div class="prepTime">{index % 50 + 5} mins</div>'
+        f'<div class="cookTime">1 hr {index % 60} mins</div></div>'
+        f'<div id="mealtypes">{meal_tags}</div>'
+        f'<ul class="plain ingredients">{ingredients}</ul>'
+        f'<ol class="noind instructions">{instructions}</ol>'
+        f'<div class="bluebg">{index % 100} people</div>'
+        f'</td></tr></table>{filler_html()}</body></html>'
+    )
+
+
+def listing_page_html(indexes, page_count, path, scrape_type):
+    """
+    Get the html of a listing page with links to the recipes at indexes of the catalogue
+
+    Parameters:
+    indexes (list): indexes of the recipes listed on the page
+    page_count (int): number of listing pages, all linked from the paging div
+    path (str): path of the listing pages without query
+    scrape_type (str): 'default' or 'meal_type', the layout of the list table
+    """
+    if scrape_type == 'default':
+        table_class, td_class = 'listtable searchResult', 'borderBottom'
+    else:
+        table_class, td_class = 'listtable', 'borderBottom recipeSummary'
+    paging = ''.join(f'<a href="{path}?pg={page}">{page + 1}</a>' for page in range(page_count))
+    rows = ''.join(f'<tr><td class="{td_class}">'
+                   f'<a href="/recipes/{recipe_id_of(index)}-stub-recipe/Default.aspx">'
+                   f'Stub Recipe {recipe_id_of(index)}</a></td></tr>' for index in indexes)
+    return (
+        f'<html><body>{filler_html()}<div class="searchResultsPaging">{paging}</div>'
+        f'<table class="{table_class}">{rows}</table></body></html>'
+    )
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Request handler of the stub server, pages are generated from the server catalogue
+    """
+    protocol_version = 'HTTP/1.1'
+    # headers and body are written separately, without this kept-alive responses stall on Nagle
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        """
+        Serve listing pages, food recipe pages, and 404 for everything else
+        """
+        stub = self.server.stub
+        if stub.latency:
+            time.sleep(stub.latency)
+        error_status = stub.draw_error()
+        if error_status:
+            self.send_response(error_status)
+            if stub.retry_after is not None and error_status in RETRY_AFTER_STATUSES:
+                self.send_header('Retry-After', str(stub.retry_after))
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        parsed = urlparse(self.path)
+        page = int(parse_qs(parsed.query).get('pg', ['0'])[0])
+        body = None
+        if parsed.path == '/Default.aspx':
+            body = stub.listing(parsed.path, page, None)
+        elif parsed.path.startswith('/recipes/collections/meal/'):
+            body = stub.listing(parsed.path, page, parsed.path.split('/')[4])
+        elif parsed.path.startswith('/recipes/'):
+            index = int(parsed.path.split('/')[2].split('-')[0]) - FIRST_RECIPE_ID
+            if 0 <= index < stub.catalogue_size:
+                body = recipe_page_html(index)
+        stub.count_request()
+        if body is None:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        content = body.encode('utf-8')
+        etag = '"' + hashlib.sha1(content).hexdigest() + '"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        """
+        Keep the benchmark output quiet
+        """
+
+
+class StubServer:
+    """
+    Local stand-in of the Fatsecret website running in a background thread.
+    """
+
+    def __init__(self, catalogue_size=200, latency=0.0, port=0, certfile=None, error_rate=0.0,
+                 retry_after=None, seed=0):
+        """
+        Create the server, port 0 picks a free port
+
+        Parameters:
+        catalogue_size (int): number of recipes served
+        latency (float): seconds to wait before answering each request
+        port (int): port to listen on
+        certfile (str): PEM file with certificate and key, serve https if given
+        error_rate (float): part of the requests answered with one of ERROR_STATUSES
+        retry_after (int): seconds of the Retry-After header of 429 and 503, not sent if None
+        seed (int): seed of the random errors, so runs are repeatable
+        """
+        self.catalogue_size = catalogue_size
+        self.latency = latency
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.request_count = 0
+        self.error_count = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', port), StubHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.stub = self
+        self._scheme = 'http'
+        if certfile:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(certfile)
+            self._httpd.socket = context.wrap_socket(self._httpd.socket, server_side=True)
+            self._scheme = 'https'
+        self._thread = None
+
+    @property
+    def base_url(self):
+        """
+        Base url to use as FATSECRET_BASE_URL
+        """
+        return f'{self._scheme}://127.0.0.1:{self._httpd.server_address[1]}'
+
+    def draw_error(self):
+        """
+        Get the status code of the error to answer the next request with, None for no error
+        """
+        if not self.error_rate:
+            return None
+        with self._lock:
+            if self._random.random() >= self.error_rate:
+                return None
+            self.error_count += 1
+            self.request_count += 1
+            return self._random.choice(ERROR_STATUSES)
+
+    def count_request(self):
+        """
+        Count one request served
+        """
+        with self._lock:
+            self.request_count += 1
+
+    def listing(self, path, page, meal_type):
+        """
+        Get the html of listing page number page, for all recipes if meal_type is None
+        """
+        if meal_type is None:
+            indexes = list(range(self.catalogue_size))
+            scrape_type = 'default'
+        else:
+            indexes = [i for i in range(self.catalogue_size) if meal_type in meal_types_of(i)]
+            scrape_type = 'meal_type'
+        page_count = max(1, -(-len(indexes) // ROWS_PER_PAGE))
+        page_indexes = indexes[page * ROWS_PER_PAGE:(page + 1) * ROWS_PER_PAGE]
+        return listing_page_html(page_indexes, page_count, path, scrape_type)
+
+    def start(self):
+        """
+        Start serving in a background thread
+        """
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stop serving and close the socket
+        """
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+def main():
+    """
+    Serve the stub website until interrupted
+    """
+    arg_parser = argparse.ArgumentParser(description=__doc__,
+                                         formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--port', type=int, default=8765)
+    arg_parser.add_argument('--recipes', type=int, default=1000)
+    arg_parser.add_argument('--latency', type=float, default=0.05)
+    arg_parser.add_argument('--error-rate', type=float, default=0.0)
+    arg_parser.add_argument('--retry-after', type=int, default=None)
+    args = arg_parser.parse_args()
+
+    server = StubServer(args.recipes, args.latency, args.port, error_rate=args.error_rate,
+                        retry_after=args.retry_after).start()
+    print(f'Serving {args.recipes} recipes at {server.base_url}, press Ctrl+C to stop')
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
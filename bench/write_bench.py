@@ -0,0 +1,83 @@
+"""
+Benchmark the write path of scraped recipes against the local mongod.
+Recipes stored one by one with store_scraped_recipe are compared with BulkRecipeWriter.
+Recipes are written to a bench table of the database, dropped after the run.
+
+Usage: python -m bench.write_bench [--recipes 5000] [--batch-size 500]
+"""
+import argparse
+import contextlib
+import io
+import time
+
+from scraper.bulk_writer import BulkRecipeWriter
+from scraper.database import Database, get_pool_stats
+
+BENCH_TABLE = 'write_bench_table'
+
+
+def make_recipes(number):
+    """
+    Get number scraped recipes with their urls
+    """
+    return [({'id': str(index), 'name': f'Recipe {index}', 'description': 'Bench recipe',
+              'yields': 2, 'prep time': 10, 'cook time': 20,
+              'meal types': ['Dinner'], 'ingredients': ['flour', 'water', 'salt'],
+              'instructions': ['Mix', 'Bake'], 'popularity': 95},
+             f'https://www.fatsecret.com/recipes/{index}-bench-recipe/Default.aspx')
+            for index in range(number)]
+
+
+def run_one_by_one(mongo_db, recipes):
+    """
+    Store recipes with store_scraped_recipe, return the elapsed seconds
+    """
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for recipe_dict, url in recipes:
+            mongo_db.store_scraped_recipe(recipe_dict, url)
+    return time.perf_counter() - start
+
+
+def run_bulk(mongo_db, recipes, batch_size):
+    """
+    Store recipes with BulkRecipeWriter, return the elapsed seconds
+    """
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        with BulkRecipeWriter(mongo_db, batch_size=batch_size, flush_interval=0) as writer:
+            for recipe_dict, url in recipes:
+                writer.add(recipe_dict, url)
+    return time.perf_counter() - start
+
+
+def main():
+    """
+    Run the benchmark and print one line per write path, for new and for stored recipes
+    """
+    arg_parser = argparse.ArgumentParser(description=__doc__,
+                                         formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--recipes', type=int, default=5000)
+    arg_parser.add_argument('--batch-size', type=int, default=500)
+    args = arg_parser.parse_args()
+
+    mongo_db = Database()
+    mongo_db.all_recipes_tb = mongo_db.food_recipe_db[BENCH_TABLE]
+    mongo_db.all_recipes_tb.create_index('id')
+    recipes = make_recipes(args.recipes)
+    try:
+        print(f'{args.recipes} recipes, batches of {args.batch_size}')
+        for name, run in (('one by one', lambda: run_one_by_one(mongo_db, recipes)),
+                          ('bulk', lambda: run_bulk(mongo_db, recipes, args.batch_size))):
+            mongo_db.all_recipes_tb.delete_many({})
+            inserted = run()
+            updated = run()
+            print(f'{name:<10}: insert {args.recipes / inserted:>8.0f} recipes/s, '
+                  f'update {args.recipes / updated:>8.0f} recipes/s')
+        print(f'connection pool: {get_pool_stats()}')
+    finally:
+        mongo_db.food_recipe_db.drop_collection(BENCH_TABLE)
+
+
+if __name__ == '__main__':
+    main()
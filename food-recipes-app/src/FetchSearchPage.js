@@ -0,0 +1,19 @@
+import FetchData from './FetchData';
+
+/**
+ * fetch a page of search results from web api, the page has results, has_more and cursor
+ * @param {string} queryStr query string of the search
+ * @param {string} cursor cursor of the page returned with the previous page, null for the first page
+ * @param {number} limit max number of results, null for the default of web api
+ * @param {string} sort field to sort by, '-' before it for descending order, null for the default
+ * @returns response
+ */
+async function FetchSearchPage(queryStr, cursor=null, limit=null, sort=null) {
+  let relUrl = 'search?q=' + encodeURIComponent(queryStr);
+  relUrl += limit ? '&limit=' + limit : '';
+  relUrl += sort ? '&sort=' + encodeURIComponent(sort) : '';
+  relUrl += cursor ? '&cursor=' + encodeURIComponent(cursor) : '';
+  return FetchData(relUrl, 'GET');
+}
+
+export default FetchSearchPage;
@@ -1,7 +1,7 @@
 import * as d3 from 'd3';
-import { useRef, useState, useEffect } from 'react';
+import { useRef } from 'react';
 import '../styles/Chart.css';
-import FetchData from '../FetchData';
+import FetchSearchPage from '../FetchSearchPage';
 
 /**
  * Bar chart displayed in tab 4
@@ -11,84 +11,44 @@ const Chart = () => {
   const inputK = useRef();
   const fieldSelected = useRef();
   const orderSelected = useRef();
-
-  const [hasLoadedAll, setHasLoadedAll] = useState(false);
-  const [allRecipes, setAllRecipes] = useState([]);
-
-  // fetch data of all recipes
-  useEffect(() => {
-    if (!hasLoadedAll) {
-    async function getData() {
-      const dataAll = await FetchData('search?q=all.name:', 'GET');
-      if (!Object.prototype.hasOwnProperty.call(dataAll, 'GET error')) {
-        setAllRecipes(dataAll);
-      }
-    }
-    getData();
-    setHasLoadedAll(true);
-  }
-  }, [hasLoadedAll, setHasLoadedAll, setAllRecipes]);
+  // max number of recipes in a page of web api search
+  const MAX_PAGE_LIMIT = 1000;
 
   /**
    * Function for draw button.
-   * Get the dict of recipes needed to show.
-   * Then sort the recipes by field value.
+   * Get the top k recipes sorted by field value from web api, page by page
+   * until k recipes with the field are got.
    * Then visualize the data using bar chart.
    */
   const draw = async () => {
     // get input values
-    const k = inputK.current.value;
+    const k = Number(inputK.current.value);
     const field = fieldSelected.current.value;
     const order = orderSelected.current.value;
+    if (!(k > 0)) return;
 
     let dataset = [];
-    // determine the number of recipes to show
-    let targetK = k;
-    if (allRecipes.length < k) {
-      targetK = allRecipes.length;
-    }
-    console.log(allRecipes.length);
-    // retrive only name and field key value pairs from original dict
-    for (let i = 0; i < allRecipes.length; i += 1) {
-      const doc = allRecipes[i];
-      if (field in doc) {
-        const newDoc = {};
-        newDoc.name = doc['name'];
-        newDoc[field] = doc[field];
-        dataset.push(newDoc);
+    let cursor = null;
+    do {
+      const sort = (order === 'desc' ? '-' : '') + field;
+      const data = await FetchSearchPage('all.name:', cursor, Math.min(k, MAX_PAGE_LIMIT), sort);
+      if (Object.prototype.hasOwnProperty.call(data, 'GET error')) {
+        break;
       }
-    }
-    // get sorted data by value in field
-    let sortedDataset = quicksort(dataset, field);
-    if (order === 'desc') {
-      // reverse the order
-      sortedDataset = sortedDataset.reverse();
-    }
-    if (sortedDataset.length > targetK) {
-      // get the targetK number of recipes starting from the front
-      sortedDataset = sortedDataset.slice(0, targetK);
-    }
-    visualize(sortedDataset, field);
-  }
-
-  /**
-   * sort the array in ascending order
-   * @param {list} array 
-   * @param {string} field 
-   * @returns sorted array
-   */
-  const quicksort = (array, field) => {
-    if (array.length <= 1) {
-      return array;
-    }
-    const left = [];
-    const right = [];
-    const pivot = array[0];
-    const pivotVal = Number(pivot[field]);
-    for (let i = 1; i < array.length; i++) {
-      Number(array[i][field]) < pivotVal ? left.push(array[i]) : right.push(array[i]);
-    }
-    return quicksort(left, field).concat(pivot, quicksort(right, field));
+      // retrive only name and field key value pairs from original dict
+      for (let i = 0; i < data.results.length; i += 1) {
+        const doc = data.results[i];
+        if (field in doc) {
+          const newDoc = {};
+          newDoc.name = doc['name'];
+          newDoc[field] = doc[field];
+          dataset.push(newDoc);
+        }
+      }
+      cursor = data.has_more ? data.cursor : null;
+    } while (dataset.length < k && cursor);
+    // get the k number of recipes starting from the front
+    visualize(dataset.slice(0, k), field);
   }
 
   /**
@@ -1,8 +1,16 @@
 import { useEffect, useState } from 'react';
-import FetchData from '../FetchData';
+import FetchSearchPage from '../FetchSearchPage';
 import '../styles/List.css'
 import { Link } from 'react-router-dom';
 
+/**
+ * get the query string and cursor to fetch the page after a page of search results
+ * @param {string} queryStr query string of the search
+ * @param {dict} data page of search results
+ * @returns next page, null if there are no more results
+ */
+export const nextPageOf = (queryStr, data) => data.has_more ? {query: queryStr, cursor: data.cursor} : null;
+
 /**
  * List of recipes with image and name displayed in tab 1 and tab 2.
  * @returns List react component
@@ -19,12 +27,13 @@ const List = (props) => {
   useEffect(() => {
     if (props.tab === 1 && !hasLoadedAll) {
     async function getData() {
-      const dataAll = await FetchData('search?q=all.name:', 'GET');
+      const dataAll = await FetchSearchPage('all.name:');
       if (!Object.prototype.hasOwnProperty.call(dataAll, 'GET error')) {
-        props.setAllRecipes(dataAll);
+        props.setAllRecipes(dataAll.results);
+        props.setPages(prevPages => ({all: nextPageOf('all.name:', dataAll), fav: prevPages.fav}));
 
-        for (let i = props.countAll; i < props.countAll + NUMBER_ITEM_APPEND && i < dataAll.length; i += 1) {
-          props.setState(prevState => ({allRecipeList: [...prevState.allRecipeList, dataAll[i]],
+        for (let i = props.countAll; i < props.countAll + NUMBER_ITEM_APPEND && i < dataAll.results.length; i += 1) {
+          props.setState(prevState => ({allRecipeList: [...prevState.allRecipeList, dataAll.results[i]],
             favRecipeList: [...prevState.favRecipeList]}));
         }
         props.setCountAll(props.countAll + NUMBER_ITEM_APPEND);
@@ -38,13 +47,14 @@ const List = (props) => {
   useEffect(() => {
     if (props.tab === 2 && !hasLoadedFav) {
       async function getData() {
-        const dataFav = await FetchData('search?q=fav.name:', 'GET');
+        const dataFav = await FetchSearchPage('fav.name:');
         if (!Object.prototype.hasOwnProperty.call(dataFav, 'GET error')) {
-          props.setFavRecipes(dataFav);
+          props.setFavRecipes(dataFav.results);
+          props.setPages(prevPages => ({all: prevPages.all, fav: nextPageOf('fav.name:', dataFav)}));
 
-          for (let i = props.countFav; i < props.countFav + NUMBER_ITEM_APPEND && i < dataFav.length; i += 1) {
+          for (let i = props.countFav; i < props.countFav + NUMBER_ITEM_APPEND && i < dataFav.results.length; i += 1) {
           props.setState(prevState => ({allRecipeList: [...prevState.allRecipeList],
-            favRecipeList: [...prevState.favRecipeList, dataFav[i]]}));
+            favRecipeList: [...prevState.favRecipeList, dataFav.results[i]]}));
           }
           props.setCountFav(props.countFav + NUMBER_ITEM_APPEND);
         }
@@ -55,25 +65,47 @@ const List = (props) => {
   }, [hasLoadedFav, setHasLoadedFav, props]);
 
   /**
-   * append more list of recipes from all recipes table to display
+   * append more list of recipes from all recipes table to display,
+   * the next page of the search is fetched when the loaded recipes are all displayed
    */
-  const appendAllData = () => {
+  const appendAllData = async () => {
     if (!props.allRecipes) return;
-    for (let i = props.countAll; i < props.countAll + NUMBER_ITEM_APPEND && i < props.allRecipes.length; i += 1) {
-      props.setState(prevState => ({allRecipeList: [...prevState.allRecipeList, props.allRecipes[i]],
+    let recipes = props.allRecipes;
+    const page = props.pages.all;
+    if (page && props.countAll + NUMBER_ITEM_APPEND > recipes.length) {
+      const dataAll = await FetchSearchPage(page.query, page.cursor);
+      if (!Object.prototype.hasOwnProperty.call(dataAll, 'GET error')) {
+        recipes = [...recipes, ...dataAll.results];
+        props.setAllRecipes(recipes);
+        props.setPages(prevPages => ({all: nextPageOf(page.query, dataAll), fav: prevPages.fav}));
+      }
+    }
+    for (let i = props.countAll; i < props.countAll + NUMBER_ITEM_APPEND && i < recipes.length; i += 1) {
+      props.setState(prevState => ({allRecipeList: [...prevState.allRecipeList, recipes[i]],
         favRecipeList: [...prevState.favRecipeList]}));
     }
     props.setCountAll(props.countAll + NUMBER_ITEM_APPEND);
   }
 
   /**
-   * append more list of recipes from favourite recipes table to display
+   * append more list of recipes from favourite recipes table to display,
+   * the next page of the search is fetched when the loaded recipes are all displayed
    */
-  const appendFavData = () => {
+  const appendFavData = async () => {
     if (!props.favRecipes) return;
-    for (let i = props.countFav; i < props.countFav + NUMBER_ITEM_APPEND && i < props.favRecipes.length; i += 1) {
+    let recipes = props.favRecipes;
+    const page = props.pages.fav;
+    if (page && props.countFav + NUMBER_ITEM_APPEND > recipes.length) {
+      const dataFav = await FetchSearchPage(page.query, page.cursor);
+      if (!Object.prototype.hasOwnProperty.call(dataFav, 'GET error')) {
+        recipes = [...recipes, ...dataFav.results];
+        props.setFavRecipes(recipes);
+        props.setPages(prevPages => ({all: prevPages.all, fav: nextPageOf(page.query, dataFav)}));
+      }
+    }
+    for (let i = props.countFav; i < props.countFav + NUMBER_ITEM_APPEND && i < recipes.length; i += 1) {
       props.setState(prevState => ({allRecipeList: [...prevState.allRecipeList],
-      favRecipeList: [...prevState.favRecipeList, props.favRecipes[i]]}));
+      favRecipeList: [...prevState.favRecipeList, recipes[i]]}));
     }
     props.setCountFav(props.countFav + NUMBER_ITEM_APPEND);
   }
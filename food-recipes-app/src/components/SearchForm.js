@@ -1,5 +1,6 @@
 import { useRef, useState, useEffect } from 'react';
-import FetchData from '../FetchData';
+import FetchSearchPage from '../FetchSearchPage';
+import { nextPageOf } from './List';
 import '../styles/SearchForm.css';
 
 /**
@@ -36,11 +37,13 @@ const SearchForm = (props) => {
     queryStr = queryStr ? queryStr : 'all.name:';
     console.log(queryStr);
 
-    const dataAll = await FetchData('search?q=' + queryStr, 'GET');
+    const dataAll = await FetchSearchPage(queryStr);
     if (!Object.prototype.hasOwnProperty.call(dataAll, 'GET error')) {
-      props.setAllRecipes(dataAll);
+      props.setAllRecipes(dataAll.results);
+      props.setPages(prevPages => ({all: nextPageOf(queryStr, dataAll), fav: prevPages.fav}));
     } else {
       props.setAllRecipes([{id: '-1', name: 'GET error: ' + dataAll['GET error']}]);
+      props.setPages(prevPages => ({all: null, fav: prevPages.fav}));
     }
     props.setState(prevState => ({allRecipeList: [],
                                   favRecipeList: [...prevState.favRecipeList]}));
@@ -61,11 +64,13 @@ const SearchForm = (props) => {
     queryStr = queryStr ? queryStr : 'fav.name:';
     console.log(queryStr);
 
-    const dataFav = await FetchData('search?q=' + queryStr, 'GET');
+    const dataFav = await FetchSearchPage(queryStr);
     if (!Object.prototype.hasOwnProperty.call(dataFav, 'GET error')) {
-      props.setFavRecipes(dataFav);
+      props.setFavRecipes(dataFav.results);
+      props.setPages(prevPages => ({all: prevPages.all, fav: nextPageOf(queryStr, dataFav)}));
     } else {
       props.setFavRecipes([{id: '-2', name: 'GET error: no match recipes'}]);
+      props.setPages(prevPages => ({all: prevPages.all, fav: null}));
     }
     props.setState(prevState => ({allRecipeList: [...prevState.allRecipeList],
                                   favRecipeList: []}));
@@ -22,6 +22,8 @@ const Tabs = () => {
   const [countAll, setCountAll] = useState(0);
   // size of favourite recipes list to display
   const [countFav, setCountFav] = useState(0);
+  // query string and cursor of the next page of all recipes and favourite recipes, null if none
+  const [pages, setPages] = useState({all: null, fav: null});
 
   const toggleTab = (index) => {
     setToggleState(index);
@@ -65,13 +67,15 @@ const Tabs = () => {
         >
           {/* component for search */}
           <SearchForm tab={1} allRecipes={allRecipes} favRecipes={favRecipes} countAll={countAll} countFav={countFav}
-          setState={setState} setAllRecipes={setAllRecipes} setFavRecipes={setFavRecipes} setCountAll={setCountAll} setCountFav={setCountFav}/>
+          setState={setState} setAllRecipes={setAllRecipes} setFavRecipes={setFavRecipes} setCountAll={setCountAll} setCountFav={setCountFav}
+          pages={pages} setPages={setPages}/>
           
           <hr />
 
           {/* component for display list of recipes */}
           <List tab={1} state={state} allRecipes={allRecipes} favRecipes={favRecipes} countAll={countAll} countFav={countFav} 
-          setState={setState} setAllRecipes={setAllRecipes} setFavRecipes={setFavRecipes} setCountAll={setCountAll} setCountFav={setCountFav}/>
+          setState={setState} setAllRecipes={setAllRecipes} setFavRecipes={setFavRecipes} setCountAll={setCountAll} setCountFav={setCountFav}
+          pages={pages} setPages={setPages}/>
         </div>
 
         {/* favourite recipes tab */}
@@ -80,13 +84,15 @@ const Tabs = () => {
         >
           {/* component for search */}
           <SearchForm tab={2} allRecipes={allRecipes} favRecipes={favRecipes} countAll={countAll} countFav={countFav}
-          setState={setState} setAllRecipes={setAllRecipes} setFavRecipes={setFavRecipes} setCountAll={setCountAll} setCountFav={setCountFav}/>
+          setState={setState} setAllRecipes={setAllRecipes} setFavRecipes={setFavRecipes} setCountAll={setCountAll} setCountFav={setCountFav}
+          pages={pages} setPages={setPages}/>
           
           <hr />
 
           {/* component for display list of recipes */}
           <List tab={2} state={state} allRecipes={allRecipes} favRecipes={favRecipes} countAll={countAll} countFav={countFav}
-           setState={setState} setAllRecipes={setAllRecipes} setFavRecipes={setFavRecipes} setCountAll={setCountAll} setCountFav={setCountFav}/>
+           setState={setState} setAllRecipes={setAllRecipes} setFavRecipes={setFavRecipes} setCountAll={setCountAll} setCountFav={setCountFav}
+          pages={pages} setPages={setPages}/>
         </div>
 
         {/* update form tab */}
@@ -0,0 +1,124 @@
+"""
+Module for the buffered bulk writer of scraped recipes.
+Storing recipes one by one costs several round trips to mongoDB each,
+so scraped recipes are buffered and written together by Database.store_scraped_recipes,
+one unordered bulk write of upserts by id per batch.
+Recipes whose content did not change since stored only get their scrape time written.
+"""
+import threading
+
+from pymongo.errors import PyMongoError
+
+from scraper.constant import BULK_WRITE_SIZE, BULK_WRITE_INTERVAL
+from scraper.database import INSERTED, UPDATED, UNCHANGED
+from scraper.utils import is_id_present
+
+
+class BulkRecipeWriter:
+    """
+    Buffer of scraped recipes written to all recipes table in batches.
+    A batch is written when batch_size recipes are buffered, every flush_interval seconds,
+    and when the writer is closed. Safe to share between threads.
+    """
+
+    def __init__(self, mongo_db, batch_size=BULK_WRITE_SIZE, flush_interval=BULK_WRITE_INTERVAL):
+        """
+        Parameters:
+        mongo_db (obj): Database instance to store recipes
+        batch_size (int): number of recipes buffered before they are written
+        flush_interval (float): seconds between writes of the buffer, 0 to write full batches only
+        """
+        self.mongo_db = mongo_db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        # number of recipes written by store result
+        self.results = {INSERTED: 0, UPDATED: 0, UNCHANGED: 0}
+        # id to recipe dict, url and callbacks, a recipe scraped twice is written once
+        self._buffer = {}
+        self._lock = threading.Lock()
+        # one batch is written at a time, so callbacks run in the order recipes are written
+        self._flush_lock = threading.Lock()
+        self._closed = threading.Event()
+        self._flusher = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def add(self, recipe_dict, url, on_written=None):
+        """
+        Buffer a scraped recipe, write the batch if it is full.
+        Return False if the recipe has no id.
+
+        Parameters:
+        recipe_dict (dict): dict of recipe scraped
+        url (str): url of food recipe page
+        on_written (callable): called with no argument once the recipe is written
+        """
+        if not is_id_present(recipe_dict):
+            print('Error: id is not found')
+            return False
+        with self._lock:
+            _, _, callbacks = self._buffer.pop(recipe_dict['id'], (None, None, []))
+            if on_written:
+                callbacks.append(on_written)
+            self._buffer[recipe_dict['id']] = (recipe_dict, url, callbacks)
+            is_full = len(self._buffer) >= self.batch_size
+            if self._flusher is None and self.flush_interval > 0:
+                self._flusher = threading.Thread(target=self._flush_periodically, daemon=True)
+                self._flusher.start()
+        if is_full:
+            self.flush()
+        return True
+
+    def flush(self):
+        """
+        Write the buffered recipes in one bulk write.
+        Recipes are kept in the buffer if the database cannot be reached.
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch = list(self._buffer.values())
+                self._buffer = {}
+            if not batch:
+                return
+            try:
+                results = self.mongo_db.store_scraped_recipes(
+                    [(recipe_dict, url) for recipe_dict, url, _ in batch])
+            except PyMongoError as err:
+                print(f'Error: {len(batch)} recipes could not be written: {err}')
+                with self._lock:
+                    for recipe_dict, url, callbacks in batch:
+                        # a recipe scraped again meanwhile is newer than the one of the batch
+                        entry = self._buffer.setdefault(recipe_dict['id'],
+                                                        (recipe_dict, url, []))
+                        entry[2][:0] = callbacks
+                return
+            written = 0
+            for (_, _, callbacks), result in zip(batch, results):
+                if result is None:
+                    continue
+                written += 1
+                with self._lock:
+                    self.results[result] += 1
+                for callback in callbacks:
+                    callback()
+            print(f'{written} recipes written to all recipes table')
+
+    def close(self):
+        """
+        Stop the periodic writes and write the recipes left in the buffer
+        """
+        self._closed.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        self.flush()
+
+    def _flush_periodically(self):
+        """
+        Write the buffer every flush_interval seconds until the writer is closed
+        """
+        while not self._closed.wait(self.flush_interval):
+            self.flush()
@@ -1,12 +1,14 @@
 """
 Module to store constant variables
 """
-# url for the Fatsecret website
-BASE_URL = 'https://www.fatsecret.com'
+import os
+
+# url for the Fatsecret website, can be pointed to a local stand-in by FATSECRET_BASE_URL
+BASE_URL = os.getenv('FATSECRET_BASE_URL', 'https://www.fatsecret.com')
 # url for random scrape
-DEFAULT_URL = 'https://www.fatsecret.com/Default.aspx?pa=rs'
+DEFAULT_URL = BASE_URL + '/Default.aspx?pa=rs'
 # part of url for scrape by meal type before the meal type
-TYPE_URL_PRE = 'https://www.fatsecret.com/recipes/collections/meal/'
+TYPE_URL_PRE = BASE_URL + '/recipes/collections/meal/'
 # part of url for scrape by meal type after the meal type
 TYPE_URL_AFT = '/MostPopular.aspx'
 # meal types to put between TYPE_URL_PRE and TYPE_URL_AFT
@@ -17,6 +19,106 @@ MEAL_TYPES = ['default', 'appetizer', 'bakery-and-baked-products', 'breakfast',
 CLASS_NAME_DICT = {'default': {'table_class': 'listtable searchResult', 'td_class': 'borderBottom'},
                    'meal_type': {'table_class': 'listtable',
                                  'td_class': 'borderBottom recipeSummary'}}
+# selectors of the recipe fields in the generic table of food recipe page, used by extractor.py
+# field: (scope selector, target selector, whether to take all targets in scope)
+# selector: (tag name, class, id), None matches any; scope None is the whole table
+RECIPE_FIELD_SELECTORS = {
+    'id': (('div', 'imgFrame', None), ('a', None, None), False),
+    'name': (('div', 'top', None), ('h1', 'fn', None), False),
+    'description': (None, ('span', 'summary', None), False),
+    'image url': (None, ('img', None, None), False),
+    'yields': ((None, None, 'servings'), ('div', 'yield', None), False),
+    'prep time': ((None, None, 'cooktime'), ('div', 'prepTime', None), False),
+    'cook time': ((None, None, 'cooktime'), ('div', 'cookTime', None), False),
+    'meal types': ((None, None, 'mealtypes'), ('div', 'tag', None), True),
+    'ingredients': (('ul', 'plain ingredients', None), ('li', None, None), True),
+    'instructions': (('ol', 'noind instructions', None), ('li', None, None), True),
+    'popularity': (None, ('div', 'bluebg', None), False)
+}
+# number of pages fetched at the same time when scraping many recipes, 1 means sequential
+CRAWL_CONCURRENCY = 8
+# number of worker processes crawling meal types at the same time
+CRAWL_PROCESSES = int(os.getenv('SCRAPER_CRAWL_PROCESSES', str(os.cpu_count() or 1)))
+# number of threads parsing pages and storing recipes in the crawl pipeline
+PARSE_WORKERS = 1
+STORE_WORKERS = 2
+# number of processes parsing food recipe pages of a concurrent crawl, 0 to parse in threads
+PARSE_PROCESSES = int(os.getenv('SCRAPER_PARSE_PROCESSES', '0'))
+# max number of items waiting between two stages of the crawl pipeline
+PIPELINE_QUEUE_SIZE = 2 * CRAWL_CONCURRENCY
+# seconds to wait for connecting to the website and for each read
+HTTP_TIMEOUT = float(os.getenv('HTTP_TIMEOUT', '15'))
+# max number of idle kept-alive connections per host, enough for every crawl thread
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', str(CRAWL_CONCURRENCY)))
+# User-Agent header sent with every request
+HTTP_USER_AGENT = 'Mozilla/5.0 (compatible; FoodRecipesScraper/1.0)'
+# number of times a failed fetch is retried, with jittered exponential back off
+HTTP_MAX_RETRIES = int(os.getenv('HTTP_MAX_RETRIES', '4'))
+# seconds of the first back off and max seconds of any back off
+HTTP_BACKOFF_BASE = 0.5
+HTTP_BACKOFF_MAX = 30.0
+# requests per second to each host: to start with, lowest, and highest, 0 to not pace requests
+RATE_LIMIT_INITIAL = float(os.getenv('SCRAPER_RATE_LIMIT_INITIAL', '4'))
+RATE_LIMIT_MIN = 0.2
+RATE_LIMIT_MAX = float(os.getenv('SCRAPER_RATE_LIMIT_MAX', '20'))
+# requests per second added after a healthy response, factor of the rate after a throttle
+RATE_LIMIT_INCREASE = 0.25
+RATE_LIMIT_DECREASE = 0.5
+# directory of the on-disk cache of fetched pages, empty to disable the cache
+HTTP_CACHE_DIR = os.getenv('SCRAPER_CACHE_DIR', '.scraper_cache')
+# max total bytes of cached pages
+HTTP_CACHE_MAX_SIZE = int(os.getenv('SCRAPER_CACHE_MAX_SIZE', str(512 * 1024 * 1024)))
+# seconds a cached page is kept after it was last fetched or revalidated
+HTTP_CACHE_MAX_AGE = float(os.getenv('SCRAPER_CACHE_MAX_AGE', str(7 * 24 * 3600)))
+# replay pages from the cache only, with no network traffic
+HTTP_CACHE_ONLY = os.getenv('SCRAPER_CACHE_ONLY', '') == '1'
+# scrape recipes already stored again instead of skipping them by the id in their link
+FORCE_REFRESH = os.getenv('SCRAPER_FORCE_REFRESH', '') == '1'
+# fields kept with a scraped recipe to refresh it, they are not part of the recipe
+METADATA_FIELDS = ('fingerprint', 'url', 'scraped at')
+# attributes searched by words, their terms are kept in the fields of SEARCH_TERMS_FIELDS
+TEXT_ATTRIBUTES = ('name', 'description', 'ingredients', 'instructions')
+SEARCH_TERMS_FIELDS = tuple(f'{attribute} terms' for attribute in TEXT_ATTRIBUTES)
+# projection of recipes read for output, without _id, the metadata and the search terms
+RECIPE_PROJECTION = {'_id': 0, **{field: 0 for field in METADATA_FIELDS + SEARCH_TERMS_FIELDS}}
+# storage backend of Database, overridden by the environment or .env:
+# 'mongo' for the mongoDB server of HOST and PORT,
+# 'embedded' for the SQLite file of EMBEDDED_DB_PATH, kept in process
+STORAGE_BACKEND = 'mongo'
+EMBEDDED_DB_PATH = 'food_recipes.sqlite3'
+# defaults of the mongoDB client settings, overridden by MONGO_* variables of the environment or .env
+MONGO_MAX_POOL_SIZE = 100
+MONGO_MIN_POOL_SIZE = 0
+MONGO_MAX_IDLE_TIME_MS = 300000
+MONGO_CONNECT_TIMEOUT_MS = 20000
+MONGO_SERVER_SELECTION_TIMEOUT_MS = 30000
+# 0 waits for replies with no time limit
+MONGO_SOCKET_TIMEOUT_MS = 0
+# wire compressors by preference, e.g. 'zstd,snappy,zlib', empty for none
+MONGO_COMPRESSORS = ''
+# recipes buffered before they are written to the database in one bulk write
+BULK_WRITE_SIZE = int(os.getenv('SCRAPER_BULK_WRITE_SIZE', '500'))
+# seconds between writes of the buffered recipes, 0 to write them only when the buffer is full
+BULK_WRITE_INTERVAL = float(os.getenv('SCRAPER_BULK_WRITE_INTERVAL', '2'))
+# directory of the journals of crawls, to resume an interrupted crawl
+FRONTIER_DIR = os.getenv('SCRAPER_FRONTIER_DIR', '.scraper_frontier')
+# seconds a task leased from the distributed crawl queue is hidden from other nodes
+WORK_LEASE_TIMEOUT = float(os.getenv('SCRAPER_WORK_LEASE_TIMEOUT', '120'))
+# leases of a task before it is marked failed
+WORK_MAX_ATTEMPTS = int(os.getenv('SCRAPER_WORK_MAX_ATTEMPTS', '3'))
+# seconds a node waits for tasks leased by other nodes to finish or expire
+WORK_POLL_INTERVAL = 1.0
+# parser backend of BeautifulSoup: 'lxml', 'html.parser', or 'auto' for lxml if installed
+HTML_PARSER = os.getenv('SCRAPER_HTML_PARSER', 'auto')
+# parse only the parts of pages read by the scraper, set to 0 to parse whole pages
+RESTRICTED_PARSE = os.getenv('SCRAPER_RESTRICTED_PARSE', '1') == '1'
+# number of query strings of the web api whose compiled mongoDB filter is kept, 0 to not cache
+QUERY_CACHE_SIZE = int(os.getenv('API_QUERY_CACHE_SIZE', '256'))
+# number of results in a page of the web api search when no limit is given, and the max limit
+SEARCH_PAGE_SIZE = int(os.getenv('API_SEARCH_PAGE_SIZE', '50'))
+SEARCH_MAX_LIMIT = int(os.getenv('API_SEARCH_MAX_LIMIT', '1000'))
+# max number of recipes found by words that are ranked for a page sorted by relevance
+SEARCH_RANK_CANDIDATES = int(os.getenv('API_SEARCH_RANK_CANDIDATES', '1000'))
 # option values used in menu
 OPTION_EXIT = 'q'
 OPTION_BACK = 'b'
@@ -33,3 +135,4 @@ OPTION_NINE = 9
 OPTION_TEN = 10
 OPTION_ELEVEN = 11
 OPTION_TWELVE = 12
+OPTION_THIRTEEN = 13
@@ -1,34 +1,334 @@
 """
-Module for the database class, MongoDB is used here.
+Module for the database class, MongoDB or the embedded backend of STORAGE_BACKEND is used here.
 """
+import hashlib
+import json
 import os
+import threading
+import time
 
 import pymongo
+from pymongo import monitoring
+from pymongo.errors import BulkWriteError, ConnectionFailure, OperationFailure
 from dotenv import load_dotenv
+from scraper.constant import MONGO_MAX_POOL_SIZE, MONGO_MIN_POOL_SIZE, MONGO_MAX_IDLE_TIME_MS, \
+    MONGO_CONNECT_TIMEOUT_MS, MONGO_SERVER_SELECTION_TIMEOUT_MS, MONGO_SOCKET_TIMEOUT_MS, \
+    MONGO_COMPRESSORS, RECIPE_PROJECTION, STORAGE_BACKEND, EMBEDDED_DB_PATH, TEXT_ATTRIBUTES, \
+    SEARCH_TERMS_FIELDS, METADATA_FIELDS
+from scraper.embedded_store import EmbeddedClient
+from scraper.extractor import minutes_of
+from scraper.text_search import terms_field_of, terms_values_of
 from scraper.utils import is_id_present
 
 ALL_RECIPES = 0
 FAVOURITES = 1
+# values of STORAGE_BACKEND
+MONGO_BACKEND = 'mongo'
+EMBEDDED_BACKEND = 'embedded'
 ATTRIBUTES = {'id', 'image url', 'yields', 'prep time', 'cook time', 'meal types', 'name',
               'description', 'ingredients', 'instructions', 'popularity'}
+# attributes stored as int, searched by range
+NUMERIC_ATTRIBUTES = {'yields', 'prep time', 'cook time', 'popularity'}
+# results of store_scraped_recipe
+INSERTED = 'inserted'
+UPDATED = 'updated'
+UNCHANGED = 'unchanged'
+# names of tables in messages
+TABLE_NAMES = {ALL_RECIPES: 'all recipes table', FAVOURITES: 'favourites table'}
+# indexes of both tables: one recipe per id, and the fields searched and sorted by the api.
+# indexes of the terms of the text attributes are their inverted indexes.
+# numeric attributes are indexed with id, the order of the pages of search results sorted by them
+RECIPE_INDEXES = [pymongo.IndexModel([('id', pymongo.ASCENDING)], name='id', unique=True)] + \
+                 [pymongo.IndexModel([(field, pymongo.ASCENDING)], name=field)
+                  for field in ('meal types',) + SEARCH_TERMS_FIELDS] + \
+                 [pymongo.IndexModel([(field, pymongo.ASCENDING), ('id', pymongo.ASCENDING)],
+                                     name=f'{field}, id')
+                  for field in ('yields', 'popularity', 'prep time', 'cook time')]
+# indexes of each table, all recipes are also sorted by scrape time to refresh the stale ones.
+# favourites hold the id and the attributes differing from the recipe only, so only id is indexed
+INDEXES = {
+    ALL_RECIPES: RECIPE_INDEXES + [pymongo.IndexModel([('scraped at', pymongo.ASCENDING)],
+                                                      name='scraped at')],
+    FAVOURITES: RECIPE_INDEXES[:1]
+}
+
+
+def fingerprint_of(recipe_dict):
+    """
+    Get the sha256 of the attributes of recipe_dict, the same for recipes with the same content.
+    Empty attributes are left out, 0 is a value, e.g. 0 mins of cook time.
+    """
+    content = {attribute: recipe_dict[attribute] for attribute in ATTRIBUTES
+               if recipe_dict.get(attribute) not in (None, '', [])}
+    return hashlib.sha256(json.dumps(content, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """
+    Counters of the connection pool events of the shared client
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stats = {'connections created': 0, 'connections closed': 0, 'checked out': 0,
+                      'checkout failures': 0, 'in use': 0, 'max in use': 0, 'pool clears': 0}
+
+    def _count(self, name, step=1):
+        with self._lock:
+            self.stats[name] += step
+
+    def get_stats(self):
+        """
+        Get a copy of the counters, with the connections open
+        """
+        with self._lock:
+            stats = dict(self.stats)
+        stats['open'] = stats['connections created'] - stats['connections closed']
+        return stats
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.stats['checked out'] += 1
+            self.stats['in use'] += 1
+            self.stats['max in use'] = max(self.stats['max in use'], self.stats['in use'])
+
+    def connection_checked_in(self, event):
+        self._count('in use', -1)
+
+    def connection_created(self, event):
+        self._count('connections created')
+
+    def connection_closed(self, event):
+        self._count('connections closed')
+
+    def connection_check_out_failed(self, event):
+        self._count('checkout failures')
+
+    def pool_cleared(self, event):
+        self._count('pool clears')
+
+    def pool_created(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+
+_SHARED_CLIENT = None
+_POOL_STATS = None
+_EMBEDDED_CLIENT = None
+_SHARED_CLIENT_LOCK = threading.Lock()
+
+
+def mongo_client_options():
+    """
+    Get the settings of the mongoDB client from the environment, after .env is loaded
+    """
+    options = {
+        'maxPoolSize': int(os.getenv('MONGO_MAX_POOL_SIZE', str(MONGO_MAX_POOL_SIZE))),
+        'minPoolSize': int(os.getenv('MONGO_MIN_POOL_SIZE', str(MONGO_MIN_POOL_SIZE))),
+        'maxIdleTimeMS': int(os.getenv('MONGO_MAX_IDLE_TIME_MS', str(MONGO_MAX_IDLE_TIME_MS))),
+        'connectTimeoutMS': int(os.getenv('MONGO_CONNECT_TIMEOUT_MS',
+                                          str(MONGO_CONNECT_TIMEOUT_MS))),
+        'serverSelectionTimeoutMS': int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS',
+                                                  str(MONGO_SERVER_SELECTION_TIMEOUT_MS))),
+        'socketTimeoutMS': int(os.getenv('MONGO_SOCKET_TIMEOUT_MS',
+                                         str(MONGO_SOCKET_TIMEOUT_MS))) or None
+    }
+    compressors = os.getenv('MONGO_COMPRESSORS', MONGO_COMPRESSORS)
+    if compressors:
+        options['compressors'] = compressors
+    return options
+
+
+def get_mongo_client():
+    """
+    Get the MongoClient shared in this process, created on the first call.
+    It connects on its first operation, so a process that never queries opens no connection.
+    """
+    global _SHARED_CLIENT, _POOL_STATS
+    with _SHARED_CLIENT_LOCK:
+        if _SHARED_CLIENT is None:
+            load_dotenv()
+            port = os.getenv('PORT')
+            _POOL_STATS = PoolStatsListener()
+            _SHARED_CLIENT = pymongo.MongoClient(os.getenv('HOST'), int(port) if port else None,
+                                                 connect=False, event_listeners=[_POOL_STATS],
+                                                 **mongo_client_options())
+        return _SHARED_CLIENT
+
+
+def get_embedded_client():
+    """
+    Get the client of the embedded backend shared in this process, created on the first call
+    """
+    global _EMBEDDED_CLIENT
+    with _SHARED_CLIENT_LOCK:
+        if _EMBEDDED_CLIENT is None:
+            load_dotenv()
+            _EMBEDDED_CLIENT = EmbeddedClient(os.getenv('EMBEDDED_DB_PATH', EMBEDDED_DB_PATH))
+        return _EMBEDDED_CLIENT
+
+
+def get_storage_client():
+    """
+    Get the client shared in this process of the backend chosen by STORAGE_BACKEND
+    """
+    load_dotenv()
+    backend = os.getenv('STORAGE_BACKEND', STORAGE_BACKEND)
+    if backend == MONGO_BACKEND:
+        return get_mongo_client()
+    if backend == EMBEDDED_BACKEND:
+        return get_embedded_client()
+    raise ValueError(f'STORAGE_BACKEND is {backend}, it should be {MONGO_BACKEND} '
+                     f'or {EMBEDDED_BACKEND}')
+
+
+def get_pool_stats():
+    """
+    Get the counters of the connection pool of the shared client, None if it is not created
+    """
+    with _SHARED_CLIENT_LOCK:
+        return _POOL_STATS.get_stats() if _POOL_STATS else None
+
+
+def reset_shared_clients():
+    """
+    Forget the shared clients in a forked child process,
+    neither a MongoClient nor a SQLite connection is safe to use across fork,
+    the child creates its own
+    """
+    global _SHARED_CLIENT, _POOL_STATS, _EMBEDDED_CLIENT, _SHARED_CLIENT_LOCK
+    _SHARED_CLIENT = None
+    _POOL_STATS = None
+    _EMBEDDED_CLIENT = None
+    _SHARED_CLIENT_LOCK = threading.Lock()
+
+
+os.register_at_fork(after_in_child=reset_shared_clients)
+
+
+def number_of(attribute, value):
+    """
+    Get the int of a value of NUMERIC_ATTRIBUTES, None if it is not a number.
+    Strings are converted, with the units kept by older versions: '1 hr 5 mins', '6 servings',
+    and thousands separators: '1,234 people'.
+    """
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if not isinstance(value, str) or not value.strip():
+        return None
+    text = value.strip().replace(',', '')
+    if text.isdecimal():
+        return int(text)
+    if attribute in ('prep time', 'cook time'):
+        try:
+            return minutes_of(text)
+        except (ValueError, IndexError):
+            return None
+    word = text.split(' ')[0].rstrip('%')
+    return int(word) if word.isdecimal() else None
+
+
+def valid_values_of(recipe_dict, verbose=True):
+    """
+    Get the attributes of recipe_dict to write, other than id, NUMERIC_ATTRIBUTES as int,
+    with the search terms of the TEXT_ATTRIBUTES written.
+    Attributes not in ATTRIBUTES, empty values and numeric attributes that are not numbers
+    are left out, and reported if verbose.
+    """
+    recipe_id = recipe_dict.get('id')
+    values = {}
+    for attribute, value in recipe_dict.items():
+        # skip id because id will not change
+        if attribute == 'id':
+            continue
+        # check error of malformed data structure
+        if attribute not in ATTRIBUTES:
+            if verbose:
+                print(f'Malformed data structure: '
+                      f'recipe with id {recipe_id} has invalid attribute {attribute}')
+            continue
+        if value in (None, '', []):
+            if verbose:
+                print(f'Malformed data structure: '
+                      f'recipe with id {recipe_id} has empty value for attribute {attribute}')
+            continue
+        if attribute in NUMERIC_ATTRIBUTES:
+            value = number_of(attribute, value)
+            if value is None:
+                if verbose:
+                    print(f'Malformed data structure: recipe with id {recipe_id} '
+                          f'has value of attribute {attribute} that is not a number')
+                continue
+        values[attribute] = value
+    values.update(terms_values_of(values))
+    return values
 
 
 class Database:
     """
-    Database class that stores the database and tables using mongoDB.
+    Database class that stores the database and tables using mongoDB or the embedded backend.
     Support update and insert to the database.
     Check errors if document to insert is not valid.
     """
 
-    def __init__(self):
+    def __init__(self, client=None):
         """
-        Connect to database and initialize tables
+        Initialize tables on the client shared in the process of the backend of STORAGE_BACKEND,
+        connected on first use
+
+        Parameters:
+        client (obj): MongoClient or EmbeddedClient to use instead of the shared one
         """
-        load_dotenv()
-        self.client = pymongo.MongoClient(os.getenv('HOST'), os.getenv('PORT'))
+        self.client = client or get_storage_client()
         self.food_recipe_db = self.client['FoodRecipes']
         self.all_recipes_tb = self.food_recipe_db.all_recipes_table
         self.favourites_tb = self.food_recipe_db.favourites_table
+        # work queue of the crawls shared by several scraper nodes
+        self.crawl_queue_tb = self.food_recipe_db.crawl_queue_table
+        self.crawls_tb = self.food_recipe_db.crawls_table
+        self.crawl_nodes_tb = self.food_recipe_db.crawl_nodes_table
+
+    def ensure_indexes(self):
+        """
+        Create the INDEXES of both tables that do not exist yet, called on first use.
+        Return False if an index cannot be created, e.g. the table has duplicate ids,
+        or if no database server can be reached.
+        """
+        is_created = True
+        for table_type, indexes in INDEXES.items():
+            try:
+                self.table_of(table_type).create_indexes(indexes)
+            except ConnectionFailure as err:
+                print(f'Warning: indexes are not created, the database cannot be reached: {err}')
+                return False
+            except OperationFailure as err:
+                print(f'Error: cannot create indexes of {TABLE_NAMES[table_type]}, '
+                      f'remove recipes with duplicate ids first: {err}')
+                is_created = False
+        return is_created
+
+    def get_index_usage(self):
+        """
+        Get the number of operations that used each index of both tables
+        since the server started or the index was created
+        """
+        usage = []
+        for table_type in INDEXES:
+            for index_stats in self.table_of(table_type).aggregate([{'$indexStats': {}}]):
+                usage.append({'table': TABLE_NAMES[table_type], 'name': index_stats['name'],
+                              'operations': index_stats['accesses']['ops'],
+                              'since': index_stats['accesses']['since']})
+        return usage
 
     def is_recipe_exists_in_tb(self, recipe_dict, table_type):
         """
@@ -43,9 +343,122 @@ class Database:
             return True
         return False
 
+    def get_recipe_ids(self, table_type):
+        """
+        Get the ids of all recipes in all_recipes_table or favourites_table, in one query
+
+        Parameters:
+        table_type (int): flag indicating the type of table, all_recipes_tb or favourites_tb
+        """
+        return [recipe['id'] for recipe in self.table_of(table_type).find({}, {'id': 1, '_id': 0})
+                if 'id' in recipe]
+
+    def get_stale_recipe_urls(self, number):
+        """
+        Get the urls of the number recipes of all_recipes_table scraped longest ago
+
+        Parameters:
+        number (int): max number of urls
+        """
+        stale_recipes = self.all_recipes_tb.find({'url': {'$exists': True}}, {'url': 1, '_id': 0}) \
+            .sort('scraped at', pymongo.ASCENDING).limit(number)
+        return [recipe['url'] for recipe in stale_recipes]
+
+    def store_scraped_recipe(self, recipe_dict, url):
+        """
+        Store a scraped recipe into all_recipes_table with its fingerprint, url and scrape time.
+        A recipe with the same fingerprint as the stored one is not written again,
+        only its scrape time is set, in the same round trip as the check.
+        Return INSERTED, UPDATED or UNCHANGED, None if recipe_dict has no id.
+
+        Parameters:
+        recipe_dict (dict): dict of recipe scraped
+        url (str): url of food recipe page
+        """
+        if not is_id_present(recipe_dict):
+            print('Error: id is not found')
+            return None
+        recipe_id = recipe_dict['id']
+        fingerprint = fingerprint_of(recipe_dict)
+        metadata = {'url': url, 'scraped at': time.time()}
+        if self.all_recipes_tb.find_one_and_update({'id': recipe_id, 'fingerprint': fingerprint},
+                                                   {'$set': metadata}, projection={'_id': 1}):
+            print(f'recipe with id {recipe_id} in all recipes table is unchanged')
+            return UNCHANGED
+        metadata['fingerprint'] = fingerprint
+        result = self.all_recipes_tb.update_one(
+            {'id': recipe_id}, {'$set': {**valid_values_of(recipe_dict), **metadata}},
+            upsert=True)
+        if result.upserted_id is not None:
+            print(f'recipe with id {recipe_id} is inserted into all recipes table')
+            return INSERTED
+        print(f'recipe with id {recipe_id} in all recipes table is updated')
+        return UPDATED
+
+    def store_scraped_recipes(self, recipes):
+        """
+        Upsert scraped recipes into all_recipes_table by id in one unordered bulk write,
+        with their fingerprint, url and scrape time.
+        The attributes scraped are set, the other attributes of a stored recipe are kept.
+        The fingerprints of the stored recipes are read in one query before the write,
+        a recipe with the same fingerprint as the stored one only gets its url and scrape time.
+        Return the result of each recipe in order: INSERTED, UPDATED, UNCHANGED,
+        or None if the recipe has no id or could not be written.
+
+        Parameters:
+        recipes (list): pairs of dict of recipe scraped and url of food recipe page
+        """
+        scraped_at = time.time()
+        ids = [recipe_dict['id'] for recipe_dict, _ in recipes if is_id_present(recipe_dict)]
+        stored_fingerprints = {
+            recipe['id']: recipe.get('fingerprint') for recipe in
+            self.all_recipes_tb.find({'id': {'$in': ids}}, {'id': 1, 'fingerprint': 1, '_id': 0})}
+        requests = []
+        # index in requests of each recipe with an id
+        request_indexes = []
+        # indexes in requests of the recipes with the same content as the stored ones
+        unchanged_indexes = set()
+        for recipe_dict, url in recipes:
+            if not is_id_present(recipe_dict):
+                print('Error: id is not found')
+                request_indexes.append(None)
+                continue
+            metadata = {'url': url, 'scraped at': scraped_at}
+            fingerprint = fingerprint_of(recipe_dict)
+            request_indexes.append(len(requests))
+            if stored_fingerprints.get(recipe_dict['id']) == fingerprint:
+                unchanged_indexes.add(len(requests))
+                requests.append(pymongo.UpdateOne({'id': recipe_dict['id']}, {'$set': metadata}))
+                continue
+            values = valid_values_of(recipe_dict, verbose=False)
+            values.update(metadata, fingerprint=fingerprint)
+            requests.append(pymongo.UpdateOne({'id': recipe_dict['id']}, {'$set': values},
+                                              upsert=True))
+        if not requests:
+            return [None] * len(recipes)
+        failed_indexes = set()
+        try:
+            upserted_indexes = set(self.all_recipes_tb.bulk_write(requests, ordered=False)
+                                   .upserted_ids)
+        except BulkWriteError as err:
+            # the other recipes of an unordered bulk write are still written
+            print(f'Error: {len(err.details["writeErrors"])} recipes could not be written')
+            failed_indexes = {error['index'] for error in err.details['writeErrors']}
+            upserted_indexes = {upserted['index'] for upserted in err.details['upserted']}
+        results = []
+        for index in request_indexes:
+            if index is None or index in failed_indexes:
+                results.append(None)
+            elif index in unchanged_indexes:
+                results.append(UNCHANGED)
+            else:
+                results.append(INSERTED if index in upserted_indexes else UPDATED)
+        return results
+
     def update_on_tb(self, recipe_dict, table_type):
         """
-        Update the table by recipe_dict
+        Update the table by recipe_dict, all attributes in one atomic update.
+        Return False if recipe_dict has no id or the recipe does not exist.
 
         Parameters:
         recipe_dict (dict): dict of recipe to update
@@ -54,40 +467,20 @@ class Database:
         if not is_id_present(recipe_dict):
             print('Error: id is not found')
             return False
+        recipe_id = recipe_dict['id']
+        result = self.table_of(table_type).update_one({'id': recipe_id},
+                                                      self.update_of(recipe_dict, table_type))
         # return False if recipe_dict not exists in table, cannot update
-        if not self.is_recipe_exists_in_tb(recipe_dict, table_type):
+        if not result.matched_count:
             print('Cannot update table: recipe does not exist')
             return False
-        recipe_id = recipe_dict['id']
-        my_query = {'id': recipe_id}
-        for attribute in recipe_dict.keys():
-            # skip update id because id will not change
-            if attribute == 'id':
-                continue
-            # check error of malformed data structure
-            if attribute not in ATTRIBUTES:
-                print(f'Malformed data structure: '
-                      f'recipe with id {recipe_id} has invalid attribute {attribute}')
-                continue
-            if not recipe_dict[attribute]:
-                print(f'Malformed data structure: '
-                      f'recipe with id {recipe_id} has empty value for attribute {attribute}')
-                continue
-            # update valid attribute and value into food_recipes_table
-            new_values = {'$set': {attribute: recipe_dict[attribute]}}
-            if table_type == ALL_RECIPES:
-                self.all_recipes_tb.update_one(my_query, new_values)
-                print(f'{attribute} entry of recipe with id {recipe_id} '
-                      f'in all recipes table is updated')
-            if table_type == FAVOURITES:
-                self.favourites_tb.update_one(my_query, new_values)
-                print(f'{attribute} entry of recipe with id {recipe_id} '
-                      f'in favourites table is updated')
+        print(f'recipe with id {recipe_id} in {TABLE_NAMES[table_type]} is updated')
         return True
 
     def insert_into_tb(self, recipe_dict, table_type):
         """
-        Insert recipe_dict into the table
+        Insert recipe_dict into the table if no recipe has its id, in one round trip.
+        Return False if recipe_dict has no id or the recipe already exists.
 
         Parameters:
         recipe_dict (dict): dict of recipe to insert
@@ -96,21 +489,215 @@ class Database:
         if not is_id_present(recipe_dict):
             print('Error: id is not found')
             return False
+        recipe_id = recipe_dict['id']
+        # a favourite is inserted as its id and the attributes differing from the recipe
+        result = self.table_of(table_type).update_one(
+            {'id': recipe_id}, {'$setOnInsert': self.update_of(recipe_dict, table_type)['$set']},
+            upsert=True)
         # return False if recipe_dict exists in table, cannot insert
-        if self.is_recipe_exists_in_tb(recipe_dict, table_type):
+        if result.upserted_id is None:
             print('Cannot insert into table: recipe already exists')
             return False
-        to_insert = {}
-        for attribute in recipe_dict.keys():
-            # insert valid attributes and values into dict to_insert
-            if attribute in ATTRIBUTES and recipe_dict[attribute]:
-                to_insert[attribute] = recipe_dict[attribute]
-        # insert to_insert to table in database
+        print(f'recipe with id {recipe_id} is inserted into {TABLE_NAMES[table_type]}')
+        return True
+
+    def upsert_on_tb(self, recipe_dict, table_type):
+        """
+        Update the recipe of recipe_dict in the table, or insert it if it does not exist,
+        in one round trip. Attributes not in recipe_dict are kept.
+        Return INSERTED or UPDATED, None if recipe_dict has no id.
+
+        Parameters:
+        recipe_dict (dict): dict of recipe to store
+        table (int): flag indicating the type of table in database, all_recipes_tb or favourites_tb
+        """
+        if not is_id_present(recipe_dict):
+            print('Error: id is not found')
+            return None
         recipe_id = recipe_dict['id']
+        result = self.table_of(table_type).update_one(
+            {'id': recipe_id}, self.update_of(recipe_dict, table_type), upsert=True)
+        if result.upserted_id is not None:
+            print(f'recipe with id {recipe_id} is inserted into {TABLE_NAMES[table_type]}')
+            return INSERTED
+        print(f'recipe with id {recipe_id} in {TABLE_NAMES[table_type]} is updated')
+        return UPDATED
+
+    def update_of(self, recipe_dict, table_type):
+        """
+        Get the update of the stored recipe by the valid attributes of recipe_dict.
+        A recipe of all recipes table loses its fingerprint, its content may differ from the page.
+        A favourite keeps only the attributes differing from the recipe of all recipes table,
+        the ones equal to it are removed, so it follows the recipe when the recipe is scraped again.
+        Favourites of recipes not in all recipes table keep all their attributes.
+        """
+        values = valid_values_of(recipe_dict)
+        # id is set to itself, so a recipe with no valid attribute is still matched
+        new_values = {'$set': dict(values, id=recipe_dict['id'])}
         if table_type == ALL_RECIPES:
-            self.all_recipes_tb.insert_one(to_insert)
-            print(f'recipe with id {recipe_id} is inserted into all recipes table')
-        if table_type == FAVOURITES:
-            self.favourites_tb.insert_one(to_insert)
-            print(f'recipe with id {recipe_id} is inserted into favourites table')
+            # content may differ from the page now, so the next scrape writes the page again
+            new_values['$unset'] = {'fingerprint': ''}
+            return new_values
+        recipe = self.all_recipes_tb.find_one({'id': recipe_dict['id']},
+                                              {'_id': 0, **{attribute: 1 for attribute in values}})
+        if recipe:
+            same_attributes = [attribute for attribute, value in values.items()
+                               if attribute not in SEARCH_TERMS_FIELDS
+                               and recipe.get(attribute) == value]
+            # the terms of an attribute equal to the recipe are read from the recipe too
+            same_attributes += [terms_field_of(attribute) for attribute in same_attributes
+                                if attribute in TEXT_ATTRIBUTES]
+            for attribute in same_attributes:
+                del new_values['$set'][attribute]
+            if same_attributes:
+                new_values['$unset'] = {attribute: '' for attribute in same_attributes}
+        return new_values
+
+    def find_favourites(self, my_query=None, recipe_id=None, projection=None, sort=None,
+                        limit=0):
+        """
+        Get the favourites merged with the recipes of all recipes table they refer to,
+        in one aggregation that joins them by id. Attributes of a favourite win over the recipe.
+
+        Parameters:
+        my_query (dict): query on the merged favourites, all favourites if None
+        recipe_id (str): id of the favourite to get, matched before the join, all if None
+        projection (dict): projection of the merged favourites, RECIPE_PROJECTION if None
+        sort (list): (field, direction) the merged favourites are sorted by, not sorted if None
+        limit (int): max number of favourites, 0 for no limit
+        """
+        pipeline = []
+        if recipe_id is not None:
+            pipeline.append({'$match': {'id': recipe_id}})
+        pipeline += [
+            {'$lookup': {'from': self.all_recipes_tb.name, 'localField': 'id',
+                         'foreignField': 'id', 'as': 'recipe'}},
+            {'$replaceRoot': {'newRoot': {'$mergeObjects': [{'$arrayElemAt': ['$recipe', 0]},
+                                                            '$$ROOT']}}}
+        ]
+        # matched before the projection, which removes the search terms
+        if my_query:
+            pipeline.append({'$match': my_query})
+        if sort:
+            pipeline.append({'$sort': dict(sort)})
+        if limit:
+            pipeline.append({'$limit': limit})
+        pipeline.append({'$project': dict(projection or RECIPE_PROJECTION, recipe=0)})
+        return self.favourites_tb.aggregate(pipeline)
+
+    def get_favourite(self, recipe_id):
+        """
+        Get the favourite of recipe_id merged with its recipe, None if it is not a favourite
+        """
+        return next(self.find_favourites(recipe_id=recipe_id), None)
+
+    def compact_favourites(self):
+        """
+        Remove from favourites stored as full copies the attributes equal to their recipe,
+        so they are read from all recipes table. Return the number of favourites compacted.
+        """
+        favourites = list(self.favourites_tb.find({}, {'_id': 0}))
+        recipes = {recipe['id']: recipe for recipe in self.all_recipes_tb.find(
+            {'id': {'$in': [favourite['id'] for favourite in favourites]}}, RECIPE_PROJECTION)}
+        requests = []
+        for favourite in favourites:
+            recipe = recipes.get(favourite['id'])
+            if not recipe:
+                continue
+            same_attributes = [attribute for attribute, value in favourite.items()
+                               if attribute != 'id' and attribute not in SEARCH_TERMS_FIELDS
+                               and recipe.get(attribute) == value]
+            # the terms of an attribute equal to the recipe are read from the recipe too
+            same_attributes += [terms_field_of(attribute) for attribute in same_attributes
+                                if attribute in TEXT_ATTRIBUTES]
+            if same_attributes:
+                requests.append(pymongo.UpdateOne(
+                    {'id': favourite['id']},
+                    {'$unset': {attribute: '' for attribute in same_attributes}}))
+        if requests:
+            self.favourites_tb.bulk_write(requests, ordered=False)
+        print(f'{len(requests)} favourites compacted')
+        return len(requests)
+
+    def delete_recipe(self, recipe_id):
+        """
+        Delete the recipe of recipe_id from all recipes table.
+        A favourite of it reads the attributes it does not store from the recipe,
+        so they are copied into the favourite first, which keeps its content.
+        Return False if the recipe does not exist.
+        """
+        recipe = self.all_recipes_tb.find_one(
+            {'id': recipe_id}, {'_id': 0, **{field: 0 for field in METADATA_FIELDS}})
+        if not recipe:
+            return False
+        favourite = self.favourites_tb.find_one({'id': recipe_id}, {'_id': 0})
+        if favourite:
+            missing_values = {attribute: value for attribute, value in recipe.items()
+                              if attribute not in favourite}
+            if missing_values:
+                self.favourites_tb.update_one({'id': recipe_id}, {'$set': missing_values})
+        self.all_recipes_tb.delete_one({'id': recipe_id})
         return True
+
+    def migrate_numeric_attributes(self):
+        """
+        Convert the NUMERIC_ATTRIBUTES stored as str by older versions to int in both tables,
+        run once after upgrading. Values that are not numbers are removed.
+        Fingerprints are computed again on the converted recipes, as a scrape computes them.
+        Return the number of recipes converted.
+        """
+        is_str = {'$or': [{attribute: {'$type': 'string'}} for attribute in NUMERIC_ATTRIBUTES]}
+        converted = 0
+        for table_type in INDEXES:
+            requests = []
+            for recipe in self.table_of(table_type).find(is_str, {'_id': 0}):
+                new_values = {}
+                for attribute in NUMERIC_ATTRIBUTES:
+                    if isinstance(recipe.get(attribute), str):
+                        new_values[attribute] = number_of(attribute, recipe[attribute])
+                recipe.update(new_values)
+                update = {}
+                removed = [attribute for attribute, value in new_values.items() if value is None]
+                if removed:
+                    update['$unset'] = {attribute: '' for attribute in removed}
+                for attribute in removed:
+                    del new_values[attribute]
+                    del recipe[attribute]
+                if 'fingerprint' in recipe:
+                    new_values['fingerprint'] = fingerprint_of(recipe)
+                if new_values:
+                    update['$set'] = new_values
+                requests.append(pymongo.UpdateOne({'id': recipe['id']}, update))
+            if requests:
+                self.table_of(table_type).bulk_write(requests, ordered=False)
+            print(f'{len(requests)} recipes of {TABLE_NAMES[table_type]} converted')
+            converted += len(requests)
+        return converted
+
+    def build_search_terms(self):
+        """
+        Write the search terms of the text attributes of the recipes in both tables
+        stored by older versions without them, run once after upgrading.
+        Return the number of recipes written.
+        """
+        has_no_terms = {'$or': [{attribute: {'$exists': True},
+                                 terms_field_of(attribute): {'$exists': False}}
+                                for attribute in TEXT_ATTRIBUTES]}
+        written = 0
+        for table_type in INDEXES:
+            requests = [pymongo.UpdateOne({'id': recipe['id']},
+                                          {'$set': terms_values_of(recipe)})
+                        for recipe in self.table_of(table_type).find(
+                            has_no_terms, {'_id': 0, 'id': 1,
+                                           **{attribute: 1 for attribute in TEXT_ATTRIBUTES}})]
+            if requests:
+                self.table_of(table_type).bulk_write(requests, ordered=False)
+            print(f'search terms of {len(requests)} recipes of {TABLE_NAMES[table_type]} written')
+            written += len(requests)
+        return written
+
+    def table_of(self, table_type):
+        """
+        Get all_recipes_tb or favourites_tb by table_type
+        """
+        return self.all_recipes_tb if table_type == ALL_RECIPES else self.favourites_tb
@@ -0,0 +1,116 @@
+"""
+Module for the pre-fetch dedup filter of the scraper.
+Most food recipe links on listing pages carry the recipe id, e.g. /recipes/52389300-energy-bites/,
+so a recipe already stored is recognised from its link,
+without fetching its page or asking the database.
+Crawls in different processes share the ids through a multiprocessing Manager dict,
+so a recipe found by several crawls is fetched by the first one only.
+A crawl failing to scrape a recipe it claimed releases it, so other crawls can still scrape it.
+"""
+import re
+import threading
+import uuid
+
+from scraper.database import ALL_RECIPES
+
+# recipe id in the path of a food recipe url
+RECIPE_URL_ID_PATTERN = re.compile(r'/recipes/(\d+)-')
+
+
+def recipe_id_of_url(url):
+    """
+    Get the recipe id in food recipe url as str, None if the url has no id
+    """
+    match = RECIPE_URL_ID_PATTERN.search(url)
+    return match.group(1) if match else None
+
+
+class RecipeIdFilter:
+    """
+    Set of ids of the recipes already stored or claimed by a crawl.
+    Safe to share between threads, and between processes through shared_ids.
+    """
+
+    def __init__(self, recipe_ids=(), shared_ids=None):
+        """
+        Parameters:
+        recipe_ids (iterable): ids of the recipes already stored
+        shared_ids (obj): Manager dict of id to the token of the filter claiming it,
+                          shared with the filters of other processes, None if not shared
+        """
+        self._ids = {str(recipe_id) for recipe_id in recipe_ids}
+        self._shared_ids = shared_ids
+        # identifies the claims of this filter in shared_ids
+        self._token = uuid.uuid4().hex
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_database(cls, mongo_db):
+        """
+        Load the ids of all recipes table once, in one query
+        """
+        return cls(mongo_db.get_recipe_ids(ALL_RECIPES))
+
+    def __len__(self):
+        with self._lock:
+            return len(self._ids)
+
+    def add(self, recipe_id):
+        """
+        Add the id of a recipe just stored
+        """
+        recipe_id = str(recipe_id)
+        with self._lock:
+            self._ids.add(recipe_id)
+        if self._shared_ids is not None:
+            self._shared_ids.setdefault(recipe_id, self._token)
+
+    def claim_url(self, url):
+        """
+        Claim the recipe of food recipe url for this crawl.
+        Return False if it is already stored or claimed by another crawl, then it is skipped.
+        A url without id is always claimed, its page has to be fetched to get the id.
+        """
+        recipe_id = recipe_id_of_url(url)
+        if recipe_id is None:
+            return True
+        with self._lock:
+            if recipe_id in self._ids:
+                return False
+            self._ids.add(recipe_id)
+        if self._shared_ids is None:
+            return True
+        # setdefault runs in the manager process, so only one filter gets its own token back
+        if self._shared_ids.setdefault(recipe_id, self._token) == self._token:
+            return True
+        # known through shared_ids while claimed, claimed again here if released
+        with self._lock:
+            self._ids.discard(recipe_id)
+        return False
+
+    def release(self, url):
+        """
+        Give up the claim of this crawl on the recipe of food recipe url,
+        after its page could not be fetched or scraped, so any crawl can claim it again
+        """
+        recipe_id = recipe_id_of_url(url)
+        if recipe_id is None:
+            return
+        with self._lock:
+            self._ids.discard(recipe_id)
+        # other filters never change a claimed id, so only the claim of this filter is removed
+        if self._shared_ids is not None and self._shared_ids.get(recipe_id) == self._token:
+            self._shared_ids.pop(recipe_id, None)
+
+    def is_known_url(self, url):
+        """
+        Check whether the recipe of food recipe url is already stored.
+        A url without id is never known, its page has to be fetched to get the id.
+        """
+        recipe_id = recipe_id_of_url(url)
+        if recipe_id is None:
+            return False
+        with self._lock:
+            if recipe_id in self._ids:
+                return True
+        return self._shared_ids is not None and recipe_id in self._shared_ids
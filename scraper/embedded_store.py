@@ -0,0 +1,1455 @@
+"""
+Module for the embedded storage backend, an in-process stand-in of mongoDB kept in SQLite.
+EmbeddedClient offers the part of the pymongo client, database and collection api
+used by Database, the work queue, api.query and api.flask_app,
+so Database works on it unchanged when STORAGE_BACKEND is 'embedded'.
+Each collection is a SQLite table with one JSON document per row.
+Filters, updates and aggregations are evaluated in process with the semantics of mongoDB,
+equality on _id or on the fields of a unique index is looked up by the SQLite index.
+Other indexes are multikey as in mongoDB: an entry for each element of an array of their first
+field, kept in the keys table of the collection and looked up by equality, ranges and $elemMatch.
+Errors are raised as the pymongo errors of the same failure.
+"""
+import contextlib
+import copy
+import datetime
+import heapq
+import itertools
+import json
+import re
+import sqlite3
+import threading
+
+import pymongo
+from bson import ObjectId
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from pymongo.results import BulkWriteResult, DeleteResult, InsertManyResult, InsertOneResult, \
+    UpdateResult
+
+# table of the indexes of every collection: collection, name, keys and unique flag
+INDEX_TABLE = '_indexes'
+# name of the index of _id in index_information and $indexStats, as in mongoDB
+ID_INDEX = '_id_'
+DUPLICATE_KEY_ERROR = 11000
+# regular expression searching for words anywhere, as api.query builds them, spaces escaped
+LIKE_WORDS = re.compile(r'(?:\.\*)?((?:[A-Za-z0-9 ]|\\ )+)(?:\.\*)?')
+# seconds a connection waits for the write lock held by another process
+BUSY_TIMEOUT = 30
+# documents read by the first query of a scan in the order of an index, doubled by each next one
+ORDERED_SCAN_BATCH = 64
+# a scan reads rows in order while one in this many matches, else it looks up index entries
+ORDERED_SCAN_RATIO = 16
+
+
+def encode_value(value):
+    """
+    Encode the values JSON has no type for, as mongoDB extended JSON
+    """
+    if isinstance(value, ObjectId):
+        return {'$oid': str(value)}
+    if isinstance(value, datetime.datetime):
+        return {'$date': value.isoformat()}
+    raise TypeError(f'value of type {type(value).__name__} cannot be stored')
+
+
+def decode_value(obj):
+    """
+    Decode the values encoded by encode_value
+    """
+    if len(obj) == 1:
+        if '$oid' in obj:
+            return ObjectId(obj['$oid'])
+        if '$date' in obj:
+            return datetime.datetime.fromisoformat(obj['$date'])
+    return obj
+
+
+def dumps(value):
+    """
+    Get the JSON of a document or value, the same for equal values
+    """
+    return json.dumps(value, default=encode_value, separators=(',', ':'))
+
+
+def loads(text):
+    """
+    Get the document or value of its JSON
+    """
+    return json.loads(text, object_hook=decode_value)
+
+
+def quote(name):
+    """
+    Quote a table or index name for SQL
+    """
+    return '"' + name.replace('"', '""') + '"'
+
+
+def json_path_of(field):
+    """
+    Get the SQLite JSON path of a field, quoted for SQL
+    """
+    path = '$.' + '.'.join('"' + part.replace('"', '\\"') + '"' for part in field.split('.'))
+    return "'" + path.replace("'", "''") + "'"
+
+
+def resolve(document, path):
+    """
+    Get whether the field of dotted path is in document, and its value
+    """
+    value = document
+    for part in path.split('.'):
+        if isinstance(value, dict) and part in value:
+            value = value[part]
+        elif isinstance(value, list) and part.isdigit() and int(part) < len(value):
+            value = value[int(part)]
+        else:
+            return False, None
+    return True, value
+
+
+def set_path(document, path, value):
+    """
+    Set the field of dotted path in document, creating the embedded documents on the path
+    """
+    *parents, name = path.split('.')
+    for part in parents:
+        document = document.setdefault(part, {})
+        if not isinstance(document, dict):
+            raise OperationFailure(f'Cannot create field {name} in element {path}')
+    document[name] = value
+
+
+def unset_path(document, path):
+    """
+    Remove the field of dotted path from document if it is there
+    """
+    *parents, name = path.split('.')
+    for part in parents:
+        document = document.get(part)
+        if not isinstance(document, dict):
+            return
+    document.pop(name, None)
+
+
+def candidates_of(value):
+    """
+    Get the values a condition is checked against: the value, and its elements if it is an array
+    """
+    if isinstance(value, list):
+        return [value] + value
+    return [value]
+
+
+def is_equal(left, right):
+    """
+    Check equality of two values, booleans are not equal to numbers as in mongoDB
+    """
+    if isinstance(left, bool) != isinstance(right, bool):
+        return False
+    return left == right
+
+
+def type_order(value):
+    """
+    Get the sort key of a value, values of different types are ordered by the BSON type order
+    """
+    if value is None:
+        return 1, 0
+    if isinstance(value, bool):
+        return 8, value
+    if isinstance(value, (int, float)):
+        return 2, value
+    if isinstance(value, str):
+        return 3, value
+    if isinstance(value, dict):
+        return 4, dumps(value)
+    if isinstance(value, list):
+        return 5, dumps(value)
+    if isinstance(value, ObjectId):
+        return 7, value
+    if isinstance(value, datetime.datetime):
+        return 9, value
+    return 10, str(value)
+
+
+def is_comparable(left, right):
+    """
+    Check whether a query comparison applies, only values of the same type are compared
+    """
+    if isinstance(left, bool) or isinstance(right, bool):
+        return isinstance(left, bool) and isinstance(right, bool)
+    if isinstance(left, (int, float)) and isinstance(right, (int, float)):
+        return True
+    return type(left) is type(right) and left is not None
+
+
+COMPARISONS = {
+    '$gt': lambda left, right: left > right,
+    '$gte': lambda left, right: left >= right,
+    '$lt': lambda left, right: left < right,
+    '$lte': lambda left, right: left <= right
+}
+SQL_COMPARISONS = {'$gt': '>', '$gte': '>=', '$lt': '<', '$lte': '<='}
+SQL_KEY_COMPARISONS = {'$eq': '=', **SQL_COMPARISONS}
+
+# python types of the type aliases of $type
+TYPE_ALIASES = {
+    'double': (float,),
+    'string': (str,),
+    'object': (dict,),
+    'array': (list,),
+    'objectId': (ObjectId,),
+    'bool': (bool,),
+    'date': (datetime.datetime,),
+    'null': (type(None),),
+    'int': (int,),
+    'long': (int,),
+    'number': (int, float)
+}
+
+
+def is_of_type(value, alias):
+    """
+    Check whether value is of the type of a $type alias, booleans are not numbers
+    """
+    if alias not in TYPE_ALIASES:
+        raise OperationFailure(f'unknown type name alias: {alias}')
+    if isinstance(value, bool) and alias != 'bool':
+        return False
+    return isinstance(value, TYPE_ALIASES[alias])
+
+
+def is_operator_dict(condition):
+    """
+    Check whether a condition is a dict of query operators, not a document to compare with
+    """
+    return isinstance(condition, dict) and bool(condition) \
+        and all(key.startswith('$') for key in condition)
+
+
+def regex_of(pattern, options=''):
+    """
+    Get the compiled regular expression of $regex and $options
+    """
+    if isinstance(pattern, re.Pattern):
+        return pattern
+    flags = 0
+    for option, flag in (('i', re.IGNORECASE), ('m', re.MULTILINE), ('s', re.DOTALL),
+                         ('x', re.VERBOSE)):
+        if option in (options or ''):
+            flags |= flag
+    return re.compile(pattern, flags)
+
+
+def match(document, query):
+    """
+    Check whether document matches the mongoDB filter query
+
+    Parameters:
+    document (dict): document to check
+    query (dict): filter as given to find, None or empty matches every document
+    """
+    for key, condition in (query or {}).items():
+        if key == '$and':
+            if not all(match(document, sub_query) for sub_query in condition):
+                return False
+        elif key == '$or':
+            if not any(match(document, sub_query) for sub_query in condition):
+                return False
+        elif key == '$nor':
+            if any(match(document, sub_query) for sub_query in condition):
+                return False
+        elif key == '$expr':
+            if not is_true(evaluate(condition, document)):
+                return False
+        elif key.startswith('$'):
+            raise OperationFailure(f'unknown top level operator: {key}')
+        elif not match_field(document, key, condition):
+            return False
+    return True
+
+
+def match_field(document, path, condition):
+    """
+    Check whether the field of path in document matches the condition of the filter
+    """
+    found, value = resolve(document, path)
+    if isinstance(condition, re.Pattern):
+        return match_operator(found, value, '$regex', condition, {})
+    if is_operator_dict(condition):
+        return all(match_operator(found, value, operator, argument, condition)
+                   for operator, argument in condition.items() if operator != '$options')
+    return match_operator(found, value, '$eq', condition, {})
+
+
+def match_operator(found, value, operator, argument, condition):
+    """
+    Check whether a field matches one query operator
+
+    Parameters:
+    found (bool): whether the field is in the document
+    value: value of the field
+    operator (str): query operator, e.g. '$gt'
+    argument: argument of the operator
+    condition (dict): all operators on the field, for the $options of $regex
+    """
+    if operator == '$eq':
+        if argument is None:
+            return not found or any(candidate is None for candidate in candidates_of(value))
+        return found and any(is_equal(candidate, argument) for candidate in candidates_of(value))
+    if operator == '$ne':
+        return not match_operator(found, value, '$eq', argument, condition)
+    if operator == '$in':
+        if found and isinstance(value, str):
+            # a string only equals a string, so the items are compared by list membership
+            return value in argument or any(isinstance(item, re.Pattern) and item.search(value)
+                                            for item in argument)
+        return any(match_operator(found, value, '$regex', item, {})
+                   if isinstance(item, re.Pattern)
+                   else match_operator(found, value, '$eq', item, condition)
+                   for item in argument)
+    if operator == '$nin':
+        return not match_operator(found, value, '$in', argument, condition)
+    if operator in COMPARISONS:
+        return found and any(is_comparable(candidate, argument)
+                             and COMPARISONS[operator](candidate, argument)
+                             for candidate in candidates_of(value))
+    if operator == '$exists':
+        return found == bool(argument)
+    if operator == '$regex':
+        regex = regex_of(argument, condition.get('$options'))
+        return found and any(isinstance(candidate, str) and regex.search(candidate)
+                             for candidate in candidates_of(value))
+    if operator == '$not':
+        if isinstance(argument, re.Pattern):
+            return not match_operator(found, value, '$regex', argument, {})
+        return not all(match_operator(found, value, sub_operator, sub_argument, argument)
+                       for sub_operator, sub_argument in argument.items()
+                       if sub_operator != '$options')
+    if operator == '$type':
+        aliases = argument if isinstance(argument, list) else [argument]
+        return found and any(is_of_type(candidate, alias) for candidate in candidates_of(value)
+                             for alias in aliases)
+    if operator == '$size':
+        return isinstance(value, list) and len(value) == argument
+    if operator == '$all':
+        return all(match_operator(found, value, '$eq', item, condition) for item in argument)
+    if operator == '$elemMatch':
+        if not isinstance(value, list):
+            return False
+        if is_operator_dict(argument) and all(sub_operator in COMPARISONS
+                                              for sub_operator in argument):
+            # a range of the elements, as searches by words are, compared without dispatch
+            bounds = [(COMPARISONS[sub_operator], sub_argument)
+                      for sub_operator, sub_argument in argument.items()]
+            return any(not isinstance(element, list)
+                       and all(is_comparable(element, bound) and compare(element, bound)
+                               for compare, bound in bounds)
+                       for element in value)
+        if is_operator_dict(argument):
+            # operators on the elements
+            return any(all(match_operator(True, element, sub_operator, sub_argument, argument)
+                           for sub_operator, sub_argument in argument.items()
+                           if sub_operator != '$options')
+                       for element in value)
+        return any(match(element, argument) if isinstance(element, dict)
+                   else match_field({'element': element}, 'element', argument)
+                   for element in value)
+    raise OperationFailure(f'unknown operator: {operator}')
+
+
+def is_true(value):
+    """
+    Check whether an expression value is true, only false, null and zero are false
+    """
+    if value is None or value is False:
+        return False
+    return not (isinstance(value, (int, float)) and value == 0)
+
+
+def to_int(value):
+    """
+    Convert a value to int as $toInt does, a string that is not an integer is an error
+    """
+    if value is None:
+        return None
+    if isinstance(value, (bool, int, float)):
+        return int(value)
+    if isinstance(value, str):
+        try:
+            return int(value.strip())
+        except ValueError:
+            pass
+    raise OperationFailure(f"Failed to parse number '{value}' in $convert with no onError value")
+
+
+def evaluate(expression, document):
+    """
+    Get the value of an aggregation expression on document, as in $expr and $replaceRoot
+    """
+    if isinstance(expression, str) and expression.startswith('$$'):
+        name, _, path = expression[2:].partition('.')
+        if name not in ('ROOT', 'CURRENT'):
+            raise OperationFailure(f'Use of undefined variable: {name}')
+        return resolve(document, path)[1] if path else document
+    if isinstance(expression, str) and expression.startswith('$'):
+        return resolve(document, expression[1:])[1]
+    if isinstance(expression, list):
+        return [evaluate(item, document) for item in expression]
+    if isinstance(expression, dict):
+        if len(expression) == 1 and next(iter(expression)).startswith('$'):
+            operator, argument = next(iter(expression.items()))
+            return evaluate_operator(operator, argument, document)
+        return {key: evaluate(value, document) for key, value in expression.items()}
+    return expression
+
+
+def evaluate_operator(operator, argument, document):
+    """
+    Get the value of one aggregation operator on document
+    """
+    if operator == '$literal':
+        return argument
+    arguments = argument if isinstance(argument, list) else [argument]
+    if operator in ('$and', '$or', '$not'):
+        values = [is_true(evaluate(item, document)) for item in arguments]
+        if operator == '$and':
+            return all(values)
+        if operator == '$or':
+            return any(values)
+        return not values[0]
+    values = [evaluate(item, document) for item in arguments]
+    if operator in ('$eq', '$ne', '$gt', '$gte', '$lt', '$lte'):
+        left, right = type_order(values[0]), type_order(values[1])
+        if operator in ('$eq', '$ne'):
+            return (left == right) == (operator == '$eq')
+        return COMPARISONS[operator](left, right)
+    if operator == '$toInt':
+        return to_int(values[0])
+    if operator == '$arrayElemAt':
+        array, index = values
+        if not isinstance(array, list) or not -len(array) <= index < len(array):
+            return None
+        return array[index]
+    if operator == '$mergeObjects':
+        merged = {}
+        for value in values:
+            if value is not None:
+                merged.update(value)
+        return merged
+    if operator == '$ifNull':
+        return next((value for value in values if value is not None), None)
+    raise OperationFailure(f'Unrecognized expression: {operator}')
+
+
+def project(document, projection):
+    """
+    Get the fields of document kept by a projection of find or $project.
+    A projection includes fields, or excludes them, _id is kept unless excluded.
+    """
+    if not projection:
+        return document
+    if isinstance(projection, (list, tuple)):
+        projection = {field: 1 for field in projection}
+    included = {field for field, flag in projection.items() if flag and field != '_id'}
+    if included:
+        is_id_kept = bool(projection.get('_id', 1))
+        return {field: value for field, value in document.items()
+                if field in included or (field == '_id' and is_id_kept)}
+    return {field: value for field, value in document.items() if projection.get(field, 1)}
+
+
+def apply_update(document, update, is_insert=False):
+    """
+    Apply the update operators to document in place, return whether document changed
+
+    Parameters:
+    document (dict): document to update
+    update (dict): update as given to update_one, made of update operators
+    is_insert (bool): whether document is inserted by an upsert, to apply $setOnInsert
+    """
+    if not update or not all(operator.startswith('$') for operator in update):
+        raise OperationFailure('update only works with $ operators')
+    before = copy.deepcopy(document)
+    for operator, fields in update.items():
+        if operator == '$setOnInsert' and not is_insert:
+            continue
+        for path, value in fields.items():
+            if operator in ('$set', '$setOnInsert'):
+                set_path(document, path, copy.deepcopy(value))
+            elif operator == '$unset':
+                unset_path(document, path)
+            elif operator == '$inc':
+                found, current = resolve(document, path)
+                if found and (not isinstance(current, (int, float)) or isinstance(current, bool)):
+                    raise OperationFailure(f'Cannot apply $inc to a value of non-numeric type '
+                                           f'in field {path}')
+                set_path(document, path, (current if found else 0) + value)
+            elif operator in ('$min', '$max'):
+                found, current = resolve(document, path)
+                if not found or (type_order(value) < type_order(current)) == (operator == '$min'):
+                    set_path(document, path, copy.deepcopy(value))
+            else:
+                raise OperationFailure(f'Unknown modifier: {operator}')
+    return document != before
+
+
+def equalities_of(query):
+    """
+    Get the fields of query compared by equality, with their value, from the top level and $and.
+    They make the document inserted by an upsert, and are looked up by indexes.
+    """
+    equalities = {}
+    for key, condition in (query or {}).items():
+        if key == '$and':
+            for sub_query in condition:
+                equalities.update(equalities_of(sub_query))
+        elif key.startswith('$') or isinstance(condition, re.Pattern):
+            continue
+        elif is_operator_dict(condition):
+            if '$eq' in condition:
+                equalities[key] = condition['$eq']
+        else:
+            equalities[key] = condition
+    return equalities
+
+
+def like_patterns_of(query):
+    """
+    Get the LIKE patterns of the $regex of query searching for words, from the top level and $and.
+    LIKE ignores case, so the rows it selects are a superset of the matches,
+    regular expressions of other characters than letters, digits and spaces are not translated.
+    """
+    patterns = []
+    for key, condition in (query or {}).items():
+        if key == '$and':
+            for sub_query in condition:
+                patterns += like_patterns_of(sub_query)
+        elif not key.startswith('$') and is_operator_dict(condition) \
+                and isinstance(condition.get('$regex'), str):
+            words = LIKE_WORDS.fullmatch(condition['$regex'])
+            if words:
+                patterns.append((key, '%' + words.group(1).replace('\\ ', ' ') + '%'))
+    return patterns
+
+
+def ranges_of(query):
+    """
+    Get the fields of query compared to a number or a string by $gt, $gte, $lt or $lte,
+    with the operator and the value, from the top level and $and.
+    """
+    ranges = []
+    for key, condition in (query or {}).items():
+        if key == '$and':
+            for sub_query in condition:
+                ranges += ranges_of(sub_query)
+        elif not key.startswith('$') and is_operator_dict(condition):
+            ranges += [(key, operator, value) for operator, value in condition.items()
+                       if operator in COMPARISONS and isinstance(value, (str, int, float))
+                       and not isinstance(value, bool)]
+    return ranges
+
+
+def ors_of(query):
+    """
+    Get the lists of sub queries of the $or of query, from the top level and $and
+    """
+    ors = []
+    for key, condition in (query or {}).items():
+        if key == '$and':
+            for sub_query in condition:
+                ors += ors_of(sub_query)
+        elif key == '$or':
+            ors.append(condition)
+    return ors
+
+
+def element_ranges_of(query):
+    """
+    Get the fields of query with an $elemMatch of $gt, $gte, $lt or $lte on numbers or strings,
+    with the list of (operator, value) one element matches, from the top level and $and.
+    """
+    ranges = []
+    for key, condition in (query or {}).items():
+        if key == '$and':
+            for sub_query in condition:
+                ranges += element_ranges_of(sub_query)
+        elif not key.startswith('$') and is_operator_dict(condition) \
+                and is_operator_dict(condition.get('$elemMatch')):
+            bounds = [(operator, value) for operator, value in condition['$elemMatch'].items()
+                      if operator in COMPARISONS and isinstance(value, (str, int, float))
+                      and not isinstance(value, bool)]
+            if bounds:
+                ranges.append((key, bounds))
+    return ranges
+
+
+def entry_keys_of(value):
+    """
+    Get the keys of the entries of a value in a multikey index: the value,
+    or the elements of an array. Only numbers and strings are indexed.
+    """
+    values = value if isinstance(value, list) else [value]
+    keys = []
+    for item in values:
+        if isinstance(item, (str, int, float)) and not isinstance(item, bool) \
+                and item not in keys:
+            keys.append(item)
+    return keys
+
+
+def index_name_of(keys):
+    """
+    Get the default name of an index of keys, as mongoDB names it
+    """
+    return '_'.join(f'{field}_{direction}' for field, direction in keys)
+
+
+def keys_of(keys):
+    """
+    Get the list of (field, direction) of the keys of an index or a sort
+    """
+    if isinstance(keys, str):
+        return [(keys, pymongo.ASCENDING)]
+    if isinstance(keys, dict):
+        return list(keys.items())
+    return [(key, pymongo.ASCENDING) if isinstance(key, str) else tuple(key) for key in keys]
+
+
+class EmbeddedClient:
+    """
+    Client of the SQLite file of the embedded backend, in place of MongoClient.
+    Safe to share between threads, operations are serialized on one connection.
+    Writes of several processes on the same file are serialized by SQLite,
+    each process opens its own client.
+    """
+
+    def __init__(self, path, timeout=BUSY_TIMEOUT):
+        """
+        Open the SQLite file, created if it does not exist
+
+        Parameters:
+        path (str): path of the SQLite file, ':memory:' for a store kept in this client only
+        timeout (float): seconds to wait for the lock of the file held by another process
+        """
+        self.path = path
+        self._lock = threading.RLock()
+        self._connection = sqlite3.connect(path, timeout=timeout, isolation_level=None,
+                                           check_same_thread=False)
+        if path != ':memory:':
+            # readers do not wait for writers
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.execute(f'CREATE TABLE IF NOT EXISTS {INDEX_TABLE} '
+                                 f'(collection TEXT, name TEXT, keys TEXT, is_unique INTEGER, '
+                                 f'PRIMARY KEY (collection, name))')
+        self._databases = {}
+
+    def __getitem__(self, name):
+        with self._lock:
+            if name not in self._databases:
+                self._databases[name] = EmbeddedDatabase(self, name)
+            return self._databases[name]
+
+    def execute(self, sql, parameters=()):
+        """
+        Execute one SQL statement, return the rows it selects.
+        OperationFailure is raised if SQLite cannot run it, e.g. the file stays locked
+        by another process or the disk is full, as mongoDB raises it for a failed operation.
+        """
+        with self._lock:
+            try:
+                return self._connection.execute(sql, parameters).fetchall()
+            except sqlite3.OperationalError as err:
+                raise OperationFailure(f'SQLite error: {err}') from err
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """
+        Run the statements of the block in one transaction, committed at the end of the block.
+        The write lock of the file is taken at the start, so a read, modify and write is atomic.
+        """
+        with self._lock:
+            self.execute('BEGIN IMMEDIATE')
+            try:
+                yield
+                self.execute('COMMIT')
+            except BaseException:
+                # a failed commit leaves the transaction open
+                if self._connection.in_transaction:
+                    self._connection.execute('ROLLBACK')
+                raise
+
+    def close(self):
+        """
+        Close the connection to the SQLite file
+        """
+        with self._lock:
+            self._connection.close()
+
+
+class EmbeddedDatabase:
+    """
+    Database of the embedded backend, its collections are tables of the SQLite file
+    """
+
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+        self._collections = {}
+
+    def __getitem__(self, name):
+        with self.client._lock:
+            if name not in self._collections:
+                self._collections[name] = EmbeddedCollection(self, name)
+            return self._collections[name]
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self[name]
+
+    def drop_collection(self, name):
+        """
+        Drop the collection of name with its indexes
+        """
+        self[name].drop()
+
+    def list_collection_names(self):
+        """
+        Get the names of the collections of this database that have a table
+        """
+        prefix = self.name + '.'
+        # the keys tables of multikey indexes have a $ in their name, as no collection has
+        return [name[len(prefix):] for (name,) in self.client.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table'")
+                if name.startswith(prefix) and '$' not in name]
+
+
+class EmbeddedCursor:
+    """
+    Cursor of find, the documents are read when it is iterated
+    """
+
+    def __init__(self, collection, query, projection, sort=None, skip=0, limit=0):
+        self._collection = collection
+        self._query = query or {}
+        self._projection = projection
+        self._sort = keys_of(sort) if sort else []
+        self._skip = skip
+        self._limit = limit
+        self._documents = None
+
+    def sort(self, key_or_list, direction=None):
+        """
+        Sort by a field and direction, or by a list of (field, direction)
+        """
+        self._sort = keys_of(key_or_list if direction is None else [(key_or_list, direction)])
+        return self
+
+    def skip(self, number):
+        """
+        Skip the first number documents
+        """
+        self._skip = number
+        return self
+
+    def limit(self, number):
+        """
+        Return at most number documents, 0 for no limit
+        """
+        self._limit = number
+        return self
+
+    def _find(self):
+        """
+        Get the documents matching the query, sorted, skipped, limited and projected.
+        A limited find in natural order or sorted by the field of a unique index reads
+        the documents in that order until the limit is reached,
+        other limited sorts keep only the first documents in memory.
+        """
+        end = self._skip + self._limit if self._limit else None
+        if end and (not self._sort or self._collection.unique_index_of(self._sort[0][0])):
+            # the field orders every document that has it, the next keys of the sort never apply
+            documents = self._collection.scan_ordered(self._query, *self._sort[:1])
+        else:
+            documents = (document for document in self._collection.scan(self._query)
+                         if match(document, self._query))
+            if self._sort and end:
+                documents = first_documents(documents, self._sort, end)
+            elif self._sort:
+                documents = sort_documents(list(documents), self._sort)
+        if self._skip or self._limit:
+            documents = itertools.islice(documents, self._skip, end)
+        return [project(document, self._projection) for document in documents]
+
+    def __iter__(self):
+        if self._documents is None:
+            self._documents = iter(self._find())
+        return self
+
+    def __next__(self):
+        return next(iter(self)._documents)
+
+    def close(self):
+        """
+        Nothing to release, documents are read at once
+        """
+        self._documents = iter(())
+
+
+def sort_documents(documents, keys):
+    """
+    Sort documents by the list of (field, direction), missing fields first as null
+    """
+    for field, direction in reversed(keys):
+        documents.sort(key=lambda document, path=field: type_order(resolve(document, path)[1]),
+                       reverse=direction == pymongo.DESCENDING)
+    return documents
+
+
+def first_documents(documents, keys, number):
+    """
+    Get the first number documents in the order of sort_documents, keeping only them in memory
+    when every key of the sort has the same direction
+    """
+    if len({direction for _, direction in keys}) > 1:
+        return sort_documents(list(documents), keys)[:number]
+    select = heapq.nlargest if keys[0][1] == pymongo.DESCENDING else heapq.nsmallest
+    return select(number, documents, key=lambda document: tuple(
+        type_order(resolve(document, field)[1]) for field, _ in keys))
+
+
+class EmbeddedCollection:
+    """
+    Collection of the embedded backend, a table of the SQLite file with one document per row
+    """
+
+    def __init__(self, database, name):
+        self.database = database
+        self.name = name
+        self._client = database.client
+        self._table = quote(f'{database.name}.{name}')
+        # entries of the multikey indexes: index name, key and _id of the document
+        self._keys_table = quote(f'{database.name}.{name}$keys')
+        self._is_created = False
+        # indexes of the collection by name: keys and unique flag, read from INDEX_TABLE
+        self._indexes = None
+        # operations that used each index since this client opened, for $indexStats
+        self._index_ops = {}
+        self._since = datetime.datetime.now()
+
+    @property
+    def full_name(self):
+        return f'{self.database.name}.{self.name}'
+
+    def _create(self):
+        """
+        Create the table of the collection if it does not exist
+        """
+        if not self._is_created:
+            self._client.execute(f'CREATE TABLE IF NOT EXISTS {self._table} '
+                                 f'(_id TEXT PRIMARY KEY, doc TEXT NOT NULL)')
+            # keys have no type, so numbers and strings are compared as in the documents
+            self._client.execute(f'CREATE TABLE IF NOT EXISTS {self._keys_table} '
+                                 f'(name TEXT NOT NULL, key, _id TEXT NOT NULL)')
+            self._client.execute(f'CREATE INDEX IF NOT EXISTS '
+                                 f'{quote(f"{self.full_name}$keys.name_key")} '
+                                 f'ON {self._keys_table} (name, key)')
+            self._client.execute(f'CREATE INDEX IF NOT EXISTS '
+                                 f'{quote(f"{self.full_name}$keys._id")} '
+                                 f'ON {self._keys_table} (_id)')
+            self._is_created = True
+
+    def _get_indexes(self):
+        """
+        Get the indexes of the collection by name, _id not included
+        """
+        if self._indexes is None:
+            self._indexes = {name: {'key': [tuple(key) for key in loads(keys)],
+                                    'unique': bool(is_unique)}
+                             for name, keys, is_unique in self._client.execute(
+                                 f'SELECT name, keys, is_unique FROM {INDEX_TABLE} '
+                                 f'WHERE collection = ?', (self.full_name,))}
+        return self._indexes
+
+    def _get_multikey_indexes(self):
+        """
+        Get the first field of each multikey index by name: the indexes that are not unique
+        """
+        return {name: index['key'][0][0] for name, index in self._get_indexes().items()
+                if not index['unique']}
+
+    def _multikey_index_of(self, field):
+        """
+        Get the name of the multikey index of field, None if it has none
+        """
+        return next((name for name, index_field in self._get_multikey_indexes().items()
+                     if index_field == field), None)
+
+    def _count_index_use(self, name):
+        self._index_ops[name] = self._index_ops.get(name, 0) + 1
+
+    def _write_entries(self, document, indexes=None):
+        """
+        Write the entries of document in the multikey indexes, all of them if indexes is None
+        """
+        document_id = dumps(document['_id'])
+        for name, field in (indexes or self._get_multikey_indexes()).items():
+            found, value = resolve(document, field)
+            keys = entry_keys_of(value) if found else []
+            if keys:
+                self._client.execute(f'INSERT INTO {self._keys_table} (name, key, _id) VALUES '
+                                     + ', '.join(['(?, ?, ?)'] * len(keys)),
+                                     [parameter for key in keys
+                                      for parameter in (name, key, document_id)])
+
+    def _delete_entries(self, document):
+        """
+        Delete the entries of document in the multikey indexes
+        """
+        if self._get_multikey_indexes():
+            self._client.execute(f'DELETE FROM {self._keys_table} WHERE _id = ?',
+                                 (dumps(document['_id']),))
+
+    def scan(self, query):
+        """
+        Get the documents that may match query in natural order.
+        Equality on _id or on every field of a unique index, and $in on a unique index,
+        are looked up by the index, fields of unique indexes are expected to hold single values.
+        Equality, ranges and $elemMatch ranges on a field with a multikey index are looked up
+        by its entries, so is an $or of which every branch is.
+        Equality and ranges of numbers on other fields and searches for words are checked
+        by SQLite on every row, the documents selected are matched by the whole query in process.
+        """
+        self._create()
+        sql, parameters = self._plan(query or {})
+        if not sql:
+            rows = self._client.execute(f'SELECT doc FROM {self._table} ORDER BY rowid')
+            return (loads(doc) for (doc,) in rows)
+        # rows selected are ordered here, ORDER BY rowid would keep SQLite from using an index
+        rows = sorted(self._client.execute(f'SELECT rowid, doc FROM {self._table}{sql}',
+                                           parameters))
+        return (loads(doc) for _, doc in rows)
+
+    def scan_ordered(self, query, sort=(None, pymongo.ASCENDING)):
+        """
+        Get the documents matching query in the order of the field of sort, which has a unique
+        index, missing fields first as null, or in natural order if it is None.
+        Rows are read in that order in windows, each checked by SQLite against the entries
+        of multikey indexes it has, so reading stops when the documents needed are read.
+        A query matching few rows would read most of them, so once less than one row read
+        in ORDERED_SCAN_RATIO matches, the rest is selected through the entries and sorted.
+
+        Parameters:
+        query (dict): filter of the documents
+        sort (tuple): field and direction of the order
+        """
+        self._create()
+        field, direction = sort
+        descending = ' DESC' if direction == pymongo.DESCENDING else ''
+        if field is None:
+            order = f' ORDER BY rowid{descending}'
+            key = 'rowid'
+        else:
+            self._count_index_use(self.unique_index_of(field))
+            key = f'json_extract(doc, {json_path_of(field)})'
+            order = f' ORDER BY {key}{descending}, rowid{descending}'
+        query = query or {}
+        window_sql, window_parameters = self._plan(query, with_entries=False)
+        row_sql, row_parameters = self._plan(query, row='walked')
+        entries_sql, entries_parameters = self._plan(query)
+        # without entries to look up, the rows of the windows are all the rows that may match,
+        # they are read to the end
+        has_entries = entries_sql != window_sql
+        row_condition = row_sql[len(' WHERE '):] if row_sql else '1'
+        documents_read = set()
+        offset, batch = 0, ORDERED_SCAN_BATCH
+        while not offset or not has_entries \
+                or len(documents_read) * ORDERED_SCAN_RATIO >= offset:
+            rows = self._client.execute(
+                f'SELECT walked._id, CASE WHEN {row_condition} THEN walked.doc END '
+                f'FROM (SELECT rowid AS row_id, _id, doc, {key} AS sort_key FROM {self._table}'
+                f'{window_sql}{order} LIMIT ? OFFSET ?) AS walked '
+                f'ORDER BY walked.sort_key{descending}, walked.row_id{descending}',
+                row_parameters + window_parameters + (batch, offset))
+            for document_id, doc in rows:
+                if doc is None:
+                    continue
+                document = loads(doc)
+                if match(document, query):
+                    documents_read.add(document_id)
+                    yield document
+            if len(rows) < batch:
+                return
+            offset += batch
+            batch *= 2
+        # in natural order, ORDER BY rowid would keep SQLite from using the entries
+        rows = self._client.execute(f'SELECT rowid, _id, doc FROM {self._table}{entries_sql}'
+                                    f'{order if field else ""}', entries_parameters)
+        if field is None:
+            rows = sorted(rows, reverse=bool(descending))
+        for _, document_id, doc in rows:
+            if document_id not in documents_read:
+                document = loads(doc)
+                if match(document, query):
+                    yield document
+
+    def unique_index_of(self, field):
+        """
+        Get the name of the unique index of field alone, None if it has none
+        """
+        return next((name for name, index in self._get_indexes().items()
+                     if index['unique'] and [key for key, _ in index['key']] == [field]), None)
+
+    def _plan(self, query, with_entries=True, row=None):
+        """
+        Get the SQL condition and its parameters selecting the rows that may match query.
+        Conditions on the entries of multikey indexes are left out if not with_entries,
+        and check the entries of each row of the table or subquery named row if it is given.
+        """
+        conditions, parameters = self._index_condition_of(query)
+        for field, value in equalities_of(query).items():
+            if field == '_id' or not isinstance(value, (str, int, float)):
+                continue
+            if self._multikey_index_of(field):
+                if not with_entries:
+                    continue
+                conditions.append(self._entries_condition_of(field, ['$eq'], row))
+                parameters += [self._multikey_index_of(field), value]
+            else:
+                # an array field matches if one of its elements equals value
+                path = json_path_of(field)
+                conditions.append(f"(json_extract(doc, {path}) = ? "
+                                  f"OR json_type(doc, {path}) = 'array')")
+                parameters.append(value)
+        for field, operator, value in ranges_of(query):
+            if self._multikey_index_of(field):
+                if not with_entries:
+                    continue
+                conditions.append(self._entries_condition_of(field, [operator], row))
+                parameters += [self._multikey_index_of(field), value]
+            else:
+                conditions.append(self._range_condition_of(field, operator, value))
+                parameters.append(value)
+        for field, bounds in element_ranges_of(query):
+            if self._multikey_index_of(field) and with_entries:
+                conditions.append(self._entries_condition_of(
+                    field, [operator for operator, _ in bounds], row))
+                parameters += [self._multikey_index_of(field)] + [value for _, value in bounds]
+        for sub_queries in ors_of(query):
+            sub_plans = [self._plan(sub_query, with_entries, row) for sub_query in sub_queries]
+            if all(sql for sql, _ in sub_plans):
+                conditions.append('(' + ' OR '.join(f'({sql[len(" WHERE "):]})'
+                                                    for sql, _ in sub_plans) + ')')
+                parameters += [parameter for _, sub_parameters in sub_plans
+                               for parameter in sub_parameters]
+        for field, pattern in like_patterns_of(query):
+            conditions.append(f'json_extract(doc, {json_path_of(field)}) LIKE ?')
+            parameters.append(pattern)
+        if not conditions:
+            return '', ()
+        return ' WHERE ' + ' AND '.join(conditions), tuple(parameters)
+
+    def _entries_condition_of(self, field, operators, row=None):
+        """
+        Get the SQL condition selecting the documents with an entry of the multikey index of field
+        compared by each of operators, its parameters are the index name and the values.
+        The entries are looked up for all documents at once, or for each row of row if given.
+        """
+        self._count_index_use(self._multikey_index_of(field))
+        comparisons = ''.join(f' AND key {SQL_KEY_COMPARISONS[operator]} ?'
+                              for operator in operators)
+        if row:
+            # the entries of the row, not all the entries compared, are read for each row
+            return f'EXISTS (SELECT 1 FROM {self._keys_table} AS entry ' \
+                   f'INDEXED BY {quote(f"{self.full_name}$keys._id")} ' \
+                   f'WHERE entry._id = {row}._id AND name = ?{comparisons})'
+        return f'_id IN (SELECT _id FROM {self._keys_table} WHERE name = ?{comparisons})'
+
+    def _range_condition_of(self, field, operator, value):
+        """
+        Get the SQL condition of a range on field, served by the unique index of field if any,
+        whose fields hold single values. SQLite orders numbers before text,
+        and arrays are extracted as JSON text, so arrays are added to a range of strings
+        and to a range below a number to be matched in process.
+        """
+        path = json_path_of(field)
+        condition = f'json_extract(doc, {path}) {SQL_COMPARISONS[operator]} ?'
+        for name, index in self._get_indexes().items():
+            if index['key'][0][0] == field:
+                self._count_index_use(name)
+                return condition
+        if isinstance(value, str):
+            return f"({condition} OR json_type(doc, {path}) = 'array')"
+        if operator in ('$lt', '$lte'):
+            return f"({condition} OR (json_extract(doc, {path}) >= '[' " \
+                   f"AND json_extract(doc, {path}) < '\\'))"
+        return condition
+
+    def _index_condition_of(self, query):
+        """
+        Get the SQL conditions and parameters of the index looking up query, empty if none does
+        """
+        equalities = equalities_of(query)
+        if '_id' in equalities:
+            self._count_index_use(ID_INDEX)
+            return ['_id = ?'], [dumps(equalities['_id'])]
+        for name, index in self._get_indexes().items():
+            if not index['unique']:
+                continue
+            fields = [field for field, _ in index['key']]
+            if all(isinstance(equalities.get(field), (str, int, float)) for field in fields):
+                self._count_index_use(name)
+                return [f'json_extract(doc, {json_path_of(field)}) = ?' for field in fields], \
+                    [equalities[field] for field in fields]
+            condition = query.get(fields[0])
+            if len(fields) == 1 and is_operator_dict(condition) and list(condition) == ['$in'] \
+                    and all(isinstance(value, (str, int, float)) for value in condition['$in']):
+                self._count_index_use(name)
+                return [f'json_extract(doc, {json_path_of(fields[0])}) '
+                        f'IN ({", ".join("?" * len(condition["$in"]))})'], list(condition['$in'])
+        return [], []
+
+    def _insert(self, document):
+        """
+        Insert one document in the current transaction, raise DuplicateKeyError on a duplicate key
+        """
+        try:
+            self._client.execute(f'INSERT INTO {self._table} (_id, doc) VALUES (?, ?)',
+                                 (dumps(document['_id']), dumps(document)))
+        except sqlite3.IntegrityError as err:
+            raise DuplicateKeyError(f'E11000 duplicate key error collection: {self.full_name} '
+                                    f'({err})', DUPLICATE_KEY_ERROR) from err
+        self._write_entries(document)
+
+    def _replace(self, document):
+        """
+        Write an updated document in the current transaction
+        """
+        try:
+            self._client.execute(f'UPDATE {self._table} SET doc = ? WHERE _id = ?',
+                                 (dumps(document), dumps(document['_id'])))
+        except sqlite3.IntegrityError as err:
+            raise DuplicateKeyError(f'E11000 duplicate key error collection: {self.full_name} '
+                                    f'({err})', DUPLICATE_KEY_ERROR) from err
+        self._delete_entries(document)
+        self._write_entries(document)
+
+    def _delete(self, document):
+        self._client.execute(f'DELETE FROM {self._table} WHERE _id = ?',
+                             (dumps(document['_id']),))
+        self._delete_entries(document)
+
+    def _first(self, query, sort=None):
+        """
+        Get the first document matching query in the order of sort, None if there is none
+        """
+        documents = (document for document in self.scan(query) if match(document, query))
+        if sort:
+            documents = iter(sort_documents(list(documents), keys_of(sort)))
+        return next(documents, None)
+
+    def _update(self, query, update, upsert, is_many=False):
+        """
+        Update the first document or all documents matching query in the current transaction.
+        Return the raw result of mongoDB: n, nModified and the _id of the upserted document.
+        """
+        matched = modified = 0
+        documents = [document for document in self.scan(query) if match(document, query)]
+        for document in documents if is_many else documents[:1]:
+            matched += 1
+            if apply_update(document, update):
+                modified += 1
+                self._replace(document)
+        if matched or not upsert:
+            return {'n': matched, 'nModified': modified}
+        document = copy.deepcopy(equalities_of(query))
+        apply_update(document, update, is_insert=True)
+        document.setdefault('_id', ObjectId())
+        self._insert(document)
+        return {'n': 1, 'nModified': 0, 'upserted': document['_id']}
+
+    def find(self, query=None, projection=None, sort=None, skip=0, limit=0):
+        """
+        Get a cursor of the documents matching query
+        """
+        return EmbeddedCursor(self, query, projection, sort, skip, limit)
+
+    def find_one(self, query=None, projection=None, sort=None):
+        """
+        Get the first document matching query, None if there is none
+        """
+        return next(iter(self.find(query, projection, sort, limit=1)), None)
+
+    def count_documents(self, query, limit=0, skip=0):
+        """
+        Count the documents matching query
+        """
+        return sum(1 for _ in self.find(query, {'_id': 1}, skip=skip, limit=limit))
+
+    def insert_one(self, document):
+        """
+        Insert document, its _id is generated if it has none, as pymongo does
+        """
+        document.setdefault('_id', ObjectId())
+        self._create()
+        with self._client.transaction():
+            self._insert(document)
+        return InsertOneResult(document['_id'], True)
+
+    def insert_many(self, documents, ordered=True):
+        """
+        Insert documents in one transaction
+        """
+        documents = list(documents)
+        result = self.bulk_write([pymongo.InsertOne(document) for document in documents],
+                                 ordered=ordered)
+        return InsertManyResult([document['_id'] for document in documents],
+                                result.acknowledged)
+
+    def update_one(self, query, update, upsert=False):
+        """
+        Update the first document matching query, or insert one if upsert and none matches
+        """
+        self._create()
+        with self._client.transaction():
+            return UpdateResult(self._update(query, update, upsert), True)
+
+    def update_many(self, query, update, upsert=False):
+        """
+        Update every document matching query, or insert one if upsert and none matches
+        """
+        self._create()
+        with self._client.transaction():
+            return UpdateResult(self._update(query, update, upsert, is_many=True), True)
+
+    def find_one_and_update(self, query, update, projection=None, sort=None,
+                            upsert=False, return_document=pymongo.ReturnDocument.BEFORE):
+        """
+        Update the first document matching query in the order of sort, atomically.
+        Return the document before the update, or after it if return_document is AFTER.
+        """
+        self._create()
+        with self._client.transaction():
+            document = self._first(query, sort)
+            if document is None:
+                if not upsert:
+                    return None
+                upserted_id = self._update(query, update, upsert)['upserted']
+                if return_document == pymongo.ReturnDocument.BEFORE:
+                    return None
+                return project(self._first({'_id': upserted_id}), projection)
+            before = copy.deepcopy(document)
+            if apply_update(document, update):
+                self._replace(document)
+        return project(document if return_document == pymongo.ReturnDocument.AFTER else before,
+                       projection)
+
+    def delete_one(self, query):
+        """
+        Delete the first document matching query
+        """
+        return self._delete_matching(query, is_many=False)
+
+    def delete_many(self, query):
+        """
+        Delete every document matching query
+        """
+        return self._delete_matching(query, is_many=True)
+
+    def _delete_matching(self, query, is_many):
+        self._create()
+        with self._client.transaction():
+            documents = [document for document in self.scan(query) if match(document, query)]
+            for document in documents if is_many else documents[:1]:
+                self._delete(document)
+        return DeleteResult({'n': len(documents) if is_many else len(documents[:1])}, True)
+
+    def bulk_write(self, requests, ordered=True):
+        """
+        Apply InsertOne, UpdateOne, UpdateMany, DeleteOne and DeleteMany requests in one
+        transaction. A request that fails is reported in BulkWriteError with the results,
+        an ordered bulk write stops at the first failure, an unordered one goes on.
+        """
+        self._create()
+        result = {'writeErrors': [], 'writeConcernErrors': [], 'nInserted': 0, 'nUpserted': 0,
+                  'nMatched': 0, 'nModified': 0, 'nRemoved': 0, 'upserted': []}
+        with self._client.transaction():
+            for index, request in enumerate(requests):
+                try:
+                    self._apply_request(request, index, result)
+                except OperationFailure as err:
+                    result['writeErrors'].append({'index': index, 'code': err.code,
+                                                  'errmsg': str(err)})
+                    if ordered:
+                        break
+        if result['writeErrors']:
+            raise BulkWriteError(result)
+        return BulkWriteResult(result, True)
+
+    def _apply_request(self, request, index, result):
+        """
+        Apply one request of bulk_write in the current transaction, counting it in result
+        """
+        # pymongo keeps the arguments of a request in private attributes
+        # pylint: disable=protected-access
+        if isinstance(request, pymongo.InsertOne):
+            request._doc.setdefault('_id', ObjectId())
+            self._insert(request._doc)
+            result['nInserted'] += 1
+        elif isinstance(request, (pymongo.UpdateOne, pymongo.UpdateMany)):
+            raw_result = self._update(request._filter, request._doc, request._upsert,
+                                      is_many=isinstance(request, pymongo.UpdateMany))
+            if 'upserted' in raw_result:
+                result['nUpserted'] += 1
+                result['upserted'].append({'index': index, '_id': raw_result['upserted']})
+            else:
+                result['nMatched'] += raw_result['n']
+                result['nModified'] += raw_result['nModified']
+        elif isinstance(request, (pymongo.DeleteOne, pymongo.DeleteMany)):
+            query = request._filter
+            documents = [document for document in self.scan(query) if match(document, query)]
+            if isinstance(request, pymongo.DeleteOne):
+                documents = documents[:1]
+            for document in documents:
+                self._delete(document)
+            result['nRemoved'] += len(documents)
+        else:
+            raise OperationFailure(f'{type(request).__name__} is not supported')
+
+    def create_index(self, keys, unique=False, name=None):
+        """
+        Create the index of keys if it does not exist, return its name.
+        A unique index is kept by SQLite, creating it fails if the table has duplicate keys.
+        An index that is not unique is a multikey index of its first field,
+        its entries are written for the documents stored before it.
+        """
+        keys = keys_of(keys)
+        name = name or index_name_of(keys)
+        self._create()
+        if not unique:
+            self._create_multikey_index(keys, name)
+            return name
+        columns = ', '.join(f'json_extract(doc, {json_path_of(field)})' for field, _ in keys)
+        with self._client.transaction():
+            try:
+                self._client.execute(f'CREATE {"UNIQUE " if unique else ""}INDEX IF NOT EXISTS '
+                                     f'{quote(f"{self.full_name}.{name}")} '
+                                     f'ON {self._table} ({columns})')
+            except sqlite3.IntegrityError as err:
+                raise DuplicateKeyError(f'E11000 duplicate key error collection: '
+                                        f'{self.full_name} index: {name} ({err})',
+                                        DUPLICATE_KEY_ERROR) from err
+            self._client.execute(f'INSERT OR REPLACE INTO {INDEX_TABLE} VALUES (?, ?, ?, ?)',
+                                 (self.full_name, name, dumps(keys), int(unique)))
+        self._indexes = None
+        return name
+
+    def _create_multikey_index(self, keys, name):
+        """
+        Create the multikey index of the first field of keys, writing the entries of the documents
+        if it has none. Stores of older versions kept these indexes as SQLite indexes, dropped here.
+        """
+        with self._client.transaction():
+            self._client.execute(f'DROP INDEX IF EXISTS {quote(f"{self.full_name}.{name}")}')
+            self._client.execute(f'INSERT OR REPLACE INTO {INDEX_TABLE} VALUES (?, ?, ?, ?)',
+                                 (self.full_name, name, dumps(keys), 0))
+            self._indexes = None
+            if not self._client.execute(f'SELECT 1 FROM {self._keys_table} WHERE name = ? LIMIT 1',
+                                        (name,)):
+                index = {name: keys[0][0]}
+                for (doc,) in self._client.execute(f'SELECT doc FROM {self._table}'):
+                    self._write_entries(loads(doc), index)
+
+    def create_indexes(self, indexes):
+        """
+        Create the indexes of a list of IndexModel, return their names
+        """
+        names = []
+        for index in indexes:
+            document = index.document
+            names.append(self.create_index(list(document['key'].items()),
+                                           unique=document.get('unique', False),
+                                           name=document.get('name')))
+        return names
+
+    def index_information(self):
+        """
+        Get the indexes of the collection by name, with _id
+        """
+        information = {ID_INDEX: {'key': [('_id', pymongo.ASCENDING)]}}
+        for name, index in self._get_indexes().items():
+            information[name] = dict(index) if index['unique'] else {'key': index['key']}
+        return information
+
+    def drop(self):
+        """
+        Drop the table of the collection with its indexes
+        """
+        with self._client.transaction():
+            self._client.execute(f'DROP TABLE IF EXISTS {self._table}')
+            self._client.execute(f'DROP TABLE IF EXISTS {self._keys_table}')
+            self._client.execute(f'DELETE FROM {INDEX_TABLE} WHERE collection = ?',
+                                 (self.full_name,))
+        self._is_created = False
+        self._indexes = None
+        self._index_ops = {}
+
+    def _lookup(self, documents, argument):
+        """
+        Join documents with the documents of another collection of $lookup,
+        the documents joined by a value of localField are found in one query
+        """
+        foreign = self.database[argument['from']]
+        foreign_field = argument['foreignField']
+        local_values = [resolve(document, argument['localField'])[1] for document in documents]
+        values = {dumps(value): value for value in local_values
+                  if isinstance(value, (str, int, float))}
+        joined = {}
+        for foreign_document in foreign.find({foreign_field: {'$in': list(values.values())}}):
+            joined.setdefault(dumps(resolve(foreign_document, foreign_field)[1]), []) \
+                .append(foreign_document)
+        for document, value in zip(documents, local_values):
+            if isinstance(value, (str, int, float)):
+                document[argument['as']] = joined.get(dumps(value), [])
+            else:
+                # arrays and missing fields are matched as by find
+                document[argument['as']] = list(foreign.find({foreign_field: value}))
+        return documents
+
+    def aggregate(self, pipeline):
+        """
+        Run an aggregation pipeline of $match, $lookup, $replaceRoot, $project, $sort, $skip,
+        $limit and $indexStats stages. Return an iterator of the documents.
+        """
+        if pipeline and '$indexStats' in pipeline[0]:
+            documents = [{'name': name, 'key': dict(index['key']),
+                          'accesses': {'ops': self._index_ops.get(name, 0), 'since': self._since}}
+                         for name, index in self.index_information().items()]
+            pipeline = pipeline[1:]
+        elif pipeline and '$match' in pipeline[0]:
+            documents = list(self.find(pipeline[0]['$match']))
+            pipeline = pipeline[1:]
+        else:
+            documents = list(self.find())
+        for stage in pipeline:
+            (name, argument), = stage.items()
+            if name == '$match':
+                documents = [document for document in documents if match(document, argument)]
+            elif name == '$lookup':
+                documents = self._lookup(documents, argument)
+            elif name == '$replaceRoot':
+                documents = [evaluate(argument['newRoot'], document) for document in documents]
+            elif name == '$project':
+                documents = [project(document, argument) for document in documents]
+            elif name == '$sort':
+                documents = sort_documents(documents, keys_of(argument))
+            elif name == '$skip':
+                documents = documents[argument:]
+            elif name == '$limit':
+                documents = documents[:argument]
+            else:
+                raise OperationFailure(f'Unrecognized pipeline stage name: {name}')
+        return iter(documents)
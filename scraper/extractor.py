@@ -0,0 +1,227 @@
+"""
+Module for the single-pass extractor of food recipe pages.
+The selectors in RECIPE_FIELD_SELECTORS are compiled once into lookup tables,
+then every field of the recipe dict is filled in one walk over the generic table,
+instead of one find or find_all over the table per field.
+"""
+from bs4 import Tag
+
+from scraper.constant import RECIPE_FIELD_SELECTORS
+
+
+def minutes_of(time_text):
+    """
+    Get the number of minutes as int from time text in format x mins, x hr, or x hr y mins
+
+    Parameters:
+    time_text (str): text of prep time or cook time, may be quoted
+    """
+    time_text = time_text.strip()
+    if time_text[0] == '"':
+        time_text = time_text[1:]
+    if time_text[-1] == '"':
+        time_text = time_text[:-1]
+    res = time_text.split(' ')
+    if len(res) == 2:
+        # get time from str format x mins OR x hr
+        minutes = int(res[0])
+        if res[1] == 'hr':
+            minutes = minutes * 60
+    else:
+        # get time from str format x hr y mins
+        minutes = int(res[0]) * 60 + int(res[2])
+    return minutes
+
+
+def id_of(href):
+    """
+    Get the recipe id, the trailing digits of the href of link in image frame
+    """
+    url = href.strip()
+    for i in range(len(url))[::-1]:
+        if not url[i].isnumeric():
+            return url[i + 1:]
+    return url
+
+
+def text_of(tag):
+    """
+    Get the stripped text of tag
+    """
+    return tag.text.strip()
+
+
+def first_word_of(tag):
+    """
+    Get the first word of the text of tag
+    """
+    return tag.text.strip().split(' ')[0]
+
+
+def int_of(word):
+    """
+    Get the int of a word of digits, e.g. number of servings or people, None if it is not one.
+    Thousands separators are ignored, e.g. 1,234 people.
+    """
+    digits = word.strip().replace(',', '')
+    if not digits.isdigit():
+        print(f'Error: {word} is not a number')
+        return None
+    return int(digits)
+
+
+# how the value of each field is read from its target tag
+FIELD_VALUE_FUNCTIONS = {
+    'id': lambda tag: id_of(tag['href']),
+    'name': text_of,
+    'description': text_of,
+    'image url': lambda tag: tag['src'],
+    'yields': lambda tag: int_of(first_word_of(tag)),
+    'prep time': lambda tag: minutes_of(tag.text),
+    'cook time': lambda tag: minutes_of(tag.text),
+    'meal types': text_of,
+    'ingredients': text_of,
+    'instructions': text_of,
+    'popularity': lambda tag: int_of(first_word_of(tag))
+}
+
+
+def is_selector_match(tag, selector):
+    """
+    Check whether tag matches selector (tag name, class, id) like find of BeautifulSoup does.
+    A class with spaces matches the whole class attribute, as class_='plain ingredients'.
+    """
+    name, class_name, tag_id = selector
+    if name is not None and tag.name != name:
+        return False
+    if tag_id is not None and tag.get('id') != tag_id:
+        return False
+    if class_name is not None:
+        classes = tag.get('class') or []
+        if isinstance(classes, str):
+            classes = classes.split()
+        if class_name not in classes and ' '.join(classes) != class_name:
+            return False
+    return True
+
+
+class RecipeExtractor:
+    """
+    Extraction plan compiled from field selectors.
+    Selectors are indexed by tag name and by id,
+    so each tag of the table is only checked against selectors that can match it.
+    """
+
+    def __init__(self, field_selectors=None):
+        """
+        Compile the plan
+
+        Parameters:
+        field_selectors (dict): field to (scope, target, take all), RECIPE_FIELD_SELECTORS if None
+        """
+        if field_selectors is None:
+            field_selectors = RECIPE_FIELD_SELECTORS
+        self.fields = list(field_selectors.keys())
+        self.scopes = []
+        # field to (index of scope, whether to take all targets), scope None is the table
+        self.field_plan = {}
+        # candidates of a tag: selectors indexed by tag name, by id, or matching any tag
+        self.scope_index = {}
+        self.target_index = {}
+        for field, (scope, target, take_all) in field_selectors.items():
+            scope_idx = None
+            if scope is not None:
+                if scope not in self.scopes:
+                    self.scopes.append(scope)
+                    add_to_index(self.scope_index, scope, self.scopes.index(scope))
+                scope_idx = self.scopes.index(scope)
+            self.field_plan[field] = (scope_idx, take_all)
+            add_to_index(self.target_index, target, (target, field, scope_idx))
+
+    def extract(self, table):
+        """
+        Get the dict of recipe from table in one walk. Fields not found are left out.
+        Return None if id is not found.
+
+        Parameters:
+        table (obj): generic table tag of food recipe page
+        """
+        scope_found = [False] * len(self.scopes)
+        found = {field: [] for field in self.fields}
+        # stack of (tag, indexes of scopes its ancestors are), tags are popped in document order
+        stack = [(child, frozenset()) for child in reversed(table.contents)
+                 if isinstance(child, Tag)]
+        while stack:
+            tag, in_scopes = stack.pop()
+            for target, field, scope_idx in candidates_of(self.target_index, tag):
+                if scope_idx is not None and scope_idx not in in_scopes:
+                    continue
+                if found[field] and not self.field_plan[field][1]:
+                    continue
+                if is_selector_match(tag, target):
+                    found[field].append(tag)
+            for scope_idx in candidates_of(self.scope_index, tag):
+                if not scope_found[scope_idx] and is_selector_match(tag, self.scopes[scope_idx]):
+                    # only the first tag matching a scope is searched, as find does
+                    scope_found[scope_idx] = True
+                    in_scopes = in_scopes | {scope_idx}
+            stack.extend((child, in_scopes) for child in reversed(tag.contents)
+                         if isinstance(child, Tag))
+        return self.build_recipe_dict(found, scope_found)
+
+    def build_recipe_dict(self, found, scope_found):
+        """
+        Read values of the found tags into the recipe dict, report fields not found
+        """
+        recipe_dict = {}
+        for field in self.fields:
+            scope_idx, take_all = self.field_plan[field]
+            if scope_idx is not None and not scope_found[scope_idx] or \
+                    not take_all and not found[field]:
+                print(f'Error: {field} not found')
+                if field == 'id':
+                    # if no id, then stop scraping current recipe
+                    return None
+                continue
+            value_function = FIELD_VALUE_FUNCTIONS[field]
+            if take_all:
+                value = [value_function(tag) for tag in found[field]]
+            else:
+                value = value_function(found[field][0])
+            if field == 'id' and not value:
+                # an href without a trailing id, stop scraping current recipe
+                print('Error: id not found')
+                return None
+            # 0 minutes or people is a value
+            if value not in (None, '', []):
+                recipe_dict[field] = value
+        return recipe_dict
+
+
+def add_to_index(index, selector, item):
+    """
+    Add item to index under the tag name of selector, or its id if no tag name
+    """
+    name, _, tag_id = selector
+    if name is not None:
+        key = ('name', name)
+    elif tag_id is not None:
+        key = ('id', tag_id)
+    else:
+        key = ('any', None)
+    index.setdefault(key, []).append(item)
+
+
+def candidates_of(index, tag):
+    """
+    Get the items of index that may match tag
+    """
+    candidates = index.get(('name', tag.name), [])
+    tag_id = tag.get('id')
+    if tag_id is not None:
+        candidates = candidates + index.get(('id', tag_id), [])
+    return candidates + index.get(('any', None), [])
+
+
+# plan compiled once and shared by every scrape
+RECIPE_EXTRACTOR = RecipeExtractor()
@@ -0,0 +1,191 @@
+"""
+Module for the crawl frontier of scrape_many.
+The frontier records the listing pages found, the food recipe urls found on each listing page,
+and the recipes stored, as a journal of json lines appended while the crawl goes.
+An interrupted crawl is resumed from the journal without fetching any stored recipe again.
+"""
+import glob
+import hashlib
+import json
+import os
+import threading
+
+from scraper.constant import FRONTIER_DIR
+
+
+class CrawlFrontier:
+    """
+    Progress of one scrape_many crawl checkpointed in a journal file.
+    Safe to share between threads.
+    """
+
+    def __init__(self, path):
+        """
+        Parameters:
+        path (str): path of the journal file
+        """
+        self.path = path
+        self.url = None
+        self.scrape_type = None
+        self.target_number = 0
+        self.listing_urls = []
+        self.done_listing_urls = set()
+        # food recipe urls in the order found, and the ones stored
+        self.recipe_urls = []
+        self.done_recipe_urls = set()
+        self.done_recipe_ids = set()
+        self._lock = threading.Lock()
+        self._file = None
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load the frontier of an interrupted crawl from the journal at path.
+        Return None if there is no journal.
+        """
+        if not os.path.exists(path):
+            return None
+        frontier = cls(path)
+        with open(path, 'r') as file:
+            content = file.read()
+        for line in content.splitlines():
+            try:
+                event = json.loads(line)
+            except ValueError:
+                # last line may be cut by the interruption
+                continue
+            frontier._apply(event)
+        if frontier.url is None:
+            return None
+        frontier._file = open(path, 'a')
+        if content and not content.endswith('\n'):
+            # end the cut line, so the next event is on a line of its own
+            frontier._file.write('\n')
+        return frontier
+
+    @classmethod
+    def for_crawl(cls, url, scrape_type):
+        """
+        Get an empty frontier with the journal of the crawl of url in FRONTIER_DIR
+        """
+        key = hashlib.sha1(f'{scrape_type} {url}'.encode('utf-8')).hexdigest()
+        os.makedirs(FRONTIER_DIR, exist_ok=True)
+        return cls(os.path.join(FRONTIER_DIR, key + '.jsonl'))
+
+    @classmethod
+    def load_interrupted(cls):
+        """
+        Load the frontiers of every interrupted crawl in FRONTIER_DIR
+        """
+        frontiers = []
+        for path in sorted(glob.glob(os.path.join(FRONTIER_DIR, '*.jsonl'))):
+            frontier = cls.load(path)
+            if frontier:
+                frontiers.append(frontier)
+        return frontiers
+
+    @property
+    def stored(self):
+        """
+        Number of recipes stored by the crawl
+        """
+        return len(self.done_recipe_urls)
+
+    def start(self, url, scrape_type, target_number):
+        """
+        Start a new journal for the crawl, replacing any previous one
+
+        Parameters:
+        url (str): url of the first page with list of food recipe links
+        scrape_type (str): key of CLASS_NAME_DICT, 'default' or 'meal_type'
+        target_number (int): number of food recipes to scrape
+        """
+        self._file = open(self.path, 'w')
+        self._record({'event': 'start', 'url': url, 'scrape type': scrape_type,
+                      'target number': target_number})
+
+    def add_listing_urls(self, listing_urls):
+        """
+        Record the listing pages found from the paging links of the first page
+        """
+        self._record({'event': 'listing', 'urls': listing_urls})
+
+    def complete_listing(self, listing_url, recipe_urls):
+        """
+        Record that listing_url is fetched and recipe_urls are found on it
+        """
+        self._record({'event': 'listing done', 'url': listing_url, 'recipe urls': recipe_urls})
+
+    def complete_recipe(self, recipe_url, recipe_id):
+        """
+        Record that the recipe at recipe_url is stored
+        """
+        self._record({'event': 'recipe done', 'url': recipe_url, 'id': recipe_id})
+
+    def is_listing_done(self, listing_url):
+        """
+        Check whether listing_url is already fetched
+        """
+        with self._lock:
+            return listing_url in self.done_listing_urls
+
+    def is_recipe_done(self, recipe_url):
+        """
+        Check whether the recipe at recipe_url is already stored
+        """
+        with self._lock:
+            return recipe_url in self.done_recipe_urls
+
+    def pending_recipe_urls(self):
+        """
+        Get the food recipe urls found but not stored yet, in the order found
+        """
+        with self._lock:
+            return [recipe_url for recipe_url in self.recipe_urls
+                    if recipe_url not in self.done_recipe_urls]
+
+    def finish(self):
+        """
+        Remove the journal when the crawl is over, nothing is left to resume
+        """
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def _record(self, event):
+        """
+        Apply event and append it to the journal
+        """
+        with self._lock:
+            self._apply_unlocked(event)
+            if self._file:
+                self._file.write(json.dumps(event) + '\n')
+                self._file.flush()
+
+    def _apply(self, event):
+        """
+        Apply event to the frontier
+        """
+        with self._lock:
+            self._apply_unlocked(event)
+
+    def _apply_unlocked(self, event):
+        """
+        Apply event to the frontier, the lock is held by the caller
+        """
+        kind = event['event']
+        if kind == 'start':
+            self.url = event['url']
+            self.scrape_type = event['scrape type']
+            self.target_number = event['target number']
+        elif kind == 'listing':
+            self.listing_urls = event['urls']
+        elif kind == 'listing done':
+            self.done_listing_urls.add(event['url'])
+            self.recipe_urls.extend(event['recipe urls'])
+        elif kind == 'recipe done':
+            self.done_recipe_urls.add(event['url'])
+            self.done_recipe_ids.add(event['id'])
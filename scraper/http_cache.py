@@ -0,0 +1,191 @@
+"""
+Module for the on-disk cache of HTTP responses used by the scraper.
+Bodies are stored by the sha256 of their content, so identical pages are stored once.
+Entries are stored by the sha256 of their url and keep the ETag and Last-Modified headers,
+which are sent back to revalidate the body with a conditional request.
+Entries older than max_age are evicted, then least recently used entries
+until the bodies fit in max_size.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+# number of stores between two eviction passes
+EVICT_EVERY = 100
+# prefix of files being written, skipped by eviction
+TEMP_PREFIX = '.tmp'
+
+
+class HttpCache:
+    """
+    Content-addressed cache of response bodies in a directory.
+    Safe to share between threads.
+    """
+
+    def __init__(self, directory, max_size, max_age):
+        """
+        Parameters:
+        directory (str): directory of the cache, created if not exists
+        max_size (int): max total bytes of cached bodies
+        max_age (float): seconds an entry is kept after it was last stored or revalidated
+        """
+        self.directory = directory
+        self.max_size = max_size
+        self.max_age = max_age
+        self._entries_dir = os.path.join(directory, 'entries')
+        self._objects_dir = os.path.join(directory, 'objects')
+        os.makedirs(self._entries_dir, exist_ok=True)
+        os.makedirs(self._objects_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._store_count = 0
+
+    def lookup(self, url):
+        """
+        Get the entry of url as a dict, None if url is not cached or its body is missing
+
+        Parameters:
+        url (str): url of the page
+        """
+        entry = read_json(self._entry_path(url))
+        if entry is None or not os.path.exists(self._object_path(entry['body'])):
+            return None
+        return entry
+
+    def read_body(self, entry):
+        """
+        Get the body of the entry, None if it was evicted in the meantime
+        """
+        try:
+            with open(self._object_path(entry['body']), 'rb') as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    def conditional_headers(self, entry):
+        """
+        Get the headers to revalidate the body of the entry
+        """
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last modified'):
+            headers['If-Modified-Since'] = entry['last modified']
+        return headers
+
+    def store(self, url, body, headers):
+        """
+        Store the body of url with the validators from headers
+
+        Parameters:
+        url (str): url of the page
+        body (bytes): decoded body of the response
+        headers (dict): response headers with lower case names
+        """
+        digest = hashlib.sha256(body).hexdigest()
+        object_path = self._object_path(digest)
+        if not os.path.exists(object_path):
+            write_atomic(object_path, body)
+        entry = {'url': url, 'body': digest, 'size': len(body), 'stored at': time.time(),
+                 'etag': headers.get('etag'), 'last modified': headers.get('last-modified')}
+        write_atomic(self._entry_path(url), json.dumps(entry).encode('utf-8'))
+        with self._lock:
+            self._store_count += 1
+            should_evict = self._store_count % EVICT_EVERY == 0
+        if should_evict:
+            self.evict()
+
+    def touch(self, entry):
+        """
+        Mark the entry as revalidated now, so it is not evicted by age
+        """
+        entry['stored at'] = time.time()
+        write_atomic(self._entry_path(entry['url']), json.dumps(entry).encode('utf-8'))
+
+    def evict(self):
+        """
+        Remove entries older than max_age, then least recently stored entries
+        until the bodies fit in max_size. Bodies no entry refers to are removed.
+        """
+        with self._lock:
+            now = time.time()
+            entries = []
+            for entry_path in iter_files(self._entries_dir):
+                entry = read_json(entry_path)
+                if entry is None or now - entry['stored at'] > self.max_age:
+                    remove_file(entry_path)
+                    continue
+                entries.append((entry['stored at'], entry_path, entry))
+            # keep the most recent entries that fit in max_size
+            entries.sort(reverse=True)
+            kept_bodies = set()
+            total_size = 0
+            for _, entry_path, entry in entries:
+                if entry['body'] in kept_bodies:
+                    continue
+                if total_size + entry['size'] > self.max_size:
+                    remove_file(entry_path)
+                    continue
+                kept_bodies.add(entry['body'])
+                total_size += entry['size']
+            for object_path in iter_files(self._objects_dir):
+                if os.path.basename(object_path) not in kept_bodies:
+                    remove_file(object_path)
+
+    def _entry_path(self, url):
+        """
+        Get the path of the entry file of url
+        """
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return os.path.join(self._entries_dir, key[:2], key + '.json')
+
+    def _object_path(self, digest):
+        """
+        Get the path of the body file with sha256 digest
+        """
+        return os.path.join(self._objects_dir, digest[:2], digest)
+
+
+def read_json(path):
+    """
+    Read the json file at path, None if it does not exist or is not valid
+    """
+    try:
+        with open(path, 'r') as file:
+            return json.load(file)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def write_atomic(path, content):
+    """
+    Write content to path through a temporary file, so readers never see a partial file
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    file_descriptor, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=TEMP_PREFIX)
+    with os.fdopen(file_descriptor, 'wb') as file:
+        file.write(content)
+    os.replace(temp_path, path)
+
+
+def iter_files(directory):
+    """
+    Generate paths of the files in the sub directories of directory
+    """
+    for sub_directory in os.scandir(directory):
+        if sub_directory.is_dir():
+            for file in os.scandir(sub_directory.path):
+                if not file.name.startswith(TEMP_PREFIX):
+                    yield file.path
+
+
+def remove_file(path):
+    """
+    Remove the file at path if it still exists
+    """
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
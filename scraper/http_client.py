@@ -0,0 +1,400 @@
+"""
+Module for the shared HTTP client of the scraper.
+Connections are kept alive and pooled per host, so a crawl against the same host
+pays the TCP and TLS handshakes once per pooled connection instead of once per page.
+Responses compressed with gzip or deflate are decoded.
+Pages are cached on disk by HttpCache and revalidated with conditional requests.
+Requests are paced per host by RateLimiter,
+and failed fetches are retried with jittered exponential back off.
+Cache-only mode is set per thread, so crawls sharing the client do not change each other's mode.
+"""
+import contextlib
+import functools
+import gzip
+import http.client
+import queue
+import threading
+import time
+import zlib
+from urllib.error import URLError, HTTPError
+from urllib.parse import urlsplit, urljoin
+
+from scraper.constant import HTTP_TIMEOUT, HTTP_POOL_SIZE, HTTP_USER_AGENT, HTTP_CACHE_DIR, \
+    HTTP_CACHE_MAX_SIZE, HTTP_CACHE_MAX_AGE, HTTP_CACHE_ONLY, HTTP_MAX_RETRIES, HTTP_BACKOFF_BASE, \
+    HTTP_BACKOFF_MAX, RATE_LIMIT_INITIAL, RATE_LIMIT_MIN, RATE_LIMIT_MAX, RATE_LIMIT_INCREASE, \
+    RATE_LIMIT_DECREASE
+from scraper.http_cache import HttpCache
+from scraper.rate_limit import RateLimiter, backoff_delay, retry_after_seconds
+
+# max number of redirects followed for one url, same as urlopen
+MAX_REDIRECTS = 10
+# status codes of redirect responses
+REDIRECT_STATUSES = {301, 302, 303, 307, 308}
+# status codes of a host asking to slow down
+THROTTLE_STATUSES = {429, 503}
+# status codes of errors that may not happen again, the fetch is retried
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# errors meaning a kept-alive connection was closed by the server, the request can be resent
+STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, http.client.BadStatusLine,
+                           ConnectionResetError, BrokenPipeError)
+
+
+class HttpResponse:
+    """
+    Response of HttpClient.request with decoded body and lower case header names
+    """
+
+    def __init__(self, url, status, reason, headers, body):
+        """
+        Parameters:
+        url (str): url the response is for, after redirects
+        status (int): HTTP status code
+        reason (str): HTTP reason phrase
+        headers (dict): response headers with lower case names
+        body (bytes): decoded response body
+        """
+        self.url = url
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+
+
+class HttpClient:
+    """
+    HTTP client keeping a pool of kept-alive connections per host.
+    Safe to share between threads.
+    """
+
+    def __init__(self, timeout=HTTP_TIMEOUT, pool_size=HTTP_POOL_SIZE, ssl_context=None,
+                 cache=None, cache_only=False, rate_limiter=None, max_retries=0):
+        """
+        Parameters:
+        timeout (float): seconds to wait for connecting and for each read
+        pool_size (int): max number of idle connections kept per host
+        ssl_context (obj): ssl.SSLContext for https connections, default context if None
+        cache (obj): HttpCache of fetched pages, pages are not cached if None
+        cache_only (bool): whether to get pages from the cache only, with no network traffic
+        rate_limiter (obj): RateLimiter pacing requests to each host, not paced if None
+        max_retries (int): number of times a failed fetch is retried by get
+        """
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.ssl_context = ssl_context
+        self.cache = cache
+        self.cache_only = cache_only
+        self.rate_limiter = rate_limiter
+        self.max_retries = max_retries
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def get(self, url, cache_only=None):
+        """
+        Get the body of the page at url.
+        A cached page is revalidated with a conditional request and reused if not modified.
+        A fetch failed by a network error or by a status code in RETRY_STATUSES
+        is retried up to max_retries times after a jittered exponential back off,
+        or after the time asked by Retry-After if longer.
+        The url is given up if Retry-After asks for longer than HTTP_BACKOFF_MAX.
+        HTTPError is raised for status code 400 and above,
+        URLError is raised if the server cannot be reached,
+        or if the page is not cached in cache-only mode.
+
+        Parameters:
+        url (str): absolute url to get
+        cache_only (bool): whether to get the page from the cache only, if None the mode
+                           of this thread set by cache_only_mode, or else of the client
+        """
+        if cache_only is None:
+            cache_only = getattr(_THREAD_MODE, 'cache_only', self.cache_only)
+        entry = self.cache.lookup(url) if self.cache else None
+        if cache_only:
+            body = self.cache.read_body(entry) if entry else None
+            if body is None:
+                raise URLError(f'{url} is not cached, cannot fetch in cache-only mode')
+            return body
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self._get_once(url, entry)
+            except URLError as err:
+                if attempt == self.max_retries or not is_retryable(err):
+                    raise
+                delay = backoff_delay(attempt, HTTP_BACKOFF_BASE, HTTP_BACKOFF_MAX)
+                if isinstance(err, HTTPError):
+                    retry_after = retry_after_seconds(err.headers.get('retry-after')) or 0
+                    if retry_after > HTTP_BACKOFF_MAX:
+                        # a fetch thread is not held for the pause the host asks for
+                        print(f'Give up {url}, asked to retry in {retry_after:.0f}s: {err}')
+                        raise
+                    delay = max(delay, retry_after)
+                print(f'Retry {url} in {delay:.1f}s: {err}')
+                time.sleep(delay)
+        return None
+
+    def _get_once(self, url, entry):
+        """
+        Get the body of the page at url with one fetch, revalidating the cache entry if any
+        """
+        response = self.request(url, self.cache.conditional_headers(entry) if entry else None)
+        if response.status == 304 and entry:
+            body = self.cache.read_body(entry)
+            if body is not None:
+                self.cache.touch(entry)
+                return body
+            # body evicted since lookup, get the page again without condition
+            response = self.request(url)
+        if response.status >= 400:
+            raise HTTPError(response.url, response.status, response.reason, response.headers,
+                            None)
+        if self.cache and response.status == 200:
+            self.cache.store(url, response.body, response.headers)
+        return response.body
+
+    def request(self, url, headers=None):
+        """
+        Send a GET request to url following redirects and return the HttpResponse.
+        URLError is raised if the server cannot be reached.
+
+        Parameters:
+        url (str): absolute url to get
+        headers (dict): extra request headers
+        """
+        for _ in range(MAX_REDIRECTS + 1):
+            host = urlsplit(url).netloc
+            if self.rate_limiter:
+                self.rate_limiter.acquire(host)
+            response = self._request_once(url, headers)
+            if self.rate_limiter:
+                if response.status in THROTTLE_STATUSES:
+                    retry_after = retry_after_seconds(response.headers.get('retry-after'))
+                    # the host is paused for HTTP_BACKOFF_MAX at most
+                    self.rate_limiter.record_throttle(
+                        host, min(retry_after, HTTP_BACKOFF_MAX) if retry_after else None)
+                elif response.status < 400:
+                    # client errors say nothing of the load of the host, the rate is kept
+                    self.rate_limiter.record_success(host)
+            if response.status not in REDIRECT_STATUSES or 'location' not in response.headers:
+                return response
+            url = urljoin(url, response.headers['location'])
+        raise HTTPError(url, response.status, 'Too many redirects', response.headers, None)
+
+    def close(self):
+        """
+        Close all idle connections
+        """
+        with self._lock:
+            pools = list(self._pools.values())
+            self._pools = {}
+        for pool in pools:
+            while not pool.empty():
+                pool.get_nowait().close()
+
+    def _request_once(self, url, headers):
+        """
+        Send one GET request on a pooled connection.
+        A request on a reused connection closed by the server is sent again on a new one.
+        """
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.hostname, parts.port)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        request_headers = {'Accept-Encoding': 'gzip, deflate', 'Connection': 'keep-alive',
+                           'User-Agent': HTTP_USER_AGENT}
+        if headers:
+            request_headers.update(headers)
+        while True:
+            connection, is_reused = self._acquire(key)
+            try:
+                connection.request('GET', path, headers=request_headers)
+                raw_response = connection.getresponse()
+                body = raw_response.read()
+            except STALE_CONNECTION_ERRORS as err:
+                connection.close()
+                if is_reused:
+                    continue
+                raise URLError(err) from err
+            except (OSError, http.client.HTTPException) as err:
+                connection.close()
+                raise URLError(err) from err
+            response_headers = {name.lower(): value for name, value in raw_response.getheaders()}
+            if raw_response.will_close:
+                connection.close()
+            else:
+                self._release(key, connection)
+            return HttpResponse(url, raw_response.status, raw_response.reason, response_headers,
+                                decode_body(body, response_headers.get('content-encoding')))
+
+    def _acquire(self, key):
+        """
+        Get an idle connection to the host of key, or a new one if none is idle.
+        Return the connection and whether it was reused.
+        """
+        pool = self._get_pool(key)
+        try:
+            return pool.get_nowait(), True
+        except queue.Empty:
+            pass
+        scheme, host, port = key
+        if scheme == 'https':
+            connection = http.client.HTTPSConnection(host, port, timeout=self.timeout,
+                                                     context=self.ssl_context)
+        elif scheme == 'http':
+            connection = http.client.HTTPConnection(host, port, timeout=self.timeout)
+        else:
+            raise URLError(f'unknown url type: {scheme}')
+        return connection, False
+
+    def _release(self, key, connection):
+        """
+        Put the connection back to the pool of its host, close it if the pool is full
+        """
+        try:
+            self._get_pool(key).put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    def _get_pool(self, key):
+        """
+        Get the pool of idle connections of the host of key
+        """
+        with self._lock:
+            if key not in self._pools:
+                self._pools[key] = queue.LifoQueue(maxsize=self.pool_size)
+            return self._pools[key]
+
+
+def is_retryable(err):
+    """
+    Check whether the fetch failed by err may succeed if retried:
+    a network error, or a status code in RETRY_STATUSES
+    """
+    if isinstance(err, HTTPError):
+        return err.code in RETRY_STATUSES
+    # reason is the exception of a network error, a str for errors of the url itself
+    return isinstance(err.reason, Exception)
+
+
+def decode_body(body, content_encoding):
+    """
+    Decode the body of a response by its Content-Encoding header
+
+    Parameters:
+    body (bytes): raw response body
+    content_encoding (str): value of Content-Encoding header, None if not present
+    """
+    if not content_encoding or not body:
+        return body
+    content_encoding = content_encoding.strip().lower()
+    if content_encoding in ('gzip', 'x-gzip'):
+        return gzip.decompress(body)
+    if content_encoding == 'deflate':
+        try:
+            return zlib.decompress(body)
+        except zlib.error:
+            # some servers send raw deflate without the zlib header
+            return zlib.decompress(body, -zlib.MAX_WBITS)
+    return body
+
+
+# client shared by every scrape in this process, created on first use
+_SHARED_CLIENT = None
+_SHARED_CLIENT_LOCK = threading.Lock()
+# cache-only mode of each thread, the client setting applies to threads with none
+_THREAD_MODE = threading.local()
+
+
+def get_http_client():
+    """
+    Get the HttpClient shared in this process
+    """
+    global _SHARED_CLIENT
+    with _SHARED_CLIENT_LOCK:
+        if _SHARED_CLIENT is None:
+            _SHARED_CLIENT = HttpClient(cache=make_default_cache(), cache_only=HTTP_CACHE_ONLY,
+                                        rate_limiter=make_default_rate_limiter(),
+                                        max_retries=HTTP_MAX_RETRIES)
+        return _SHARED_CLIENT
+
+
+def configure_http_client(timeout=HTTP_TIMEOUT, pool_size=HTTP_POOL_SIZE, ssl_context=None,
+                          cache=None, cache_only=False, rate_limiter=None, max_retries=0):
+    """
+    Replace the shared HttpClient by one with the given settings and return it
+
+    Parameters:
+    timeout (float): seconds to wait for connecting and for each read
+    pool_size (int): max number of idle connections kept per host
+    ssl_context (obj): ssl.SSLContext for https connections, default context if None
+    cache (obj): HttpCache of fetched pages, pages are not cached if None
+    cache_only (bool): whether to get pages from the cache only, with no network traffic
+    rate_limiter (obj): RateLimiter pacing requests to each host, not paced if None
+    max_retries (int): number of times a failed fetch is retried
+    """
+    global _SHARED_CLIENT
+    with _SHARED_CLIENT_LOCK:
+        if _SHARED_CLIENT is not None:
+            _SHARED_CLIENT.close()
+        _SHARED_CLIENT = HttpClient(timeout, pool_size, ssl_context, cache, cache_only,
+                                    rate_limiter, max_retries)
+        return _SHARED_CLIENT
+
+
+@contextlib.contextmanager
+def cache_only_mode(enabled):
+    """
+    Context to get pages of the shared HttpClient from the cache only if enabled.
+    The mode is set for the current thread only, worker threads started inside the context
+    get it through the initializer of inherit_cache_only_mode.
+
+    Parameters:
+    enabled (bool): whether to turn on cache-only mode inside the context
+    """
+    previous = getattr(_THREAD_MODE, 'cache_only', None)
+    _THREAD_MODE.cache_only = enabled
+    try:
+        yield get_http_client()
+    finally:
+        set_cache_only_mode(previous)
+
+
+def inherit_cache_only_mode():
+    """
+    Get an initializer of worker threads, setting the cache-only mode of the current thread
+    """
+    return functools.partial(set_cache_only_mode, getattr(_THREAD_MODE, 'cache_only', None))
+
+
+def set_cache_only_mode(enabled):
+    """
+    Set the cache-only mode of the current thread
+
+    Parameters:
+    enabled (bool): whether to get pages from the cache only, None to use the client setting
+    """
+    if enabled is None:
+        _THREAD_MODE.__dict__.pop('cache_only', None)
+    else:
+        _THREAD_MODE.cache_only = enabled
+
+
+def make_default_cache():
+    """
+    Create the HttpCache configured by constants, None if the cache is disabled
+    """
+    if not HTTP_CACHE_DIR:
+        return None
+    return HttpCache(HTTP_CACHE_DIR, HTTP_CACHE_MAX_SIZE, HTTP_CACHE_MAX_AGE)
+
+
+def make_default_rate_limiter(share=1.0):
+    """
+    Create the RateLimiter configured by constants, None if requests are not paced
+
+    Parameters:
+    share (float): part of the rates given to this process, when processes crawl the same host
+    """
+    if not RATE_LIMIT_MAX:
+        return None
+    return RateLimiter(RATE_LIMIT_INITIAL * share, RATE_LIMIT_MIN * share, RATE_LIMIT_MAX * share,
+                       RATE_LIMIT_INCREASE * share, RATE_LIMIT_DECREASE)
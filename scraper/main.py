@@ -2,12 +2,14 @@
 Module for the main of scraper.
 Contains the menu in terminal and process the user input.
 """
+import argparse
 import sys
 
 from scraper.constant import DEFAULT_URL, TYPE_URL_PRE, TYPE_URL_AFT, MEAL_TYPES, OPTION_EXIT, \
     OPTION_BACK, ZERO, OPTION_ONE, OPTION_TWO, OPTION_THREE, OPTION_FOUR, OPTION_FIVE, OPTION_SIX, \
-    OPTION_SEVEN, OPTION_TWELVE
-from scraper.scraper import scrape_many, scrape_one
+    OPTION_SEVEN, OPTION_EIGHT, OPTION_TWELVE, OPTION_THIRTEEN
+from scraper.scraper import scrape_many, scrape_one, resume_interrupted_scrapes, \
+    refresh_stale_recipes, scrape_all_meal_types, scrape_many_distributed
 from scraper.database import Database, ALL_RECIPES, FAVOURITES
 from scraper.utils import export_to_json_file, update_by_json_file, insert_by_json_file
 from api.menu_crud import menu_simulate_api
@@ -31,13 +33,14 @@ def show_menu():
                        '5 = Update by json file\n'
                        '6 = Insert by json file\n'
                        '7 = Simulate CRUD requests\n'
+                       '8 = Refresh food recipes scraped longest ago\n'
                        'q = EXIT\n\n')
         if choice == OPTION_EXIT:
             sys.exit(0)
         if not choice.isnumeric():
             continue
         option = int(choice)
-        if OPTION_ONE <= option <= OPTION_SEVEN:
+        if OPTION_ONE <= option <= OPTION_EIGHT:
             break
 
     # Handle different options
@@ -52,12 +55,8 @@ def show_menu():
         menu_scrape_one()
     if option == OPTION_FOUR:
         # 4 = Export existing recipes to json file
-        # set database
-        global MONGO_DB
-        if not MONGO_DB:
-            MONGO_DB = Database()
         # export
-        export_to_json_file(MONGO_DB)
+        export_to_json_file(get_database())
         show_menu()
     if option == OPTION_FIVE:
         # 5 = Update by json file
@@ -69,6 +68,9 @@ def show_menu():
         # 7 = Simulate CRUD requests
         menu_simulate_api()
         show_menu()
+    if option == OPTION_EIGHT:
+        # 8 = Refresh food recipes scraped longest ago
+        menu_refresh_stale_recipes()
 
 
 def menu_scrape_many(is_default):
@@ -93,6 +95,7 @@ def menu_scrape_many(is_default):
                            '10 = Scrape side dish\n'
                            '11 = Scrape snack\n'
                            '12 = Scrape soup\n'
+                           '13 = Scrape all meal types in parallel\n'
                            'b = GO BACK\n\n')
             if choice == OPTION_BACK:
                 show_menu()
@@ -100,7 +103,7 @@ def menu_scrape_many(is_default):
             if not choice.isnumeric():
                 continue
             meal_type_choice = int(choice)
-            if OPTION_ONE <= meal_type_choice <= OPTION_TWELVE:
+            if OPTION_ONE <= meal_type_choice <= OPTION_THIRTEEN:
                 break
 
     while True:
@@ -121,12 +124,35 @@ def menu_scrape_many(is_default):
 
     if is_default:
         scrape_many(DEFAULT_URL, target_number, 'default')
+    elif meal_type_choice == OPTION_THIRTEEN:
+        # target_number recipes for each meal type
+        scrape_all_meal_types(target_number)
     else:
         scrape_many(TYPE_URL_PRE + MEAL_TYPES[meal_type_choice] + TYPE_URL_AFT, target_number,
                     'meal_type')
     show_menu()
 
 
+def menu_refresh_stale_recipes():
+    """
+    menu to refresh specified number of recipes scraped longest ago
+    """
+    while True:
+        choice = input('\nChoose one of the following options:\n'
+                       '<int> = number of food recipes to refresh\n'
+                       'b = GO BACK\n\n')
+        if choice == OPTION_BACK:
+            show_menu()
+            return
+        if not choice.isnumeric():
+            continue
+        number = int(choice)
+        if number >= ZERO:
+            break
+    refresh_stale_recipes(number)
+    show_menu()
+
+
 def menu_scrape_one():
     """
     menu to scrape one recipe by starting url
@@ -185,31 +211,94 @@ def menu_update_insert_by_json_file(operation):
         break
 
     # set database
-    global MONGO_DB
-    if not MONGO_DB:
-        MONGO_DB = Database()
+    mongo_db = get_database()
 
     # Handle different options
     if option == OPTION_ONE:
         # all recipes table
         if operation == UPDATE:
             # 1 = Update all recipes table
-            update_by_json_file(MONGO_DB, json_file, ALL_RECIPES)
+            update_by_json_file(mongo_db, json_file, ALL_RECIPES)
         if operation == INSERT:
             # 1 = Insert all recipes table
-            insert_by_json_file(MONGO_DB, json_file, ALL_RECIPES)
+            insert_by_json_file(mongo_db, json_file, ALL_RECIPES)
     if option == OPTION_TWO:
         # favourite recipes table
         if operation == UPDATE:
             # 2 = Update favourite recipes table
-            update_by_json_file(MONGO_DB, json_file, FAVOURITES)
+            update_by_json_file(mongo_db, json_file, FAVOURITES)
         if operation == INSERT:
             # 2 = Insert favourite recipes table
-            insert_by_json_file(MONGO_DB, json_file, FAVOURITES)
+            insert_by_json_file(mongo_db, json_file, FAVOURITES)
     show_menu()
 
 
+def get_database():
+    """
+    Get the Database of this run, created on first use with the indexes it does not have yet
+    """
+    global MONGO_DB
+    if not MONGO_DB:
+        MONGO_DB = Database()
+        # indexes are created once, later startups find them in place
+        MONGO_DB.ensure_indexes()
+    return MONGO_DB
+
+
+def print_index_usage(mongo_db):
+    """
+    Print the number of operations that used each index of the recipe tables
+
+    Parameters:
+    mongo_db (obj): Database instance
+    """
+    print(f'{"table":<20} {"index":<12} {"operations":>10}  since')
+    for index_usage in mongo_db.get_index_usage():
+        print(f'{index_usage["table"]:<20} {index_usage["name"]:<12} '
+              f'{index_usage["operations"]:>10}  {index_usage["since"]:%Y-%m-%d %H:%M}')
+
+
 if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='Collect food recipes from fatsecret.')
+    arg_parser.add_argument('--resume', action='store_true',
+                            help='continue the crawls interrupted in a previous run')
+    arg_parser.add_argument('--distributed', type=int, metavar='TARGET_NUMBER',
+                            help='join the crawl shared by several nodes through mongoDB '
+                                 'until TARGET_NUMBER recipes are stored, then exit')
+    arg_parser.add_argument('--meal-type', choices=MEAL_TYPES[1:],
+                            help='meal type of the distributed crawl, random recipes if not given')
+    arg_parser.add_argument('--index-usage', action='store_true',
+                            help='report the operations that used each index, then exit')
+    arg_parser.add_argument('--compact-favourites', action='store_true',
+                            help='keep in favourites only the attributes differing from the recipe, '
+                                 'then exit')
+    arg_parser.add_argument('--migrate-numeric-fields', action='store_true',
+                            help='convert yields, times and popularity stored as text to numbers, '
+                                 'then exit')
+    arg_parser.add_argument('--build-search-terms', action='store_true',
+                            help='write the search terms of recipes stored without them, '
+                                 'then exit')
+    args = arg_parser.parse_args()
+    # set on first use, the menu is shown without waiting for the database server
     MONGO_DB = None
-    print('Hello! Welcome to the food recipes collector.')
-    show_menu()
+    if args.index_usage:
+        print_index_usage(get_database())
+    elif args.compact_favourites:
+        get_database().compact_favourites()
+    elif args.migrate_numeric_fields:
+        get_database().migrate_numeric_attributes()
+    elif args.build_search_terms:
+        get_database().build_search_terms()
+    elif args.distributed is not None:
+        if args.meal_type:
+            scrape_many_distributed(TYPE_URL_PRE + args.meal_type + TYPE_URL_AFT,
+                                    args.distributed, 'meal_type', mongo_db=get_database())
+        else:
+            scrape_many_distributed(DEFAULT_URL, args.distributed, 'default',
+                                    mongo_db=get_database())
+    else:
+        print('Hello! Welcome to the food recipes collector.')
+        if args.resume:
+            # continue the crawls interrupted in a previous run
+            resume_interrupted_scrapes()
+        show_menu()
@@ -0,0 +1,120 @@
+"""
+Module for the staged pipeline of the scraper.
+Each stage has its own worker threads and reads from a bounded queue,
+so fetching, parsing and storing of different recipes overlap.
+A full queue blocks the stage before it, which keeps memory flat on large crawls.
+"""
+import queue
+import threading
+
+# put into the queue of a stage to stop one of its workers
+_STOP = object()
+
+
+class Pipeline:
+    """
+    Stages connected by bounded queues.
+    The output of a stage function is the input of the next stage.
+    A stage function returning None drops the item.
+    """
+
+    def __init__(self, stages, queue_size, on_result=None, on_drop=None, initializer=None):
+        """
+        Parameters:
+        stages (list): list of (name, function, number of workers)
+        queue_size (int): max number of items waiting in the queue of each stage
+        on_result (function): called with the output of the last stage
+        on_drop (function): called with the stage name and the item dropped by it
+        initializer (function): called at the start of each worker thread
+        """
+        self.stages = stages
+        self.on_result = on_result
+        self.on_drop = on_drop
+        self.initializer = initializer
+        self._queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+        self._workers = [[] for _ in stages]
+        self._processed = [0] * len(stages)
+        self._max_depths = [0] * len(stages)
+        self._lock = threading.Lock()
+
+    def start(self):
+        """
+        Start the workers of every stage
+        """
+        for stage_idx, (name, _, workers) in enumerate(self.stages):
+            for i in range(workers):
+                worker = threading.Thread(target=self._work, args=(stage_idx,),
+                                          name=f'{name}-{i}', daemon=True)
+                worker.start()
+                self._workers[stage_idx].append(worker)
+        return self
+
+    def put(self, item):
+        """
+        Put item into the first stage, block while its queue is full
+        """
+        self._put(0, item)
+
+    def close(self):
+        """
+        Wait until every item put is through the pipeline, then stop the workers stage by stage
+        """
+        for stage_idx, workers in enumerate(self._workers):
+            for _ in workers:
+                self._queues[stage_idx].put(_STOP)
+            for worker in workers:
+                worker.join()
+
+    def queue_depths(self):
+        """
+        Get the number of items waiting in the queue of each stage, by stage name
+        """
+        return {name: self._queues[stage_idx].qsize()
+                for stage_idx, (name, _, _) in enumerate(self.stages)}
+
+    def stats(self):
+        """
+        Get the number of items processed and the max queue depth of each stage, by stage name
+        """
+        with self._lock:
+            return {name: {'processed': self._processed[stage_idx],
+                           'max queued': self._max_depths[stage_idx]}
+                    for stage_idx, (name, _, _) in enumerate(self.stages)}
+
+    def _put(self, stage_idx, item):
+        """
+        Put item into the queue of stage, record the depth of the queue
+        """
+        self._queues[stage_idx].put(item)
+        depth = self._queues[stage_idx].qsize()
+        with self._lock:
+            self._max_depths[stage_idx] = max(self._max_depths[stage_idx], depth)
+
+    def _work(self, stage_idx):
+        """
+        Worker loop of a stage: process items until stopped
+        """
+        name, function, _ = self.stages[stage_idx]
+        is_last = stage_idx == len(self.stages) - 1
+        if self.initializer:
+            self.initializer()
+        while True:
+            item = self._queues[stage_idx].get()
+            if item is _STOP:
+                return
+            try:
+                output = function(item)
+            except Exception as err:  # pylint: disable=broad-except
+                # one bad page should not stop the worker
+                print(f'Error in {name} stage: {err}')
+                output = None
+            with self._lock:
+                self._processed[stage_idx] += 1
+            if output is None:
+                if self.on_drop:
+                    self.on_drop(name, item)
+            elif is_last:
+                if self.on_result:
+                    self.on_result(output)
+            else:
+                self._put(stage_idx + 1, output)
@@ -0,0 +1,142 @@
+"""
+Module for the adaptive per-host rate limiter of the HTTP client.
+Each host has a token bucket refilled at its current rate of requests per second.
+The rate goes up a step with every healthy response, up to max_rate,
+and is cut by a factor when the host throttles with 429 or 503,
+so the crawl settles near the highest rate the host sustains.
+A Retry-After header pauses the host until the time it asks for.
+"""
+import email.utils
+import random
+import threading
+import time
+from datetime import datetime, timezone
+
+
+class HostBucket:
+    """
+    Token bucket of one host
+    """
+
+    def __init__(self, rate, burst):
+        """
+        Parameters:
+        rate (float): requests per second to start with
+        burst (float): max number of tokens saved while the host is idle
+        """
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.refilled_at = time.monotonic()
+        # no request is sent before this time, set by Retry-After
+        self.paused_until = 0.0
+
+
+class RateLimiter:
+    """
+    Token buckets by host with additive increase and multiplicative decrease of the rate.
+    Safe to share between threads.
+    """
+
+    def __init__(self, initial_rate, min_rate, max_rate, increase, decrease, burst=1.0):
+        """
+        Parameters:
+        initial_rate (float): requests per second to a new host
+        min_rate (float): lowest requests per second after back off
+        max_rate (float): highest requests per second
+        increase (float): requests per second added after each healthy response
+        decrease (float): factor the rate is multiplied by when the host throttles
+        burst (float): max number of requests sent at once after an idle time
+        """
+        self.initial_rate = initial_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.burst = burst
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, host):
+        """
+        Wait until a request to host can be sent
+        """
+        while True:
+            with self._lock:
+                bucket = self._get_bucket(host)
+                now = time.monotonic()
+                if now < bucket.paused_until:
+                    wait = bucket.paused_until - now
+                else:
+                    bucket.tokens = min(bucket.burst,
+                                        bucket.tokens + (now - bucket.refilled_at) * bucket.rate)
+                    bucket.refilled_at = now
+                    if bucket.tokens >= 1:
+                        bucket.tokens -= 1
+                        return
+                    wait = (1 - bucket.tokens) / bucket.rate
+            # sleep outside the lock, so other hosts are not held up
+            time.sleep(wait)
+
+    def record_success(self, host):
+        """
+        Raise the rate of host after a healthy response
+        """
+        with self._lock:
+            bucket = self._get_bucket(host)
+            bucket.rate = min(self.max_rate, bucket.rate + self.increase)
+
+    def record_throttle(self, host, retry_after=None):
+        """
+        Cut the rate of host after it throttled, pause it for retry_after seconds if given
+        """
+        with self._lock:
+            bucket = self._get_bucket(host)
+            bucket.rate = max(self.min_rate, bucket.rate * self.decrease)
+            bucket.tokens = 0
+            if retry_after:
+                bucket.paused_until = max(bucket.paused_until, time.monotonic() + retry_after)
+
+    def rate_of(self, host):
+        """
+        Get the current requests per second of host
+        """
+        with self._lock:
+            return self._get_bucket(host).rate
+
+    def _get_bucket(self, host):
+        """
+        Get the bucket of host, the lock is held by the caller
+        """
+        if host not in self._buckets:
+            self._buckets[host] = HostBucket(self.initial_rate, self.burst)
+        return self._buckets[host]
+
+
+def backoff_delay(attempt, base, cap):
+    """
+    Get the seconds to wait before retry number attempt, starting at 0.
+    Exponential back off with full jitter: random between 0 and min(cap, base * 2 ** attempt).
+    """
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def retry_after_seconds(value):
+    """
+    Get the seconds to wait from a Retry-After header, in seconds or as an HTTP date.
+    HTTP dates are in UTC, also when they have no zone or -0000, whatever the local time zone.
+    Return None if value is missing or not valid.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        # a naive datetime would be taken as local time
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
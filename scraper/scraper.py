@@ -4,24 +4,96 @@ Contain methods to scrape recipes in https://www.fatsecret.com
 Storage into the database after every scrape.
 Progress and error is reported during scraping.
 """
-from urllib.request import urlopen
+import functools
+import importlib.util
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from urllib.error import URLError, HTTPError
 
-from bs4 import BeautifulSoup
-
-from scraper.constant import BASE_URL, CLASS_NAME_DICT
-from scraper.database import Database, ALL_RECIPES
+from bs4 import BeautifulSoup, SoupStrainer
+
+from scraper.constant import BASE_URL, CLASS_NAME_DICT, CRAWL_CONCURRENCY, HTTP_CACHE_ONLY, \
+    HTML_PARSER, RESTRICTED_PARSE, PARSE_WORKERS, STORE_WORKERS, PIPELINE_QUEUE_SIZE, \
+    FORCE_REFRESH, CRAWL_PROCESSES, MEAL_TYPES, TYPE_URL_PRE, TYPE_URL_AFT, HTTP_MAX_RETRIES, \
+    PARSE_PROCESSES, WORK_POLL_INTERVAL
+from scraper.bulk_writer import BulkRecipeWriter
+from scraper.database import Database, ALL_RECIPES, INSERTED, UPDATED, UNCHANGED
+from scraper.dedup import RecipeIdFilter
+from scraper.extractor import RECIPE_EXTRACTOR, minutes_of, id_of, int_of
+from scraper.frontier import CrawlFrontier
+from scraper.http_client import get_http_client, cache_only_mode, configure_http_client, \
+    inherit_cache_only_mode, make_default_cache, make_default_rate_limiter
+from scraper.pipeline import Pipeline
+from scraper.work_queue import CrawlWorkQueue, START, LISTING, RECIPE
 
 # control the number of dash in print for progress
 DASH_NUMBER = 30
+# start method of the parser processes, a forked child would inherit the locks held by
+# the fetch threads already running when the pool starts its processes
+PARSER_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() \
+    else 'spawn'
 
 
-def get_soup(url):
+def class_matcher(*class_names):
     """
-    Get the soup by url
+    Get a function for SoupStrainer matching tags with any of class_names in their class.
+    The class attribute is a str while parsing, so it is split here.
+    """
+    def match(class_value):
+        if not class_value:
+            return False
+        classes = class_value.split() if isinstance(class_value, str) else class_value
+        return any(class_name in classes for class_name in class_names)
+    return match
+
+
+# only the table read by the get_* extractors is parsed from food recipe pages
+RECIPE_PAGE_STRAINER = SoupStrainer('table', class_=class_matcher('generic'))
+# only the paging links and the list table are parsed from listing pages
+LISTING_PAGE_STRAINER = SoupStrainer(['div', 'table'],
+                                     class_=class_matcher('searchResultsPaging', 'listtable'))
+
+
+def resolve_parser(parser):
+    """
+    Get the name of BeautifulSoup parser backend, 'auto' is lxml if installed
+
+    Parameters:
+    parser (str): 'lxml', 'html.parser', or 'auto'
+    """
+    if parser != 'auto':
+        return parser
+    if importlib.util.find_spec('lxml') is not None:
+        return 'lxml'
+    return 'html.parser'
+
+
+# parser backend used by parse_soup
+PARSER = resolve_parser(HTML_PARSER)
+
+
+def parse_soup(html, strainer=None, parser=PARSER, restricted=RESTRICTED_PARSE):
+    """
+    Parse html into soup
+
+    Parameters:
+    html (bytes): html of the page
+    strainer (obj): SoupStrainer of the parts to parse, the whole page is parsed if None
+    parser (str): parser backend, 'lxml' or 'html.parser'
+    restricted (bool): whether to parse only the parts matched by strainer
+    """
+    return BeautifulSoup(html, parser, parse_only=strainer if restricted else None)
+
+
+def get_page(url):
+    """
+    Get the html of the page by url, fetched by the shared HttpClient.
+    Return None if the page cannot be opened.
     """
     try:
-        html = urlopen(url)
+        return get_http_client().get(url)
     except HTTPError as err:
         print('Error: cannot open url')
         print('Error code: ', err.code)
@@ -30,114 +102,687 @@ def get_soup(url):
         print('Error: cannot open url')
         print('Reason: ', err.reason)
         return None
-    return BeautifulSoup(html, 'html.parser')
 
 
-def scrape_many(url, target_number, scrape_type):
+def get_soup(url, strainer=None):
+    """
+    Get the soup by url
+
+    Parameters:
+    url (str): url of the page
+    strainer (obj): SoupStrainer of the parts to parse, the whole page is parsed if None
+    """
+    html = get_page(url)
+    if html is None:
+        return None
+    return parse_soup(html, strainer)
+
+
+def scrape_many(url, target_number, scrape_type, concurrency=CRAWL_CONCURRENCY, mongo_db=None,
+                cache_only=HTTP_CACHE_ONLY, resume=False, force_refresh=FORCE_REFRESH,
+                known_recipes=None, parse_processes=PARSE_PROCESSES):
     """
     Used to scrape many food recipe pages.
-    First get all page links with list of food recipe links on them,
-    then call scrape_all_rows method to scrape each page
+    Call scrape_listing_pages, with pages replayed from the cache only if cache_only is True.
+    Progress is checkpointed in a CrawlFrontier journal as the crawl goes.
+    Recipes already stored are skipped before their page is fetched, unless force_refresh is True.
+    Return the number of recipes stored by this call.
+
+    Parameters:
+    url (str): url of the first page with list of food recipe links
+    target_number (int): number of food recipes to scrape
+    scrape_type (str): key of CLASS_NAME_DICT, 'default' or 'meal_type'
+    concurrency (int): max number of pages fetched at the same time
+    mongo_db (obj): Database instance to store recipes, a new one is created if None
+    cache_only (bool): whether to replay a previous crawl from the cache with no network traffic
+    resume (bool): whether to continue an interrupted crawl of url where it stopped
+    force_refresh (bool): whether to scrape again the recipes already stored
+    known_recipes (obj): RecipeIdFilter shared with other crawls, loaded from the database if None
+    parse_processes (int): number of processes parsing pages if concurrent, 0 to parse in threads
+    """
+    frontier = open_frontier(url, target_number, scrape_type, resume)
+    stored_before = frontier.stored
+    with cache_only_mode(cache_only):
+        scrape_listing_pages(frontier, concurrency, mongo_db, force_refresh, known_recipes,
+                             parse_processes)
+    return frontier.stored - stored_before
+
+
+def scrape_all_meal_types(target_number, processes=CRAWL_PROCESSES, concurrency=CRAWL_CONCURRENCY,
+                          cache_only=HTTP_CACHE_ONLY, force_refresh=FORCE_REFRESH):
+    """
+    Scrape target_number food recipes of every meal type, one meal type per worker process.
+    The workers share the ids of recipes stored or claimed through a Manager dict,
+    so a recipe of several meal types is fetched once.
+    Report the throughput of each meal type and of the whole crawl.
+    Return the number of recipes stored by meal type.
+
+    Parameters:
+    target_number (int): number of food recipes to scrape for each meal type
+    processes (int): number of worker processes
+    concurrency (int): max number of pages fetched at the same time in each process
+    cache_only (bool): whether to replay a previous crawl from the cache with no network traffic
+    force_refresh (bool): whether to scrape again the recipes already stored
+    """
+    meal_types = MEAL_TYPES[1:]
+    start = time.perf_counter()
+    with multiprocessing.Manager() as manager:
+        # ids loaded once here instead of once per worker
+        recipe_ids = [] if force_refresh else Database().get_recipe_ids(ALL_RECIPES)
+        shared_ids = manager.dict({str(recipe_id): 'stored' for recipe_id in recipe_ids})
+        with ProcessPoolExecutor(max_workers=processes, initializer=init_crawl_process,
+                                 initargs=(processes,)) as executor:
+            futures = [executor.submit(scrape_meal_type, meal_type, target_number, concurrency,
+                                       shared_ids, cache_only, force_refresh)
+                       for meal_type in meal_types]
+            results = [future.result() for future in futures]
+    elapsed = time.perf_counter() - start
+
+    print('-' * DASH_NUMBER, 'Throughput by meal type', '-' * DASH_NUMBER)
+    for meal_type, stored, seconds in results:
+        print(f'{meal_type}: {stored} recipes in {seconds:.1f}s, '
+              f'{stored / seconds if seconds else 0:.2f} recipes/s')
+    total_stored = sum(stored for _, stored, _ in results)
+    print(f'all meal types: {total_stored} recipes in {elapsed:.1f}s, '
+          f'{total_stored / elapsed if elapsed else 0:.2f} recipes/s')
+    return {meal_type: stored for meal_type, stored, _ in results}
+
+
+def init_crawl_process(processes):
+    """
+    Initializer of the worker processes of scrape_all_meal_types.
+    The processes crawl the same host, so each one gets its share of the request rate.
+    """
+    configure_http_client(cache=make_default_cache(), cache_only=HTTP_CACHE_ONLY,
+                          rate_limiter=make_default_rate_limiter(1 / processes),
+                          max_retries=HTTP_MAX_RETRIES)
+
+
+def scrape_meal_type(meal_type, target_number, concurrency, shared_ids, cache_only, force_refresh):
+    """
+    Worker of scrape_all_meal_types: scrape target_number food recipes of meal_type.
+    Return the meal type, the number of recipes stored and the seconds taken.
+    """
+    start = time.perf_counter()
+    # the worker processes already use the cores, pages are parsed in threads of each worker
+    stored = scrape_many(TYPE_URL_PRE + meal_type + TYPE_URL_AFT, target_number, 'meal_type',
+                         concurrency, cache_only=cache_only, force_refresh=force_refresh,
+                         known_recipes=RecipeIdFilter(shared_ids=shared_ids), parse_processes=0)
+    return meal_type, stored, time.perf_counter() - start
+
+
+def open_frontier(url, target_number, scrape_type, resume):
+    """
+    Get the frontier of the interrupted crawl of url if resume is True and there is one.
+    Otherwise start a new frontier.
+    """
+    frontier = CrawlFrontier.for_crawl(url, scrape_type)
+    if resume:
+        interrupted = CrawlFrontier.load(frontier.path)
+        if interrupted:
+            print(f'Resume crawl of {url}: '
+                  f'{interrupted.stored}/{interrupted.target_number} recipes already stored')
+            return interrupted
+        print('No interrupted crawl to resume, start a new crawl')
+    frontier.start(url, scrape_type, target_number)
+    return frontier
+
+
+def resume_interrupted_scrapes(concurrency=CRAWL_CONCURRENCY):
+    """
+    Resume every interrupted scrape_many crawl found in FRONTIER_DIR
+    """
+    frontiers = CrawlFrontier.load_interrupted()
+    if not frontiers:
+        print('No interrupted crawl to resume')
+    for frontier in frontiers:
+        scrape_many(frontier.url, frontier.target_number, frontier.scrape_type, concurrency,
+                    resume=True)
+
+
+def scrape_many_distributed(url, target_number, scrape_type, crawl_id=None, node_id=None,
+                            concurrency=CRAWL_CONCURRENCY, mongo_db=None,
+                            cache_only=HTTP_CACHE_ONLY, force_refresh=FORCE_REFRESH):
+    """
+    Join the crawl of url shared by any number of scraper nodes through a CrawlWorkQueue.
+    The start page, listing pages and food recipe urls are leased from the queue in mongoDB,
+    so no page is fetched by two nodes, and a node that dies leaves its tasks to the others
+    once their lease expires. The nodes together store target_number recipes.
+    Report the throughput of every node of the crawl.
+    Return the number of recipes stored by this node.
+
+    Parameters:
+    url (str): url of the first page with list of food recipe links
+    target_number (int): number of food recipes to scrape, the one of the first node wins
+    scrape_type (str): key of CLASS_NAME_DICT, 'default' or 'meal_type'
+    crawl_id (str): id of the crawl shared by the nodes, scrape_type and url if None
+    node_id (str): id of this node in the lease counters, host name and process id if None
+    concurrency (int): number of tasks run at the same time by this node
+    mongo_db (obj): Database instance with the queue tables, a new one is created if None
+    cache_only (bool): whether to replay a previous crawl from the cache with no network traffic
+    force_refresh (bool): whether to scrape again the recipes already stored
+    """
+    if mongo_db is None:
+        mongo_db = Database()
+    work_queue = CrawlWorkQueue(mongo_db, crawl_id or f'{scrape_type} {url}', node_id)
+    crawl = work_queue.open(url, scrape_type, target_number)
+    known_recipes = None if force_refresh else RecipeIdFilter.from_database(mongo_db)
+    with cache_only_mode(cache_only), \
+            ThreadPoolExecutor(max_workers=concurrency,
+                               initializer=inherit_cache_only_mode()) as executor:
+        futures = [executor.submit(run_work_queue, work_queue, crawl['scrape type'], mongo_db,
+                                   known_recipes)
+                   for _ in range(concurrency)]
+        stored = sum(future.result() for future in futures)
+
+    print('-' * DASH_NUMBER, 'Throughput by node', '-' * DASH_NUMBER)
+    for node in work_queue.node_stats():
+        print(f'{node["node"]}: {node["stored"]} recipes stored, {node["leased"]} leases, '
+              f'{node["failed"]} failed, {node["recipes per second"]:.2f} recipes/s')
+    return stored
+
+
+def run_work_queue(work_queue, scrape_type, mongo_db, known_recipes):
+    """
+    Worker of scrape_many_distributed: lease and run tasks until the target is reached
+    or no task is left on any node. Recipes are leased before listing pages,
+    so no more listing pages are fetched than needed.
+    Return the number of recipes stored by this worker.
+
+    Parameters:
+    work_queue (obj): CrawlWorkQueue of the crawl
+    scrape_type (str): key of CLASS_NAME_DICT, 'default' or 'meal_type'
+    mongo_db (obj): Database instance to store recipes
+    known_recipes (obj): RecipeIdFilter of stored recipes to skip, None to scrape all
     """
-    soup = get_soup(url)
+    count_success_scrape = 0
+    while not work_queue.is_target_reached():
+        task = work_queue.lease(RECIPE) or work_queue.lease(LISTING) or work_queue.lease(START)
+        if task is None:
+            if work_queue.is_drained():
+                break
+            # tasks leased by other nodes may still add recipes or expire
+            time.sleep(WORK_POLL_INTERVAL)
+            continue
+
+        if task['kind'] != RECIPE:
+            task_urls = get_task_urls(task, scrape_type)
+            if task_urls is None:
+                work_queue.fail(task)
+                continue
+            if task['kind'] == START:
+                work_queue.enqueue(task_urls, LISTING)
+            else:
+                work_queue.enqueue([food_recipe_url for food_recipe_url in task_urls
+                                    if known_recipes is None
+                                    or not known_recipes.is_known_url(food_recipe_url)],
+                                   RECIPE)
+            work_queue.complete(task)
+            continue
+
+        if not work_queue.reserve_recipe(task):
+            # the recipes stored and in flight on all nodes reach the target
+            work_queue.release(task)
+            time.sleep(WORK_POLL_INTERVAL)
+            continue
+        print('-' * DASH_NUMBER, f'Scraping food recipe {task["url"]}', '-' * DASH_NUMBER)
+        is_stored = False
+        try:
+            food_recipe_dict = scrape_food_recipe_page(task['url'])
+            if food_recipe_dict:
+                # store into database
+                store_recipe(food_recipe_dict, mongo_db, task['url'])
+                is_stored = True
+        finally:
+            if not is_stored:
+                # the reservation is freed even if fetching or storing raises
+                work_queue.unreserve_recipe(task)
+        if not is_stored:
+            # error in finding all attributes
+            print('Error in scraping food recipe attributes')
+            work_queue.fail(task)
+            continue
+        if known_recipes is not None:
+            known_recipes.add(food_recipe_dict['id'])
+        # the recipe is counted by the node holding the lease of its task only
+        if work_queue.complete(task, stored=True):
+            count_success_scrape += 1
+    return count_success_scrape
+
+
+def get_task_urls(task, scrape_type):
+    """
+    Fetch the page of a start or listing task of the work queue.
+    Return the listing page urls of a start page, or the food recipe urls of a listing page,
+    None if the page cannot be scraped.
+    """
+    soup = get_soup(task['url'], LISTING_PAGE_STRAINER)
     if soup is None:
-        return
+        return None
+    if task['kind'] == START:
+        search_results_paging = soup.find('div', class_='searchResultsPaging')
+        rel_links_holder = search_results_paging.find_all('a') if search_results_paging else None
+        if not rel_links_holder:
+            print('Error: search page links not found')
+            return None
+        return [BASE_URL + rel_url_holder['href'] for rel_url_holder in rel_links_holder]
+
+    table = soup.find('table', class_=CLASS_NAME_DICT[scrape_type]['table_class'])
+    if not table:
+        print('Error: table not found')
+        return None
+    rows = table.find_all('tr')
+    if not rows:
+        print('Error: rows not found')
+        return None
+    food_recipe_urls = []
+    for row in rows:
+        food_recipe_url = get_food_recipe_url(row, scrape_type)
+        if food_recipe_url:
+            food_recipe_urls.append(food_recipe_url)
+    return food_recipe_urls
 
-    search_results_paging = soup.find('div', class_='searchResultsPaging')
-    if not search_results_paging:
-        print('Error: search page links not found')
-        return
 
-    rel_links_holder = search_results_paging.find_all('a')
-    if not rel_links_holder:
-        print('Error: search page links not found')
-        return
+def scrape_listing_pages(frontier, concurrency, mongo_db, force_refresh=False,
+                         known_recipes=None, parse_processes=0):
+    """
+    First get all page links with list of food recipe links on them,
+    then call scrape_all_rows method to scrape each page.
+    If concurrency is more than 1, pages are fetched in parallel by scrape_many_concurrently.
+    Listing pages and recipes already done in the frontier are skipped,
+    so are recipes already stored in the database unless force_refresh is True.
+    A listing page that cannot be scraped is skipped, the crawl goes on with the next one.
+    The frontier is finished when the crawl is over,
+    it is kept for resume if the target is not reached and a listing page failed.
+    """
+    if not frontier.listing_urls:
+        soup = get_soup(frontier.url, LISTING_PAGE_STRAINER)
+        if soup is None:
+            return
+
+        search_results_paging = soup.find('div', class_='searchResultsPaging')
+        if not search_results_paging:
+            print('Error: search page links not found')
+            return
+
+        rel_links_holder = search_results_paging.find_all('a')
+        if not rel_links_holder:
+            print('Error: search page links not found')
+            return
+        frontier.add_listing_urls([BASE_URL + rel_url_holder['href']
+                                   for rel_url_holder in rel_links_holder])
 
     # init database
-    mongo_db = Database()
-    # init number of recipes left to scrape
-    number_left = target_number
+    if mongo_db is None:
+        mongo_db = Database()
+    # ids of recipes stored, loaded once so known recipes are skipped with no fetch or query
+    if known_recipes is None and not force_refresh:
+        known_recipes = RecipeIdFilter.from_database(mongo_db)
+    # recipes are written in batches, the writer is closed before the frontier is finished
+    with BulkRecipeWriter(mongo_db) as writer:
+        if concurrency > 1:
+            scrape_many_concurrently(frontier, concurrency, writer, known_recipes, parse_processes)
+        else:
+            scrape_listing_pages_sequentially(frontier, writer, known_recipes)
+    failed_listing_urls = [listing_url for listing_url in frontier.listing_urls
+                           if not frontier.is_listing_done(listing_url)]
+    if frontier.stored < frontier.target_number and failed_listing_urls:
+        print(f'Error: {len(failed_listing_urls)} search pages could not be scraped, '
+              f'resume the crawl to retry them')
+        return
+    frontier.finish()
+
+
+def scrape_listing_pages_sequentially(frontier, writer, known_recipes):
+    """
+    Scrape the listing pages of frontier one by one, then the recipes on each of them
+    """
+    target_number = frontier.target_number
+    scrape_type = frontier.scrape_type
+    # init number of recipes left to scrape, recipes found before an interruption go first
+    number_left = target_number - frontier.stored
+    number_left -= scrape_recipe_urls(frontier.pending_recipe_urls(), number_left, target_number,
+                                      writer, frontier, known_recipes)
     # for every link to page that contains list of recipe links,
     # open the link and get the list of recipe links, then scrape
-    for current_rel_url_holder in rel_links_holder:
+    for current_url in frontier.listing_urls:
         if number_left <= 0:
             break
+        if frontier.is_listing_done(current_url):
+            continue
 
-        current_url = BASE_URL + current_rel_url_holder['href']
-        soup = get_soup(current_url)
+        soup = get_soup(current_url, LISTING_PAGE_STRAINER)
         if soup is None:
-            return
+            continue
 
         table = soup.find('table', class_=CLASS_NAME_DICT[scrape_type]['table_class'])
         if not table:
             print('Error: table not found')
-            return
+            continue
 
         rows = table.find_all('tr')
         if not rows:
             print('Error: rows not found')
-            return
+            continue
         # scrape all rows of recipe links
         count_success_scrape = scrape_all_rows(rows, number_left, target_number, scrape_type,
-                                               mongo_db)
+                                               writer, frontier, current_url, known_recipes)
         number_left -= count_success_scrape
 
 
-def scrape_all_rows(rows, number_left, target_number, scrape_type, mongo_db):
+def scrape_all_rows(rows, number_left, target_number, scrape_type, writer, frontier=None,
+                    listing_url=None, known_recipes=None):
     """
     For each row of food recipe link on current page until target_number is reached,
     call scrape_food_recipe_page method to scrape all attributes
+
+    Parameters:
+    rows (list): tr tags of the list table
+    number_left (int): number of food recipes left to scrape
+    target_number (int): number of food recipes to scrape
+    scrape_type (str): key of CLASS_NAME_DICT, 'default' or 'meal_type'
+    writer (obj): BulkRecipeWriter to store recipes
+    frontier (obj): CrawlFrontier to record progress in, not recorded if None
+    listing_url (str): url of the page of rows, recorded as done in frontier
+    known_recipes (obj): RecipeIdFilter of stored recipes to skip, None to scrape all
+    """
+    food_recipe_urls = []
+    for row in rows:
+        food_recipe_url = get_food_recipe_url(row, scrape_type)
+        if food_recipe_url:
+            food_recipe_urls.append(food_recipe_url)
+    if frontier and listing_url:
+        frontier.complete_listing(listing_url, food_recipe_urls)
+    return scrape_recipe_urls(food_recipe_urls, number_left, target_number, writer, frontier,
+                              known_recipes)
+
+
+def scrape_recipe_urls(food_recipe_urls, number_left, target_number, writer, frontier=None,
+                       known_recipes=None):
+    """
+    Scrape and store food recipes one by one until number_left recipes are stored.
+    Return the number of recipes stored.
+
+    Parameters:
+    food_recipe_urls (list): urls of food recipe pages
+    number_left (int): number of food recipes left to scrape
+    target_number (int): number of food recipes to scrape
+    writer (obj): BulkRecipeWriter to store recipes
+    frontier (obj): CrawlFrontier to record progress in, not recorded if None
+    known_recipes (obj): RecipeIdFilter of stored recipes to skip, None to scrape all
     """
-    row_idx = 0
     count_success_scrape = 0
-    # for every row in the page, find the link to the recipe page, then scrape
-    for i in range(target_number - number_left, target_number):
-        if row_idx >= len(rows):
-            # no more rows of food recipe in current page
+    for food_recipe_url in food_recipe_urls:
+        if count_success_scrape >= number_left:
             break
+        if frontier and frontier.is_recipe_done(food_recipe_url):
+            continue
+        if known_recipes is not None and not known_recipes.claim_url(food_recipe_url):
+            print(f'Skip stored food recipe {food_recipe_url}')
+            continue
+        print('-' * DASH_NUMBER,
+              f'Scraping food recipe {target_number - number_left + count_success_scrape + 1}'
+              f'/{target_number}', '-' * DASH_NUMBER)
+        food_recipe_dict = scrape_food_recipe_page(food_recipe_url)
+        if not food_recipe_dict:
+            # error in finding all attributes
+            print('Error in scraping food recipe attributes')
+            if known_recipes is not None:
+                known_recipes.release(food_recipe_url)
+            continue
+        # store into database, the recipe is done in frontier once written
+        writer.add(food_recipe_dict, food_recipe_url,
+                   functools.partial(frontier.complete_recipe, food_recipe_url,
+                                     food_recipe_dict['id']) if frontier else None)
+        count_success_scrape += 1
+        if known_recipes is not None:
+            known_recipes.add(food_recipe_dict['id'])
+    return count_success_scrape
 
-        print('-' * DASH_NUMBER, f'Scraping food recipe {i + 1}/{target_number}', '-' * DASH_NUMBER)
 
-        while row_idx < len(rows):
-            rel_link = rows[row_idx].find('td', class_=CLASS_NAME_DICT[scrape_type]['td_class'])\
-                .find('a')
-            if not rel_link:
-                # page link not found error
-                print('Error: food recipe link not found')
-                row_idx += 1
+def scrape_many_concurrently(frontier, concurrency, writer, known_recipes=None,
+                             parse_processes=0):
+    """
+    Scrape food recipes of the listing pages in frontier through a staged pipeline:
+    concurrency fetch workers, parse workers and STORE_WORKERS store workers,
+    connected by queues of PIPELINE_QUEUE_SIZE.
+    Pages are parsed by a pool of parse_processes processes, each fed by one parse worker,
+    so parsing is not held to one core by the GIL. Only the page bytes and the recipe dict
+    cross processes, which are started by PARSER_START_METHOD, never forked.
+    With parse_processes 0, PARSE_WORKERS threads parse in this process.
+    No more recipes are in the pipeline than recipes still needed,
+    so exactly the target number of recipes are stored if enough are found.
+
+    Parameters:
+    frontier (obj): CrawlFrontier of the crawl, progress is recorded in it
+    concurrency (int): max number of pages fetched at the same time
+    writer (obj): BulkRecipeWriter to store recipes
+    known_recipes (obj): RecipeIdFilter of stored recipes to skip, None to scrape all
+    parse_processes (int): number of processes parsing pages, 0 to parse in threads
+    """
+    target_number = frontier.target_number
+    progress = {'in flight': 0, 'stored': frontier.stored}
+    condition = threading.Condition()
+    parser_pool = ProcessPoolExecutor(max_workers=parse_processes,
+                                      mp_context=multiprocessing.get_context(PARSER_START_METHOD)) \
+        if parse_processes else None
+
+    def fetch(food_recipe_url):
+        html = get_page(food_recipe_url)
+        return None if html is None else (food_recipe_url, html)
+
+    def parse(page):
+        food_recipe_url, html = page
+        if parser_pool:
+            food_recipe_dict = parser_pool.submit(parse_recipe_page, food_recipe_url, html).result()
+        else:
+            food_recipe_dict = parse_recipe_page(food_recipe_url, html)
+        return (food_recipe_url, food_recipe_dict) if food_recipe_dict else None
+
+    def store(scraped):
+        food_recipe_url, food_recipe_dict = scraped
+        # the recipe is done in frontier once written
+        writer.add(food_recipe_dict, food_recipe_url,
+                   functools.partial(frontier.complete_recipe, food_recipe_url,
+                                     food_recipe_dict['id']))
+        return scraped
+
+    def on_result(scraped):
+        food_recipe_dict = scraped[1]
+        if known_recipes is not None:
+            known_recipes.add(food_recipe_dict['id'])
+        with condition:
+            progress['in flight'] -= 1
+            progress['stored'] += 1
+            stored = progress['stored']
+            condition.notify_all()
+        depths = ', '.join(f'{name} {depth}' for name, depth in pipeline.queue_depths().items())
+        print('-' * DASH_NUMBER, f'Scraped food recipe {stored}/{target_number}',
+              f'(queued: {depths})', '-' * DASH_NUMBER)
+
+    def on_drop(stage_name, item):
+        if stage_name == 'parse':
+            # error in finding all attributes
+            print('Error in scraping food recipe attributes')
+        if known_recipes is not None:
+            # the fetch stage gets the url, the next stages a pair starting with it
+            known_recipes.release(item if stage_name == 'fetch' else item[0])
+        with condition:
+            progress['in flight'] -= 1
+            condition.notify_all()
+
+    pipeline = Pipeline([('fetch', fetch, concurrency),
+                         ('parse', parse, parse_processes or PARSE_WORKERS),
+                         ('store', store, STORE_WORKERS)],
+                        PIPELINE_QUEUE_SIZE, on_result, on_drop,
+                        initializer=inherit_cache_only_mode()).start()
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency,
+                                initializer=inherit_cache_only_mode()) as executor:
+            for food_recipe_url in iter_food_recipe_urls(frontier, concurrency, executor,
+                                                         known_recipes):
+                with condition:
+                    # wait until a recipe in flight fails or the target can still take one more
+                    while progress['in flight'] > 0 and \
+                            progress['in flight'] >= target_number - progress['stored']:
+                        condition.wait()
+                    if progress['stored'] >= target_number:
+                        if known_recipes is not None:
+                            known_recipes.release(food_recipe_url)
+                        break
+                    progress['in flight'] += 1
+                # blocks while the fetch queue is full
+                pipeline.put(food_recipe_url)
+        pipeline.close()
+    finally:
+        if parser_pool:
+            parser_pool.shutdown()
+    for name, stage_stats in pipeline.stats().items():
+        print(f'{name} stage: {stage_stats["processed"]} processed, '
+              f'max {stage_stats["max queued"]} queued')
+    return progress['stored']
+
+
+def iter_food_recipe_urls(frontier, concurrency, executor, known_recipes=None):
+    """
+    Generate food recipe urls not done in frontier nor known as stored, in page order.
+    Recipes found before an interruption go first,
+    then listing pages not done are fetched concurrency at a time by executor.
+    A listing page that cannot be scraped is skipped, as the sequential scrape does.
+
+    Parameters:
+    frontier (obj): CrawlFrontier of the crawl, fetched listing pages are recorded in it
+    concurrency (int): number of listing pages fetched at the same time
+    executor (obj): ThreadPoolExecutor used to fetch the pages
+    known_recipes (obj): RecipeIdFilter of stored recipes to skip, None to scrape all
+    """
+    for food_recipe_url in frontier.pending_recipe_urls():
+        if known_recipes is None or known_recipes.claim_url(food_recipe_url):
+            yield food_recipe_url
+    scrape_type = frontier.scrape_type
+    listing_urls = [listing_url for listing_url in frontier.listing_urls
+                    if not frontier.is_listing_done(listing_url)]
+    for start in range(0, len(listing_urls), concurrency):
+        batch = listing_urls[start:start + concurrency]
+        for listing_url, soup in zip(batch, executor.map(get_soup, batch,
+                                                         [LISTING_PAGE_STRAINER] * len(batch))):
+            if soup is None:
                 continue
-
-            food_recipe_url = BASE_URL + rel_link['href']
-            food_recipe_dict = scrape_food_recipe_page(food_recipe_url)
-            if not food_recipe_dict:
-                # error in finding all attributes
-                print('Error in scraping food recipe attributes')
-                row_idx += 1
+            table = soup.find('table', class_=CLASS_NAME_DICT[scrape_type]['table_class'])
+            if not table:
+                print('Error: table not found')
                 continue
-            # successfully get the food_recipe_dict
-            count_success_scrape += 1
-            break
-        # store into database
-        if mongo_db.is_recipe_exists_in_tb(food_recipe_dict, ALL_RECIPES):
-            # exists, then update
-            mongo_db.update_on_tb(food_recipe_dict, ALL_RECIPES)
-        else:
-            # not exist, then insert
-            mongo_db.insert_into_tb(food_recipe_dict, ALL_RECIPES)
-        row_idx += 1
+            rows = table.find_all('tr')
+            if not rows:
+                print('Error: rows not found')
+                continue
+            food_recipe_urls = []
+            for row in rows:
+                food_recipe_url = get_food_recipe_url(row, scrape_type)
+                if food_recipe_url:
+                    food_recipe_urls.append(food_recipe_url)
+            frontier.complete_listing(listing_url, food_recipe_urls)
+            for food_recipe_url in food_recipe_urls:
+                if frontier.is_recipe_done(food_recipe_url):
+                    continue
+                if known_recipes is not None and not known_recipes.claim_url(food_recipe_url):
+                    print(f'Skip stored food recipe {food_recipe_url}')
+                    continue
+                yield food_recipe_url
 
-    return count_success_scrape
 
+def parse_recipe_page(food_recipe_url, html):
+    """
+    Parse the html of food recipe page into the recipe dict, None if it cannot be scraped.
+    Run by the parser processes of scrape_many_concurrently.
+    """
+    return scrape_food_recipe_page(food_recipe_url, parse_soup(html, RECIPE_PAGE_STRAINER))
+
+
+def get_food_recipe_url(row, scrape_type):
+    """
+    Get the url of food recipe page by a row of the list table.
+    Return None if the link is not found.
+
+    Parameters:
+    row (obj): tr tag of the list table
+    scrape_type (str): key of CLASS_NAME_DICT, 'default' or 'meal_type'
+    """
+    td = row.find('td', class_=CLASS_NAME_DICT[scrape_type]['td_class'])
+    rel_link = td.find('a') if td else None
+    if not rel_link:
+        # page link not found error
+        print('Error: food recipe link not found')
+        return None
+    return BASE_URL + rel_link['href']
+
+
+def store_recipe(food_recipe_dict, mongo_db, url):
+    """
+    Store the food recipe into all recipes table.
+    Update if recipe exists and its content changed, otherwise insert.
+    Return INSERTED, UPDATED or UNCHANGED.
+
+    Parameters:
+    food_recipe_dict (dict): dict of recipe scraped
+    mongo_db (obj): Database instance
+    url (str): url of food recipe page, kept to refresh the recipe
+    """
+    return mongo_db.store_scraped_recipe(food_recipe_dict, url)
+
+
+def refresh_stale_recipes(number, concurrency=CRAWL_CONCURRENCY, mongo_db=None,
+                          cache_only=HTTP_CACHE_ONLY):
+    """
+    Scrape again the number recipes scraped longest ago.
+    Only recipes whose page changed are written to the database.
+    Return the number of recipes of each store result.
+
+    Parameters:
+    number (int): number of recipes to refresh
+    concurrency (int): max number of pages fetched at the same time
+    mongo_db (obj): Database instance, a new one is created if None
+    cache_only (bool): whether to replay the pages from the cache with no network traffic
+    """
+    if mongo_db is None:
+        mongo_db = Database()
+    food_recipe_urls = mongo_db.get_stale_recipe_urls(number)
+
+    def refresh(food_recipe_url):
+        food_recipe_dict = scrape_food_recipe_page(food_recipe_url)
+        if not food_recipe_dict:
+            # error in finding all attributes
+            print('Error in scraping food recipe attributes')
+            return None
+        return store_recipe(food_recipe_dict, mongo_db, food_recipe_url)
+
+    results = {INSERTED: 0, UPDATED: 0, UNCHANGED: 0}
+    with cache_only_mode(cache_only), \
+            ThreadPoolExecutor(max_workers=concurrency,
+                               initializer=inherit_cache_only_mode()) as executor:
+        for result in executor.map(refresh, food_recipe_urls):
+            if result:
+                results[result] += 1
+    print('-' * DASH_NUMBER,
+          f'Refreshed {len(food_recipe_urls)} food recipes: {results[UPDATED]} changed, '
+          f'{results[UNCHANGED]} unchanged', '-' * DASH_NUMBER)
+    return results
 
-def scrape_one(url):
+
+def scrape_one(url, cache_only=HTTP_CACHE_ONLY):
     """
     Used to scrape one food recipe page
+
+    Parameters:
+    url (str): url of food recipe page
+    cache_only (bool): whether to replay the page from the cache with no network traffic
     """
-    soup = get_starting_url_soup(url)
+    with cache_only_mode(cache_only):
+        soup = get_starting_url_soup(url)
+        food_recipe_dict = scrape_food_recipe_page(url, soup) if soup else None
     if soup is None:
         print('Error: starting url is not a valid food recipe page')
         return
-    food_recipe_dict = scrape_food_recipe_page(url)
     if not food_recipe_dict:
         # error in finding all attributes
         print('Error in scraping food recipe attributes')
@@ -145,12 +790,8 @@ def scrape_one(url):
     # init database
     mongo_db = Database()
     # store into database
-    if mongo_db.is_recipe_exists_in_tb(food_recipe_dict, ALL_RECIPES):
-        # exists, then update
-        mongo_db.update_on_tb(food_recipe_dict, ALL_RECIPES)
-    else:
-        # not exist, then insert
-        mongo_db.insert_into_tb(food_recipe_dict, ALL_RECIPES)
+    with BulkRecipeWriter(mongo_db) as writer:
+        writer.add(food_recipe_dict, url)
 
 
 def get_starting_url_soup(url):
@@ -159,11 +800,11 @@ def get_starting_url_soup(url):
     If not, return None.
     Otherwise, return the soup.
     """
-    if url[:34] != 'https://www.fatsecret.com/recipes/':
+    if not url.startswith(BASE_URL + '/recipes/'):
         return None
     if url.split('/')[-1] != 'Default.aspx':
         return None
-    soup = get_soup(url)
+    soup = get_soup(url, RECIPE_PAGE_STRAINER)
     if not soup:
         return None
     table = soup.find('table', class_='generic')
@@ -172,12 +813,17 @@ def get_starting_url_soup(url):
     return soup
 
 
-def scrape_food_recipe_page(url):
+def scrape_food_recipe_page(url, soup=None):
     """
-    Scrape food recipes attributes
+    Scrape food recipes attributes.
+    Return None if the page cannot be scraped or id is not found.
+
+    Parameters:
+    url (str): url of food recipe page
+    soup (obj): soup of the page if already fetched, the page is fetched if None
     """
-    food_recipe_dict = {}
-    soup = get_soup(url)
+    if soup is None:
+        soup = get_soup(url, RECIPE_PAGE_STRAINER)
     if soup is None:
         return None
 
@@ -186,62 +832,8 @@ def scrape_food_recipe_page(url):
         print('Error: table not found')
         return None
 
-    # get id
-    recipe_id = get_id(table)
-    if recipe_id:
-        food_recipe_dict['id'] = recipe_id
-    else:
-        # if no id, then stop scraping current recipe
-        return None
-
-    # get name
-    name = get_name(table)
-    if name:
-        food_recipe_dict['name'] = name
-
-    # get description
-    description = get_description(table)
-    if description:
-        food_recipe_dict['description'] = description
-
-    # get image url
-    image_url = get_image_url(table)
-    if image_url:
-        food_recipe_dict['image url'] = image_url
-
-    # get yields
-    yields = get_yields(table)
-    if yields:
-        food_recipe_dict['yields'] = yields
-
-    # get cook time and prep time
-    prep_time, cook_time = get_time(table)
-    if prep_time:
-        food_recipe_dict['prep time'] = prep_time
-    if cook_time:
-        food_recipe_dict['cook time'] = cook_time
-
-    # get meal types
-    meal_types = get_meal_type(table)
-    if meal_types:
-        food_recipe_dict['meal types'] = meal_types
-
-    # get ingredients
-    ingredients = get_ingredients(table)
-    if ingredients:
-        food_recipe_dict['ingredients'] = ingredients
-
-    # get instructions
-    instructions = get_instructions(table)
-    if instructions:
-        food_recipe_dict['instructions'] = instructions
-
-    # get popularity
-    popularity = get_popularity(table)
-    if popularity:
-        food_recipe_dict['popularity'] = popularity
-
-    return food_recipe_dict
+    # fill every attribute in one walk over the table
+    return RECIPE_EXTRACTOR.extract(table)
 
 
 def get_image_url(table):
@@ -267,7 +859,7 @@ def get_yields(table):
         if not yield_div:
             print('Error: yield not found')
         else:
-            return yield_div.text.strip().split(' ')[0]
+            return int_of(yield_div.text.strip().split(' ')[0])
     return None
 
 
@@ -286,46 +878,14 @@ def get_time(table):
         if not prep_time_div:
             print('Error: prep time not found')
         else:
-            prep_time = prep_time_div.text.strip()
-            if prep_time[0] == '"':
-                prep_time = prep_time[1:]
-            if prep_time[-1] == '"':
-                prep_time = prep_time[:-1]
-            # get time from str
-            res = prep_time.split(' ')
-            if len(res) == 2:
-                # get time from str format x mins OR x hr
-                prep_time_mins = int(res[0])
-                if res[1] == 'hr':
-                    prep_time_mins = prep_time_mins * 60
-            else:
-                # get time from str format x hr y mins
-                prep_time_mins = int(res[0]) * 60 + int(res[2])
-            # convert from int to str
-            prep_time_mins = str(prep_time_mins)
+            prep_time_mins = minutes_of(prep_time_div.text)
 
         # cook time
         cook_time_div = time_div.find('div', class_='cookTime')
         if not cook_time_div:
             print('Error: cook time not found')
         else:
-            cook_time = cook_time_div.text.strip()
-            if cook_time[0] == '"':
-                cook_time = cook_time[1:]
-            if cook_time[-1] == '"':
-                cook_time = cook_time[:-1]
-            # get time from str
-            res = cook_time.split(' ')
-            if len(res) == 2:
-                # get time from str format x mins OR x hr
-                cook_time_mins = int(res[0])
-                if res[1] == 'hr':
-                    cook_time_mins = cook_time_mins * 60
-            else:
-                # get time from str format x hr y mins
-                cook_time_mins = int(res[0]) * 60 + int(res[2])
-            # convert from int to str
-            cook_time_mins = str(cook_time_mins)
+            cook_time_mins = minutes_of(cook_time_div.text)
     return prep_time_mins, cook_time_mins
 
 
@@ -409,7 +969,7 @@ def get_popularity(table):
     if not popularity_div:
         print('Error: popularity not found')
         return None
-    return popularity_div.text.strip().split(' ')[0]
+    return int_of(popularity_div.text.strip().split(' ')[0])
 
 
 def get_id(table):
@@ -424,9 +984,5 @@ def get_id(table):
         if not id_holder:
             print('Error: id not found')
         else:
-            url = id_holder['href'].strip()
-            for i in range(len(url))[::-1]:
-                if not url[i].isnumeric():
-                    return url[i + 1:]
-            return url
+            return id_of(id_holder['href'])
     return None
@@ -0,0 +1,123 @@
+"""
+Module for the search by words of the text attributes of recipes.
+Text is split into lowercase words without accents, stop words are left out,
+and each word is reduced to its stem by removing English suffixes, so bake, baked and baking
+are one term. The terms of each text attribute are stored with the recipe in its terms field,
+the index of that field is the inverted index of the attribute: from a term to its recipes.
+Searched words match the terms they are a prefix of, and recipes are ranked by relevance_of.
+"""
+import bisect
+import re
+import unicodedata
+
+from scraper.constant import TEXT_ATTRIBUTES
+
+# weight of a searched word found in each text attribute, for relevance
+ATTRIBUTE_WEIGHTS = {'name': 4, 'ingredients': 2, 'description': 1, 'instructions': 1}
+STOP_WORDS = frozenset(['a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'in',
+                        'into', 'is', 'it', 'of', 'on', 'or', 'the', 'then', 'to', 'with'])
+WORD_PATTERN = re.compile(r'[a-z0-9]+')
+VOWEL_PATTERN = re.compile(r'[aeiouy]')
+# plural endings removed with the last two letters: dishes, boxes
+ES_ENDINGS = ('sses', 'shes', 'ches', 'xes', 'zes')
+# words shorter than this are kept as they are
+MIN_STEM_LENGTH = 3
+
+
+def terms_field_of(attribute):
+    """
+    Get the field storing the terms of a text attribute
+    """
+    return f'{attribute} terms'
+
+
+def words_of(text):
+    """
+    Get the lowercase words of text, accents removed
+    """
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return WORD_PATTERN.findall(text.lower())
+
+
+def stem(word):
+    """
+    Get the stem of a lowercase word by removing the suffixes of plurals, -ing, -ed and -e.
+    The stem is not a word, only the same for the forms of a word, e.g. bak for baking.
+    """
+    if len(word) <= MIN_STEM_LENGTH or word.isdigit():
+        return word
+    if word.endswith('ies') and len(word) > MIN_STEM_LENGTH + 1:
+        return word[:-3] + 'y'
+    if word.endswith(ES_ENDINGS):
+        word = word[:-2]
+    elif word.endswith('s') and not word.endswith(('ss', 'us', 'is')):
+        word = word[:-1]
+    for suffix in ('ing', 'ed'):
+        # the rest of a word with a suffix has a vowel: baking, but not string
+        rest = word[:-len(suffix)]
+        if word.endswith(suffix) and len(rest) >= MIN_STEM_LENGTH and VOWEL_PATTERN.search(rest):
+            word = rest
+            # chopped, chop
+            if word[-1] == word[-2] and word[-1] not in 'lsz':
+                word = word[:-1]
+            break
+    if word.endswith('e') and len(word) > MIN_STEM_LENGTH:
+        word = word[:-1]
+    return word
+
+
+def search_terms_of(text):
+    """
+    Get the terms of the words of text in order, each once, stop words left out
+    """
+    terms = []
+    for word in words_of(text):
+        term = stem(word)
+        if word not in STOP_WORDS and term not in terms:
+            terms.append(term)
+    return terms
+
+
+def terms_of(value):
+    """
+    Get the sorted terms of the value of a text attribute, a str or a list of str
+    """
+    texts = value if isinstance(value, list) else [value]
+    return sorted({term for text in texts if isinstance(text, str)
+                   for term in search_terms_of(text)})
+
+
+def terms_values_of(values):
+    """
+    Get the terms fields of the text attributes in values, to store with them
+    """
+    return {terms_field_of(attribute): terms_of(values[attribute])
+            for attribute in TEXT_ATTRIBUTES if attribute in values}
+
+
+def prefix_range_of(term):
+    """
+    Get the range of the terms that term is a prefix of, for a query operator
+    """
+    return {'$gte': term, '$lt': term[:-1] + chr(ord(term[-1]) + 1)}
+
+
+def relevance_of(document, searches):
+    """
+    Get the relevance of a document for searches by words.
+    A term equal to a term of an attribute counts twice the weight of the attribute,
+    a term prefix of a term counts the weight.
+
+    Parameters:
+    document (dict): recipe with its terms fields
+    searches (list): pairs of a text attribute and a term searched in it
+    """
+    relevance = 0
+    for attribute, term in searches:
+        document_terms = document.get(terms_field_of(attribute)) or []
+        index = bisect.bisect_left(document_terms, term)
+        if index < len(document_terms) and document_terms[index].startswith(term):
+            is_equal = document_terms[index] == term
+            relevance += ATTRIBUTE_WEIGHTS[attribute] * (2 if is_equal else 1)
+    return relevance
@@ -6,6 +6,8 @@ import json
 import re
 from bson.json_util import dumps
 
+from scraper.constant import RECIPE_PROJECTION
+
 
 def json_file_to_dict(json_file):
     """
@@ -44,11 +46,11 @@ def export_to_json_file(mongo_db):
         return
     dictionary = {'all recipes': [], 'favourites': []}
     # get recipes in all_recipes_tb
-    for recipe_info in mongo_db.all_recipes_tb.find({}, {'_id': 0}):
+    for recipe_info in mongo_db.all_recipes_tb.find({}, RECIPE_PROJECTION):
         recipe_info_dict = json.loads(dumps(recipe_info))
         dictionary['all recipes'].append(recipe_info_dict)
-    # get recipes in favourites_tb
-    for recipe_info in mongo_db.favourites_tb.find({}, {'_id': 0}):
+    # get recipes in favourites_tb, merged with the recipes they refer to
+    for recipe_info in mongo_db.find_favourites():
         recipe_info_dict = json.loads(dumps(recipe_info))
         dictionary['favourites'].append(recipe_info_dict)
     # write to json file
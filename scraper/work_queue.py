@@ -0,0 +1,240 @@
+"""
+Module for the work queue of a crawl shared by several scraper nodes through mongoDB.
+The start page, listing pages and food recipe urls of a crawl are tasks in crawl_queue_table.
+A node leases a task for a visibility timeout, so no other node fetches it meanwhile.
+A task not completed before its lease expires, e.g. its node died, is leased again by any node,
+and the node that lost the lease can no longer complete, fail or release it.
+Recipes are reserved on their leased task before they are fetched, and the recipes in flight
+are the reserved tasks with unexpired leases, so the nodes together store the target number
+of recipes and the reservation of a dead node is freed with its lease.
+A recipe is counted as stored only if its task is completed under its lease.
+Each node counts its leases in crawl_nodes_table, to report throughput per node.
+"""
+import os
+import socket
+import time
+
+import pymongo
+from pymongo.errors import BulkWriteError
+
+from scraper.constant import WORK_LEASE_TIMEOUT, WORK_MAX_ATTEMPTS
+
+# kinds of task
+START = 'start'
+LISTING = 'listing'
+RECIPE = 'recipe'
+# states of task
+PENDING = 'pending'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+
+
+def default_node_id():
+    """
+    Get the id of this scraper node, host name and process id
+    """
+    return f'{socket.gethostname()}-{os.getpid()}'
+
+
+class CrawlWorkQueue:
+    """
+    Tasks of one crawl leased by this node from the shared queue.
+    Safe to share between threads.
+    """
+
+    def __init__(self, mongo_db, crawl_id, node_id=None, lease_timeout=WORK_LEASE_TIMEOUT):
+        """
+        Parameters:
+        mongo_db (obj): Database instance with the queue tables
+        crawl_id (str): id of the crawl, the same on every node of the crawl
+        node_id (str): id of this node, host name and process id if None
+        lease_timeout (float): seconds a leased task is hidden from other nodes
+        """
+        self.queue_tb = mongo_db.crawl_queue_tb
+        self.crawls_tb = mongo_db.crawls_tb
+        self.nodes_tb = mongo_db.crawl_nodes_tb
+        self.crawl_id = crawl_id
+        self.node_id = node_id or default_node_id()
+        self.lease_timeout = lease_timeout
+
+    def open(self, url, scrape_type, target_number):
+        """
+        Create the crawl with its start task if no node did yet, and register this node.
+        Return the crawl document, whose settings win over the arguments if it exists.
+        """
+        self.queue_tb.create_index([('crawl', pymongo.ASCENDING), ('url', pymongo.ASCENDING)],
+                                   unique=True)
+        self.queue_tb.create_index([('crawl', pymongo.ASCENDING), ('kind', pymongo.ASCENDING),
+                                    ('state', pymongo.ASCENDING),
+                                    ('lease until', pymongo.ASCENDING)])
+        self.crawls_tb.update_one({'_id': self.crawl_id},
+                                  {'$setOnInsert': {'url': url, 'scrape type': scrape_type,
+                                                    'target number': target_number,
+                                                    'version': 0, 'stored': 0}},
+                                  upsert=True)
+        self.enqueue([url], START)
+        now = time.time()
+        self.nodes_tb.update_one({'crawl': self.crawl_id, 'node': self.node_id},
+                                 {'$setOnInsert': {'started at': now, 'leased': 0, 'done': 0,
+                                                   'failed': 0, 'stored': 0},
+                                  '$set': {'last seen': now}},
+                                 upsert=True)
+        return self.crawls_tb.find_one({'_id': self.crawl_id})
+
+    def enqueue(self, urls, kind):
+        """
+        Add tasks for urls, a url already in the crawl is not added again.
+        Return the number of tasks added.
+        """
+        if not urls:
+            return 0
+        requests = [pymongo.UpdateOne({'crawl': self.crawl_id, 'url': url},
+                                      {'$setOnInsert': {'kind': kind, 'state': PENDING,
+                                                        'lease until': 0, 'attempts': 0}},
+                                      upsert=True)
+                    for url in urls]
+        try:
+            result = self.queue_tb.bulk_write(requests, ordered=False)
+        except BulkWriteError as err:
+            # another node added the same url at the same time, its task is kept
+            return err.details['nUpserted']
+        return result.upserted_count
+
+    def lease(self, kind):
+        """
+        Lease the oldest task of kind that is pending or whose lease expired.
+        Return the task document, None if there is none.
+        """
+        now = time.time()
+        task = self.queue_tb.find_one_and_update(
+            {'crawl': self.crawl_id, 'kind': kind, 'state': {'$in': [PENDING, LEASED]},
+             'lease until': {'$lt': now}},
+            {'$set': {'state': LEASED, 'lease until': now + self.lease_timeout,
+                      'node': self.node_id, 'reserved': False},
+             '$inc': {'attempts': 1}},
+            sort=[('_id', pymongo.ASCENDING)],
+            return_document=pymongo.ReturnDocument.AFTER)
+        if task:
+            self._count({'leased': 1})
+        return task
+
+    def complete(self, task, stored=False):
+        """
+        Mark the task leased by this node as done, and count its recipe as stored by the crawl.
+        Return False if the lease was lost to another lease of the task, nothing is counted.
+        A done task keeps its reservation until its recipe is counted,
+        so the recipes stored and in flight do not drop meanwhile.
+
+        Parameters:
+        task (dict): task document returned by lease
+        stored (bool): whether a recipe is stored by the task
+        """
+        result = self.queue_tb.update_one(self._lease_filter(task), {'$set': {'state': DONE}})
+        if not result.matched_count:
+            return False
+        if stored:
+            self.crawls_tb.update_one({'_id': self.crawl_id},
+                                      {'$inc': {'stored': 1, 'version': 1}})
+            self.queue_tb.update_one(self._lease_filter(task, DONE), {'$set': {'reserved': False}})
+        self._count({'done': 1, 'stored': 1 if stored else 0})
+        return True
+
+    def fail(self, task):
+        """
+        Give the task back to the queue to be retried by any node,
+        or mark it failed after WORK_MAX_ATTEMPTS leases.
+        Return False if the lease was lost to another lease of the task, nothing is counted.
+        """
+        state = FAILED if task['attempts'] >= WORK_MAX_ATTEMPTS else PENDING
+        result = self.queue_tb.update_one(self._lease_filter(task),
+                                          {'$set': {'state': state, 'lease until': 0}})
+        if not result.matched_count:
+            return False
+        self._count({'failed': 1})
+        return True
+
+    def release(self, task):
+        """
+        Give the task back to the queue without counting an attempt
+        """
+        self.queue_tb.update_one(self._lease_filter(task),
+                                 {'$set': {'state': PENDING, 'lease until': 0},
+                                  '$inc': {'attempts': -1}})
+
+    def reserve_recipe(self, task):
+        """
+        Reserve the recipe of a task leased by this node before fetching it.
+        Return False if recipes stored and in flight already reach the target.
+        The reservation holds if the version of the crawl, incremented by every reservation
+        and recipe stored, did not change while the recipes were counted, else it is undone
+        and the recipes are counted again.
+        """
+        while True:
+            crawl = self.crawls_tb.find_one({'_id': self.crawl_id})
+            if crawl['stored'] + self._count_in_flight() >= crawl['target number']:
+                return False
+            if task['lease until'] <= time.time() or not self.queue_tb.update_one(
+                    self._lease_filter(task), {'$set': {'reserved': True}}).matched_count:
+                # the lease expired, the task belongs to the node leasing it again
+                return False
+            if self.crawls_tb.find_one_and_update(
+                    {'_id': self.crawl_id, 'version': crawl.get('version')},
+                    {'$inc': {'version': 1}}):
+                return True
+            self.unreserve_recipe(task)
+
+    def unreserve_recipe(self, task):
+        """
+        Free the reservation of a task leased by this node whose recipe could not be stored
+        """
+        self.queue_tb.update_one(self._lease_filter(task), {'$set': {'reserved': False}})
+
+    def is_target_reached(self):
+        """
+        Check whether the nodes stored the target number of recipes
+        """
+        crawl = self.crawls_tb.find_one({'_id': self.crawl_id})
+        return crawl['stored'] >= crawl['target number']
+
+    def is_drained(self):
+        """
+        Check whether no task is pending or leased, by any node
+        """
+        return self.queue_tb.count_documents(
+            {'crawl': self.crawl_id, 'state': {'$in': [PENDING, LEASED]}}, limit=1) == 0
+
+    def node_stats(self):
+        """
+        Get the lease counters of every node of the crawl with its recipes stored per second
+        """
+        stats = []
+        for node in self.nodes_tb.find({'crawl': self.crawl_id}, {'_id': 0}):
+            seconds = node['last seen'] - node['started at']
+            node['recipes per second'] = node['stored'] / seconds if seconds > 0 else 0.0
+            stats.append(node)
+        return stats
+
+    def _count_in_flight(self):
+        """
+        Count the recipes reserved by tasks whose lease has not expired,
+        done tasks included until complete counts their recipe as stored
+        """
+        return self.queue_tb.count_documents(
+            {'crawl': self.crawl_id, 'kind': RECIPE, 'state': {'$in': [LEASED, DONE]},
+             'reserved': True, 'lease until': {'$gt': time.time()}})
+
+    def _lease_filter(self, task, state=LEASED):
+        """
+        Get the filter of the task in state while it is still under the lease returned by lease.
+        A later lease of the task, even by this node, sets another lease until.
+        """
+        return {'_id': task['_id'], 'node': self.node_id, 'state': state,
+                'lease until': task['lease until']}
+
+    def _count(self, counters):
+        """
+        Add counters to the document of this node
+        """
+        self.nodes_tb.update_one({'crawl': self.crawl_id, 'node': self.node_id},
+                                 {'$inc': counters, '$set': {'last seen': time.time()}})
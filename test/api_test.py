@@ -109,6 +109,38 @@ class TestApi(unittest.TestCase):
 
         mongo_db.favourites_tb.delete_many({})
 
+    def test_get_by_query_pages(self):
+        """
+        Test GET api/search?q={query_string}&limit={limit}&cursor={cursor}
+        returns pages of results, each with the cursor of the next page
+        """
+        for recipe_id in ['7001', '7002', '7003']:
+            requests.post(BASE + 'api/food', json={'id': recipe_id, 'name': 'paged food'})
+
+        response = requests.get(BASE + 'api/search?q=all.name:paged&limit=2')
+        self.assertEqual(200, response.status_code)
+        page = response.json()
+        self.assertEqual({'results', 'has_more', 'cursor'}, set(page))
+        self.assertEqual(['7001', '7002'], [recipe['id'] for recipe in page['results']])
+        self.assertTrue(page['has_more'])
+
+        response = requests.get(BASE + 'api/search', params={'q': 'all.name:paged', 'limit': 2,
+                                                             'cursor': page['cursor']})
+        self.assertEqual(200, response.status_code)
+        page = response.json()
+        self.assertEqual(['7003'], [recipe['id'] for recipe in page['results']])
+        self.assertFalse(page['has_more'])
+        self.assertIsNone(page['cursor'])
+
+        response = requests.get(BASE + 'api/search?q=all.name:paged&cursor=not-a-cursor')
+        self.assertEqual(400, response.status_code)
+        self.assertEqual({'GET error': 'Limit, sort or cursor is not valid'}, response.json())
+
+        response = requests.get(BASE + 'api/search?q=all.name:paged&limit=0')
+        self.assertEqual(400, response.status_code)
+
+        mongo_db.all_recipes_tb.delete_many({})
+
     def test_put_to_all_recipe_by_id(self):
         """
         Test method put_to_all_recipe_by_id
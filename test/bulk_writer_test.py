@@ -0,0 +1,93 @@
+"""
+Test module for bulk_writer
+"""
+import time
+import unittest
+
+from pymongo.errors import AutoReconnect
+
+from scraper.bulk_writer import BulkRecipeWriter
+from scraper.database import INSERTED, UPDATED, UNCHANGED
+
+URL = 'https://www.fatsecret.com/recipes/1-cake/Default.aspx'
+
+
+class BatchRecorder:
+    """
+    Database keeping the batches written, the first failing batches raise AutoReconnect
+    """
+
+    def __init__(self, failing_batches=0):
+        self.batches = []
+        self.stored_ids = set()
+        self.failing_batches = failing_batches
+
+    def store_scraped_recipes(self, recipes):
+        """
+        Record a batch, return the result of each recipe
+        """
+        if self.failing_batches:
+            self.failing_batches -= 1
+            raise AutoReconnect('connection refused')
+        self.batches.append(recipes)
+        results = []
+        for recipe_dict, _ in recipes:
+            results.append(UPDATED if recipe_dict['id'] in self.stored_ids else INSERTED)
+            self.stored_ids.add(recipe_dict['id'])
+        return results
+
+
+class TestBulkRecipeWriter(unittest.TestCase):
+    """
+    Test class for bulk_writer.py
+    """
+
+    def test_flush_by_count(self):
+        """
+        Test that full batches are written, a recipe scraped twice once, and the rest on close
+        """
+        mongo_db = BatchRecorder()
+        written = []
+        with BulkRecipeWriter(mongo_db, batch_size=2, flush_interval=0) as writer:
+            self.assertFalse(writer.add({'name': 'Cake'}, URL))
+            writer.add({'id': '1', 'name': 'Cake'}, URL, lambda: written.append('1'))
+            writer.add({'id': '1', 'name': 'New Cake'}, URL, lambda: written.append('1 again'))
+            self.assertEqual([], mongo_db.batches)
+            writer.add({'id': '2'}, URL, lambda: written.append('2'))
+            self.assertEqual([[({'id': '1', 'name': 'New Cake'}, URL), ({'id': '2'}, URL)]],
+                             mongo_db.batches)
+            self.assertEqual(['1', '1 again', '2'], written)
+            writer.add({'id': '1', 'name': 'Cake'}, URL)
+            writer.add({'id': '3'}, URL)
+            writer.add({'id': '4'}, URL)
+        self.assertEqual(3, len(mongo_db.batches))
+        self.assertEqual({INSERTED: 4, UPDATED: 1, UNCHANGED: 0}, writer.results)
+
+    def test_flush_by_time(self):
+        """
+        Test that buffered recipes are written after flush_interval
+        """
+        mongo_db = BatchRecorder()
+        with BulkRecipeWriter(mongo_db, batch_size=100, flush_interval=0.05) as writer:
+            writer.add({'id': '1'}, URL)
+            time.sleep(0.2)
+            self.assertEqual([[({'id': '1'}, URL)]], mongo_db.batches)
+
+    def test_keep_batch_on_error(self):
+        """
+        Test that recipes of a batch that failed are written by the next flush
+        """
+        mongo_db = BatchRecorder(failing_batches=1)
+        written = []
+        writer = BulkRecipeWriter(mongo_db, batch_size=100, flush_interval=0)
+        writer.add({'id': '1'}, URL, lambda: written.append('1'))
+        writer.flush()
+        self.assertEqual([], written)
+        writer.add({'id': '2'}, URL)
+        writer.close()
+        self.assertEqual([[({'id': '1'}, URL), ({'id': '2'}, URL)]], mongo_db.batches)
+        self.assertEqual(['1'], written)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,27 +1,31 @@
 """
 Test module for database
 """
+import os
 import unittest
 
-from scraper.database import Database, ALL_RECIPES, FAVOURITES
+import pymongo
+
+from scraper.database import Database, ALL_RECIPES, FAVOURITES, INSERTED, UPDATED, UNCHANGED, \
+    fingerprint_of, get_mongo_client, get_pool_stats, mongo_client_options
 
 RECIPE1 = {
             'id': '1',
             'name': 'Cake',
             'description': 'My Cake',
             'image url': 'https://m.ftscrt.com/static/recipe/d9f68f56.jpg',
-            'yields': '1',
-            'prep time': '1 mins',
-            'cook time': '2 mins'
+            'yields': 1,
+            'prep time': 1,
+            'cook time': 2
         }
 
 RECIPE1_NEW = {
             'name': 'New Cake',
             'description': 'My New Cake',
             'image url': 'https://m.ftscrt.com/static/recipe/d9f68f56.jpg',
-            'yields': '3',
-            'prep time': '10 mins',
-            'cook time': '20 mins',
+            'yields': 3,
+            'prep time': 10,
+            'cook time': 20,
             'meal types': [
                 'Dessert'
             ],
@@ -41,8 +45,8 @@ RECIPE2 = {
             'name': 'Fruit Juice',
             'description': 'My Juice',
             'image url': 'https://m.ftscrt.com/static/recipe/d9f68f56.jpg',
-            'yields': '1',
-            'prep time': '5 mins',
+            'yields': 1,
+            'prep time': 5,
             'meal types': [
                 'drinks and beverages'
             ],
@@ -61,8 +65,8 @@ RECIPE2_NEW = {
             'name': 'Magic Fruit Juice',
             'description': 'My Amazing Juice',
             'image url': 'https://m.ftscrt.com/static/recipe/d9f68f56.jpg',
-            'yields': '1',
-            'prep time': '5 mins',
+            'yields': 1,
+            'prep time': 5,
             'meal types': [
                 'drinks and beverages'
             ],
@@ -160,6 +164,277 @@ class TestDatabase(unittest.TestCase):
         # delete all documents after test
         MONGO_DB.all_recipes_tb.delete_many({})
 
+    def test_ensure_indexes_unreachable(self):
+        """
+        Test method ensure_indexes warns instead of raising when no server can be reached
+        """
+        # nothing listens on port 1
+        client = pymongo.MongoClient('127.0.0.1', 1, serverSelectionTimeoutMS=100)
+        self.assertFalse(Database(client).ensure_indexes())
+        client.close()
+
+    def test_ensure_indexes(self):
+        """
+        Test method ensure_indexes and get_index_usage
+        """
+        self.assertTrue(MONGO_DB.ensure_indexes())
+        # test indexes are in place, and creating them again is a no-op
+        self.assertTrue({'id', 'meal types', 'popularity, id', 'prep time, id', 'cook time, id',
+                         'name terms', 'scraped at'}
+                        <= set(MONGO_DB.all_recipes_tb.index_information()))
+        self.assertTrue(MONGO_DB.ensure_indexes())
+        # test duplicate ids are rejected
+        MONGO_DB.favourites_tb.insert_one(dict(RECIPE2))
+        with self.assertRaises(pymongo.errors.DuplicateKeyError):
+            MONGO_DB.favourites_tb.insert_one({'id': RECIPE2['id']})
+        MONGO_DB.favourites_tb.find_one({'id': RECIPE2['id']})
+        usage = {(index_usage['table'], index_usage['name']): index_usage['operations']
+                 for index_usage in MONGO_DB.get_index_usage()}
+        self.assertGreaterEqual(usage[('favourites table', 'id')], 1)
+
+        # delete all documents after test
+        MONGO_DB.favourites_tb.delete_many({})
+
+    def test_upsert_on_tb(self):
+        """
+        Test method upsert_on_tb
+        """
+        # test recipe is inserted if it does not exist
+        self.assertEqual(INSERTED, MONGO_DB.upsert_on_tb(dict(RECIPE2), FAVOURITES))
+        self.assertEqual('Fruit Juice', MONGO_DB.favourites_tb.find_one({'id': '2'})['name'])
+
+        # test attributes given are updated in one update, the others are kept
+        self.assertEqual(UPDATED, MONGO_DB.upsert_on_tb({'id': '2', 'name': 'Juice', 'yields': '',
+                                                         'colour': 'red'}, FAVOURITES))
+        recipe2_dict = MONGO_DB.favourites_tb.find_one({'id': '2'})
+        self.assertEqual('Juice', recipe2_dict['name'])
+        self.assertEqual(RECIPE2['yields'], recipe2_dict['yields'])
+        self.assertNotIn('colour', recipe2_dict)
+        self.assertEqual(1, MONGO_DB.favourites_tb.count_documents({}))
+        self.assertIsNone(MONGO_DB.upsert_on_tb(RECIPE1_NEW, FAVOURITES))
+
+        # delete all documents after test
+        MONGO_DB.favourites_tb.delete_many({})
+
+    def test_store_scraped_recipe(self):
+        """
+        Test method store_scraped_recipe
+        """
+        url = 'https://www.fatsecret.com/recipes/2-fruit-juice/Default.aspx'
+        # test new recipe is inserted with its metadata
+        self.assertEqual(INSERTED, MONGO_DB.store_scraped_recipe(dict(RECIPE2), url))
+        recipe2_dict = MONGO_DB.all_recipes_tb.find_one({'id': '2'})
+        self.assertEqual(fingerprint_of(RECIPE2), recipe2_dict['fingerprint'])
+        self.assertEqual(url, recipe2_dict['url'])
+        scraped_at = recipe2_dict['scraped at']
+
+        # test same content is not written again, only scrape time is set
+        self.assertEqual(UNCHANGED, MONGO_DB.store_scraped_recipe(dict(RECIPE2), url))
+        recipe2_dict = MONGO_DB.all_recipes_tb.find_one({'id': '2'})
+        self.assertGreaterEqual(recipe2_dict['scraped at'], scraped_at)
+        self.assertEqual([url], MONGO_DB.get_stale_recipe_urls(10))
+
+        # test changed content is updated
+        self.assertEqual(UPDATED, MONGO_DB.store_scraped_recipe(dict(RECIPE2_NEW), url))
+        recipe2_dict = MONGO_DB.all_recipes_tb.find_one({'id': '2'})
+        self.assertEqual('Magic Fruit Juice', recipe2_dict['name'])
+        self.assertEqual(fingerprint_of(RECIPE2_NEW), recipe2_dict['fingerprint'])
+
+        # test update outside a scrape makes the next scrape write again
+        MONGO_DB.update_on_tb({'id': '2', 'name': 'Juice'}, ALL_RECIPES)
+        self.assertEqual(UPDATED, MONGO_DB.store_scraped_recipe(dict(RECIPE2_NEW), url))
+
+        # delete all documents after test
+        MONGO_DB.all_recipes_tb.delete_many({})
+
+    def test_store_scraped_recipes(self):
+        """
+        Test method store_scraped_recipes
+        """
+        url = 'https://www.fatsecret.com/recipes/2-fruit-juice/Default.aspx'
+        MONGO_DB.all_recipes_tb.insert_one(dict(RECIPE1))
+        # test new recipes are inserted and stored ones updated in one batch
+        self.assertEqual([UPDATED, INSERTED, None],
+                         MONGO_DB.store_scraped_recipes([(dict(RECIPE1, name='New Cake'), url),
+                                                         (dict(RECIPE2), url),
+                                                         (dict(RECIPE1_NEW), url)]))
+        self.assertEqual(2, MONGO_DB.all_recipes_tb.count_documents({}))
+        recipe1_dict = MONGO_DB.all_recipes_tb.find_one({'id': '1'})
+        self.assertEqual('New Cake', recipe1_dict['name'])
+        self.assertEqual(url, recipe1_dict['url'])
+        scraped_at = recipe1_dict['scraped at']
+        recipe2_dict = MONGO_DB.all_recipes_tb.find_one({'id': '2'})
+        self.assertEqual(fingerprint_of(RECIPE2), recipe2_dict['fingerprint'])
+
+        # test the same batch stored again is unchanged, only its scrape time is set
+        new_url = 'https://www.fatsecret.com/recipes/2-juice/Default.aspx'
+        self.assertEqual([UNCHANGED, UNCHANGED],
+                         MONGO_DB.store_scraped_recipes([(dict(RECIPE1, name='New Cake'), url),
+                                                         (dict(RECIPE2), new_url)]))
+        recipe2_dict = MONGO_DB.all_recipes_tb.find_one({'id': '2'})
+        self.assertEqual(new_url, recipe2_dict['url'])
+        self.assertGreaterEqual(recipe2_dict['scraped at'], scraped_at)
+        self.assertEqual([UPDATED], MONGO_DB.store_scraped_recipes([(dict(RECIPE2_NEW), url)]))
+
+        # delete all documents after test
+        MONGO_DB.all_recipes_tb.delete_many({})
+
+    def test_favourite_references(self):
+        """
+        Test favourites are stored as references to all recipes table
+        """
+        MONGO_DB.all_recipes_tb.insert_one(dict(RECIPE2))
+        # test favourite equal to its recipe is stored as its id only
+        self.assertTrue(MONGO_DB.insert_into_tb(dict(RECIPE2), FAVOURITES))
+        self.assertEqual({'id': '2'}, MONGO_DB.favourites_tb.find_one({'id': '2'}, {'_id': 0}))
+        self.assertEqual(RECIPE2, MONGO_DB.get_favourite('2'))
+
+        # test attributes differing from the recipe are kept and win over it
+        MONGO_DB.update_on_tb({'id': '2', 'name': 'My Juice'}, FAVOURITES)
+        self.assertEqual('My Juice', MONGO_DB.get_favourite('2')['name'])
+
+        # test recipe scraped again shows through, query matches the merged favourite
+        MONGO_DB.all_recipes_tb.update_one({'id': '2'}, {'$set': {'description': 'New Juice'}})
+        favourites = list(MONGO_DB.find_favourites({'description': 'New Juice'}))
+        self.assertEqual(['My Juice'], [favourite['name'] for favourite in favourites])
+        self.assertIsNone(MONGO_DB.get_favourite('1'))
+
+        # test favourites stored as full copies are compacted
+        MONGO_DB.favourites_tb.update_one({'id': '2'}, {'$set': {'yields': RECIPE2['yields']}})
+        self.assertEqual(1, MONGO_DB.compact_favourites())
+        self.assertEqual({'id': '2', 'name': 'My Juice', 'name terms': ['juic', 'my']},
+                         MONGO_DB.favourites_tb.find_one({'id': '2'}, {'_id': 0}))
+
+        # delete all documents after test
+        MONGO_DB.all_recipes_tb.delete_many({})
+        MONGO_DB.favourites_tb.delete_many({})
+
+    def test_delete_recipe(self):
+        """
+        Test a favourite keeps its content when its recipe is deleted from all recipes table
+        """
+        MONGO_DB.all_recipes_tb.insert_one(dict(RECIPE2, url='https://recipe/2'))
+        MONGO_DB.insert_into_tb({'id': '2', 'name': 'My Juice'}, FAVOURITES)
+        favourite = MONGO_DB.get_favourite('2')
+        self.assertTrue(MONGO_DB.delete_recipe('2'))
+        self.assertIsNone(MONGO_DB.all_recipes_tb.find_one({'id': '2'}))
+        self.assertEqual(favourite, MONGO_DB.get_favourite('2'))
+        self.assertEqual(['My Juice'], [recipe['name'] for recipe in
+                                        MONGO_DB.find_favourites({'name terms': 'juic'})])
+        self.assertNotIn('url', MONGO_DB.favourites_tb.find_one({'id': '2'}))
+        self.assertFalse(MONGO_DB.delete_recipe('2'))
+
+        # delete all documents after test
+        MONGO_DB.favourites_tb.delete_many({})
+
+    def test_migrate_numeric_attributes(self):
+        """
+        Test method migrate_numeric_attributes, and numbers given as str are stored as int
+        """
+        old_values = {'yields': '1', 'prep time': '1 hr 5 mins', 'cook time': 'soon',
+                      'popularity': '1,234 people'}
+        MONGO_DB.all_recipes_tb.insert_one(dict(RECIPE1, fingerprint='old', **old_values))
+        MONGO_DB.favourites_tb.insert_one({'id': '1', 'yields': '4'})
+        self.assertEqual(2, MONGO_DB.migrate_numeric_attributes())
+        recipe1_dict = MONGO_DB.all_recipes_tb.find_one({'id': '1'}, {'_id': 0})
+        self.assertEqual((1, 65, 1234), (recipe1_dict['yields'], recipe1_dict['prep time'],
+                                         recipe1_dict['popularity']))
+        self.assertNotIn('cook time', recipe1_dict)
+        self.assertEqual(fingerprint_of(recipe1_dict), recipe1_dict['fingerprint'])
+        self.assertEqual(4, MONGO_DB.favourites_tb.find_one({'id': '1'})['yields'])
+        self.assertEqual(0, MONGO_DB.migrate_numeric_attributes())
+
+        # test numbers written as str are stored as int, and found by range
+        MONGO_DB.update_on_tb({'id': '1', 'cook time': '30'}, ALL_RECIPES)
+        self.assertEqual(1, MONGO_DB.all_recipes_tb.count_documents({'cook time': {'$gt': 20}}))
+
+        # delete all documents after test
+        MONGO_DB.all_recipes_tb.delete_many({})
+        MONGO_DB.favourites_tb.delete_many({})
+
+    def test_search_terms(self):
+        """
+        Test search terms are written with text attributes, and method build_search_terms
+        """
+        MONGO_DB.insert_into_tb(dict(RECIPE2), ALL_RECIPES)
+        recipe2_dict = MONGO_DB.all_recipes_tb.find_one({'id': '2'}, {'_id': 0})
+        self.assertEqual(['fruit', 'juic'], recipe2_dict['name terms'])
+        self.assertEqual(['add', 'juic', 'water'], recipe2_dict['instructions terms'])
+        MONGO_DB.update_on_tb({'id': '2', 'name': 'Baked Apples'}, ALL_RECIPES)
+        self.assertEqual(['appl', 'bak'],
+                         MONGO_DB.all_recipes_tb.find_one({'id': '2'})['name terms'])
+        # test favourites are searched by their own terms, and output without terms
+        MONGO_DB.insert_into_tb({'id': '2', 'name': 'Apple Pie'}, FAVOURITES)
+        favourites = list(MONGO_DB.find_favourites({'name terms': 'pie'}))
+        self.assertEqual(['Apple Pie'], [favourite['name'] for favourite in favourites])
+        self.assertNotIn('name terms', favourites[0])
+        self.assertEqual([], list(MONGO_DB.find_favourites({'name terms': 'bak'})))
+        MONGO_DB.favourites_tb.delete_many({})
+
+        # test recipes stored without terms get them once
+        MONGO_DB.all_recipes_tb.insert_one(dict(RECIPE1))
+        self.assertEqual(1, MONGO_DB.build_search_terms())
+        self.assertEqual(['cak', 'my'],
+                         MONGO_DB.all_recipes_tb.find_one({'id': '1'})['description terms'])
+        self.assertEqual(0, MONGO_DB.build_search_terms())
+
+        # delete all documents after test
+        MONGO_DB.all_recipes_tb.delete_many({})
+
+
+
+class TestMongoClient(unittest.TestCase):
+    """
+    Test class for the client shared in the process, no server is needed
+    """
+
+    def test_shared_client(self):
+        """
+        Test that every Database uses the same client, which has not connected yet
+        """
+        self.assertIs(get_mongo_client(), Database().client)
+        self.assertIs(Database().client, Database().client)
+        self.assertEqual(0, get_pool_stats()['open'])
+        client = pymongo.MongoClient(connect=False)
+        self.assertIs(client, Database(client).client)
+
+    def test_mongo_client_options(self):
+        """
+        Test that client settings are read from the environment
+        """
+        os.environ['MONGO_MAX_POOL_SIZE'] = '7'
+        os.environ['MONGO_COMPRESSORS'] = 'zlib'
+        try:
+            options = mongo_client_options()
+        finally:
+            del os.environ['MONGO_MAX_POOL_SIZE']
+            del os.environ['MONGO_COMPRESSORS']
+        self.assertEqual(7, options['maxPoolSize'])
+        self.assertEqual('zlib', options['compressors'])
+        self.assertIsNone(options['socketTimeoutMS'])
+        self.assertNotIn('compressors', mongo_client_options())
+
+
+class TestFingerprint(unittest.TestCase):
+    """
+    Test class for fingerprint_of
+    """
+
+    def test_fingerprint_of(self):
+        """
+        Test that fingerprint depends on the content of attributes only
+        """
+        self.assertEqual(fingerprint_of(RECIPE2), fingerprint_of(dict(reversed(RECIPE2.items()))))
+        self.assertEqual(fingerprint_of(RECIPE2),
+                         fingerprint_of(dict(RECIPE2, url='url', popularity='')))
+        self.assertNotEqual(fingerprint_of(RECIPE2), fingerprint_of(RECIPE2_NEW))
+        # 0 is a value, a recipe getting 0 mins of cook time is changed
+        without_cook_time = {key: value for key, value in RECIPE2.items() if key != 'cook time'}
+        self.assertNotEqual(fingerprint_of(without_cook_time),
+                            fingerprint_of(dict(without_cook_time, **{'cook time': 0})))
+        self.assertEqual(fingerprint_of(without_cook_time),
+                         fingerprint_of(dict(without_cook_time, **{'cook time': None})))
+
 
 if __name__ == '__main__':
     MONGO_DB = Database()
@@ -0,0 +1,78 @@
+"""
+Test module for dedup
+"""
+import multiprocessing
+import unittest
+
+from scraper.dedup import RecipeIdFilter, recipe_id_of_url
+
+
+class TestDedup(unittest.TestCase):
+    """
+    Test class for dedup.py
+    """
+
+    def test_recipe_id_of_url(self):
+        """
+        Test getting the recipe id from the link of a listing row
+        """
+        self.assertEqual('52389300', recipe_id_of_url(
+            'https://www.fatsecret.com/recipes/52389300-energy-bites/Default.aspx'))
+        self.assertIsNone(recipe_id_of_url(
+            'https://www.fatsecret.com/recipes/low-carb-pancakes/Default.aspx'))
+
+    def test_is_known_url(self):
+        """
+        Test that only urls of stored ids are known, and ids added later are known
+        """
+        known_recipes = RecipeIdFilter(['52389300', 23613877])
+        self.assertEqual(2, len(known_recipes))
+        self.assertTrue(known_recipes.is_known_url(
+            'https://www.fatsecret.com/recipes/52389300-energy-bites/Default.aspx'))
+        self.assertTrue(known_recipes.is_known_url(
+            'https://www.fatsecret.com/recipes/23613877-low-carb-pancakes/Default.aspx'))
+        self.assertFalse(known_recipes.is_known_url(
+            'https://www.fatsecret.com/recipes/52521158-crepes/Default.aspx'))
+        self.assertFalse(known_recipes.is_known_url(
+            'https://www.fatsecret.com/recipes/low-carb-pancakes/Default.aspx'))
+        known_recipes.add('52521158')
+        self.assertTrue(known_recipes.is_known_url(
+            'https://www.fatsecret.com/recipes/52521158-crepes/Default.aspx'))
+
+    def test_claim_url(self):
+        """
+        Test that a recipe is claimed by one filter only, and urls without id are always claimed
+        """
+        url = 'https://www.fatsecret.com/recipes/52521158-crepes/Default.aspx'
+        known_recipes = RecipeIdFilter(['52389300'])
+        self.assertFalse(known_recipes.claim_url(
+            'https://www.fatsecret.com/recipes/52389300-energy-bites/Default.aspx'))
+        self.assertTrue(known_recipes.claim_url(url))
+        self.assertFalse(known_recipes.claim_url(url))
+        self.assertTrue(known_recipes.claim_url(
+            'https://www.fatsecret.com/recipes/low-carb-pancakes/Default.aspx'))
+
+        with multiprocessing.Manager() as manager:
+            shared_ids = manager.dict()
+            first = RecipeIdFilter(shared_ids=shared_ids)
+            second = RecipeIdFilter(shared_ids=shared_ids)
+            self.assertTrue(first.claim_url(url))
+            self.assertFalse(second.claim_url(url))
+            self.assertTrue(second.is_known_url(url))
+            second.add('23613877')
+            self.assertFalse(first.claim_url(
+                'https://www.fatsecret.com/recipes/23613877-low-carb-pancakes/Default.aspx'))
+
+            # a recipe released after a failed scrape can be claimed again by any filter
+            second.release(url)
+            self.assertFalse(second.claim_url(url))
+            first.release(url)
+            self.assertFalse(first.is_known_url(url))
+            self.assertTrue(second.claim_url(url))
+            self.assertFalse(first.claim_url(url))
+            first.release(url)
+            self.assertTrue(second.is_known_url(url))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,335 @@
+"""
+Test module for embedded_store, no server is needed
+"""
+import contextlib
+import io
+import os
+import sqlite3
+import tempfile
+import unittest
+
+import pymongo
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+
+import test.database_test as database_test
+import test.work_queue_test as work_queue_test
+import api.query as api_query
+from api.query import query, search_page
+from scraper.bulk_writer import BulkRecipeWriter
+from scraper.constant import SEARCH_RANK_CANDIDATES
+from scraper.database import Database, INSERTED
+from scraper.embedded_store import EmbeddedClient, match, apply_update
+from scraper.text_search import terms_values_of
+
+RECIPE = {'id': '1', 'name': 'Apple Cake', 'prep time': 10, 'cook time': 20,
+          'meal types': ['Dessert', 'Snack']}
+
+
+class TestMatch(unittest.TestCase):
+    """
+    Test class for the filters of mongoDB matched in process
+    """
+
+    def test_match(self):
+        """
+        Test equality, arrays, comparisons, $exists, $type, $regex, $in and logical operators
+        """
+        self.assertTrue(match(RECIPE, {}))
+        self.assertTrue(match(RECIPE, {'id': '1', 'meal types': 'Snack'}))
+        self.assertFalse(match(RECIPE, {'id': 1}))
+        self.assertTrue(match(RECIPE, {'meal types': ['Dessert', 'Snack']}))
+        self.assertTrue(match(RECIPE, {'yields': None}))
+        self.assertTrue(match(RECIPE, {'name': {'$regex': '.*cake.*', '$options': 'i'}}))
+        self.assertFalse(match(RECIPE, {'name': {'$regex': '.*cake.*'}}))
+        self.assertTrue(match(RECIPE, {'prep time': {'$ne': 20}, 'url': {'$exists': False}}))
+        self.assertTrue(match(RECIPE, {'prep time': {'$type': 'int'}, 'id': {'$type': 'string'}}))
+        self.assertFalse(match(RECIPE, {'meal types': {'$type': 'number'}}))
+        self.assertTrue(match(RECIPE, {'meal types': {'$in': ['Lunch', 'Dessert']}}))
+        self.assertTrue(match(RECIPE, {'prep time': {'$gt': 5}}))
+        self.assertFalse(match(RECIPE, {'prep time': {'$gt': '5'}}))
+        self.assertTrue(match(RECIPE, {'$or': [{'id': '2'}, {'cook time': {'$gte': 20}}]}))
+        self.assertFalse(match(RECIPE, {'$and': [{'id': '1'},
+                                                 {'name': {'$not': {'$regex': 'A'}}}]}))
+        # $expr compares fields of the document
+        self.assertTrue(match(RECIPE, {'$expr': {'$lt': [{'$toInt': '$id'}, 15]}}))
+        self.assertTrue(match({'reserved': 1, 'target number': 2},
+                              {'$expr': {'$lt': ['$reserved', '$target number']}}))
+
+    def test_apply_update(self):
+        """
+        Test update operators, $setOnInsert only applies to an inserted document
+        """
+        document = {'id': '1', 'name': 'Cake', 'attempts': 1}
+        self.assertTrue(apply_update(document, {'$set': {'name': 'Pie'}, '$unset': {'id': ''},
+                                                '$inc': {'attempts': 1},
+                                                '$setOnInsert': {'state': 'new'}}))
+        self.assertEqual({'name': 'Pie', 'attempts': 2}, document)
+        self.assertFalse(apply_update(document, {'$set': {'name': 'Pie'}}))
+        apply_update(document, {'$setOnInsert': {'state': 'new'}}, is_insert=True)
+        self.assertEqual('new', document['state'])
+
+
+class TestEmbeddedCollection(unittest.TestCase):
+    """
+    Test class for EmbeddedCollection
+    """
+
+    def setUp(self):
+        self.client = EmbeddedClient(':memory:')
+        self.table = self.client['FoodRecipes'].recipes_table
+
+    def tearDown(self):
+        self.client.close()
+
+    def test_find(self):
+        """
+        Test find with projection, sort, skip and limit, and the queries of api.query
+        """
+        self.table.insert_many([dict(RECIPE, id=str(index), name=f'Cake {index}',
+                                     **{'prep time': index},
+                                     **terms_values_of({'name': f'Cake {index}'}))
+                                for index in range(1, 6)])
+        self.assertEqual(5, self.table.count_documents({}))
+        self.assertEqual({'id': '3'}, self.table.find_one({'name': 'Cake 3'}, {'id': 1, '_id': 0}))
+        names = [recipe['name'] for recipe in self.table.find({'id': {'$ne': '2'}}, {'_id': 0})
+                 .sort('prep time', pymongo.DESCENDING).skip(1).limit(2)]
+        self.assertEqual(['Cake 4', 'Cake 3'], names)
+        self.assertIsNone(self.table.find_one({'id': '6'}))
+
+        # a database of this client runs the queries parsed from query strings
+        mongo_db = Database(self.client)
+        mongo_db.all_recipes_tb = self.table
+        self.assertEqual(['4', '5'], [recipe['id'] for recipe in
+                                      query('all.prep time: > 3 AND all.name: Cake', mongo_db)])
+        self.assertEqual(['2', '5'], [recipe['id'] for recipe in query(
+            'all.prep time: BETWEEN 2 AND 5 AND NOT (all.id: 3 OR all.name: Cake 4)', mongo_db)])
+
+    def test_search_ranking(self):
+        """
+        Test recipes found by words are ranked by relevance, and output without their terms
+        """
+        recipes = [{'id': '1', 'name': 'Apple Pie', 'description': 'Better than cake'},
+                   {'id': '2', 'name': 'Cake', 'description': 'Baked'},
+                   {'id': '3', 'name': 'Tea'}]
+        self.table.insert_many([dict(recipe, **terms_values_of(recipe)) for recipe in recipes])
+        mongo_db = Database(self.client)
+        mongo_db.all_recipes_tb = self.table
+        self.assertEqual(recipes[1::-1], query('all.text: cakes', mongo_db))
+        self.assertEqual(['2'], [recipe['id'] for recipe in
+                                 query('all.text: bake AND all.name: ca', mongo_db)])
+        self.assertEqual(['1', '3'], sorted(recipe['id'] for recipe in
+                                            query('all.name: NOT cakes', mongo_db)))
+
+    def test_search_page(self):
+        """
+        Test the pages of search_page cover the results once in order, for each sort
+        """
+        recipes = [{'id': str(index), 'name': f'Cake {index}', 'popularity': index % 4}
+                   for index in range(10, 20)] + [{'id': '20', 'name': 'Fruit Cake'}]
+        self.table.insert_many([dict(recipe, **terms_values_of(recipe)) for recipe in recipes])
+        mongo_db = Database(self.client)
+        mongo_db.all_recipes_tb = self.table
+        mongo_db.ensure_indexes()
+        for query_string, sort, expected in [
+                ('all.name: cake', 'id', [str(index) for index in range(10, 21)]),
+                ('all.name: cake', '-popularity', ['19', '15', '11', '18', '14', '10', '17',
+                                                   '13', '16', '12', '20']),
+                ('all.name: cake OR all.name: fruit', 'relevance',
+                 ['20'] + [str(index) for index in range(10, 20)])]:
+            ids, cursor = [], None
+            while True:
+                page = search_page(query_string, mongo_db, '3', sort, cursor)
+                self.assertLessEqual(len(page['results']), 3)
+                ids += [recipe['id'] for recipe in page['results']]
+                if not page['has_more']:
+                    break
+                cursor = page['cursor']
+            self.assertIsNone(page['cursor'])
+            self.assertEqual(expected, ids, sort)
+        # words are sorted by id unless relevance is asked for
+        self.assertEqual('10', search_page('all.name: fruit OR all.name: cake',
+                                           mongo_db)['results'][0]['id'])
+        # a page sorted by relevance ranks the first SEARCH_RANK_CANDIDATES recipes found only
+        api_query.SEARCH_RANK_CANDIDATES = 4
+        try:
+            page = search_page('all.name: fruit OR all.name: cake', mongo_db, '10', 'relevance')
+        finally:
+            api_query.SEARCH_RANK_CANDIDATES = SEARCH_RANK_CANDIDATES
+        self.assertEqual(4, len(page['results']))
+        self.assertFalse(page['has_more'])
+        page = search_page('all.name:', mongo_db, '2', 'popularity')
+        self.assertEqual([{'id': '20', 'name': 'Fruit Cake'},
+                          {'id': '12', 'name': 'Cake 12', 'popularity': 0}], page['results'])
+
+    def test_update(self):
+        """
+        Test update_one with upsert, find_one_and_update and delete
+        """
+        result = self.table.update_one({'id': '1'}, {'$set': {'name': 'Cake'}}, upsert=True)
+        self.assertIsNotNone(result.upserted_id)
+        result = self.table.update_one({'id': '1'}, {'$set': {'name': 'Pie'}}, upsert=True)
+        self.assertIsNone(result.upserted_id)
+        self.assertEqual(1, result.matched_count)
+        self.assertEqual(0, self.table.update_one({'id': '2'}, {'$set': {'a': 1}}).matched_count)
+
+        self.table.insert_one({'id': '2', 'name': 'Tea'})
+        recipe = self.table.find_one_and_update({}, {'$set': {'state': 'leased'}},
+                                                sort=[('id', pymongo.DESCENDING)],
+                                                return_document=pymongo.ReturnDocument.AFTER)
+        self.assertEqual(('2', 'leased'), (recipe['id'], recipe['state']))
+        self.assertEqual(1, self.table.delete_many({'name': 'Pie'}).deleted_count)
+        self.assertEqual(['2'], [recipe['id'] for recipe in self.table.find()])
+
+    def test_indexes(self):
+        """
+        Test unique indexes, the errors of bulk writes and usage counts
+        """
+        self.table.create_indexes([pymongo.IndexModel([('id', pymongo.ASCENDING)], name='id',
+                                                      unique=True)])
+        self.table.insert_one({'id': '1'})
+        with self.assertRaises(DuplicateKeyError):
+            self.table.insert_one({'id': '1'})
+        with self.assertRaises(BulkWriteError) as context:
+            self.table.bulk_write([pymongo.InsertOne({'id': '1'}),
+                                   pymongo.UpdateOne({'id': '2'}, {'$set': {'name': 'Tea'}},
+                                                     upsert=True)], ordered=False)
+        details = context.exception.details
+        self.assertEqual([0], [error['index'] for error in details['writeErrors']])
+        self.assertEqual(1, details['nUpserted'])
+        self.assertEqual('Tea', self.table.find_one({'id': '2'})['name'])
+        usage = {index['name']: index['accesses']['ops']
+                 for index in self.table.aggregate([{'$indexStats': {}}])}
+        self.assertGreaterEqual(usage['id'], 2)
+
+    def test_range_index(self):
+        """
+        Test ranges of numbers are searched by the index of the field, arrays included
+        """
+        self.table.create_index('cook time')
+        self.table.insert_many([{'id': str(index), 'cook time': index} for index in range(10)]
+                               + [{'id': 'array', 'cook time': [1, 40]},
+                                  {'id': 'text', 'cook time': '1'}, {'id': 'none'}])
+        self.assertEqual(['0', '1', 'array'], [recipe['id'] for recipe in
+                                               self.table.find({'cook time': {'$lt': 2}})])
+        self.assertEqual(['8', '9', 'array'], [recipe['id'] for recipe in
+                                               self.table.find({'cook time': {'$gte': 8}})])
+        sql, parameters = self.table._plan({'cook time': {'$gt': 8}})
+        plan = self.client.execute(f'EXPLAIN QUERY PLAN SELECT doc FROM {self.table._table}{sql}',
+                                   parameters)
+        self.assertIn('USING INDEX', plan[0][-1])
+
+    def test_multikey_index(self):
+        """
+        Test indexes of arrays have an entry for each element, kept on writes,
+        and serve equality, $elemMatch ranges and $or of indexed fields
+        """
+        self.table.insert_one({'id': '1', 'terms': ['apple', 'cak']})
+        self.table.create_index('terms')
+        self.table.create_index('tags')
+        self.table.insert_one({'id': '2', 'terms': ['bread'], 'tags': ['cake']})
+        self.table.update_one({'id': '1'}, {'$set': {'terms': ['apple', 'pie']}})
+        self.assertEqual(['1'], [recipe['id'] for recipe in self.table.find({'terms': 'pie'})])
+        self.assertEqual([], list(self.table.find({'terms': 'cak'})))
+        prefix = {'$elemMatch': {'$gte': 'ca', '$lt': 'cb'}}
+        self.assertEqual(['2'], [recipe['id'] for recipe in self.table.find(
+            {'$or': [{'terms': prefix}, {'tags': prefix}]})])
+        sql, parameters = self.table._plan({'$or': [{'terms': prefix}, {'tags': prefix}]})
+        plan = self.client.execute(f'EXPLAIN QUERY PLAN SELECT doc FROM {self.table._table}{sql}',
+                                   parameters)
+        self.assertTrue(any('USING' in row[-1] and 'name_key' in row[-1] for row in plan))
+        # entries of a deleted document are deleted, the entries table is no collection
+        self.table.delete_one({'id': '2'})
+        self.assertEqual([('apple',), ('pie',)], self.client.execute(
+            f'SELECT key FROM {self.table._keys_table} ORDER BY key'))
+        self.assertEqual(['recipes_table'], self.client['FoodRecipes'].list_collection_names())
+
+    def test_ordered_scan(self):
+        """
+        Test limited finds read rows in order, and look up the entries of a query matching few
+        """
+        self.table.create_index('id', unique=True)
+        self.table.create_index('terms')
+        self.table.insert_many([{'id': f'{index:03}', 'terms': ['cak' if index % 2 else 'pie']
+                                 + (['rare'] if index in (7, 90) else [])}
+                                for index in range(100)])
+        for query_filter, expected in [({'terms': 'cak'}, ['099', '097', '095']),
+                                       ({'terms': 'rare'}, ['090', '007'])]:
+            self.assertEqual(expected, [recipe['id'] for recipe in self.table.find(
+                query_filter).sort('id', pymongo.DESCENDING).limit(3)])
+        self.assertEqual(['007', '090'],
+                         [recipe['id'] for recipe in self.table.find({'terms': 'rare'}).limit(2)])
+        self.assertEqual(['001'], [recipe['id'] for recipe in self.table.find(
+            {'terms': 'cak', 'id': {'$gt': '000'}}).sort('id').limit(1)])
+
+    def test_persistence(self):
+        """
+        Test that documents and indexes are kept in the SQLite file
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'food_recipes.sqlite3')
+            client = EmbeddedClient(path)
+            client['FoodRecipes'].recipes_table.create_index('id', unique=True)
+            client['FoodRecipes'].recipes_table.insert_one(dict(RECIPE))
+            client.close()
+            table = EmbeddedClient(path)['FoodRecipes'].recipes_table
+            self.assertEqual('Apple Cake', table.find_one()['name'])
+            self.assertTrue(table.index_information()['id_1']['unique'])
+            table.database.client.close()
+
+    def test_locked_file(self):
+        """
+        Test that a file locked by another process raises OperationFailure,
+        so the bulk writer keeps its batch and writes it once the lock is released
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'food_recipes.sqlite3')
+            client = EmbeddedClient(path, timeout=0.1)
+            mongo_db = Database(client)
+            other_process = sqlite3.connect(path, isolation_level=None)
+            other_process.execute('BEGIN EXCLUSIVE')
+            with self.assertRaises(OperationFailure):
+                mongo_db.all_recipes_tb.insert_one(dict(RECIPE))
+            writer = BulkRecipeWriter(mongo_db, batch_size=100, flush_interval=0)
+            writer.add(dict(RECIPE), 'url')
+            with contextlib.redirect_stdout(io.StringIO()):
+                writer.flush()
+            self.assertEqual(0, writer.results[INSERTED])
+            other_process.execute('ROLLBACK')
+            other_process.close()
+            writer.close()
+            self.assertEqual(1, writer.results[INSERTED])
+            self.assertEqual('Apple Cake', mongo_db.all_recipes_tb.find_one({'id': '1'})['name'])
+            client.close()
+
+
+class TestDatabaseOnEmbeddedStore(database_test.TestDatabase):
+    """
+    Test class running the tests of Database on the embedded backend
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        database_test.MONGO_DB = Database(EmbeddedClient(':memory:'))
+
+    @classmethod
+    def tearDownClass(cls):
+        database_test.MONGO_DB.client.close()
+        del database_test.MONGO_DB
+
+
+class TestWorkQueueOnEmbeddedStore(work_queue_test.TestWorkQueue):
+    """
+    Test class running the tests of the work queue on the embedded backend
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.mongo_db = Database(EmbeddedClient(':memory:'))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.mongo_db.client.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+"""
+Test module for extractor
+"""
+import contextlib
+import io
+import unittest
+
+from bs4 import BeautifulSoup
+
+from scraper.extractor import RECIPE_EXTRACTOR, minutes_of, id_of, int_of
+from scraper.scraper import parse_soup, RECIPE_PAGE_STRAINER, get_id, get_name, get_time, \
+    get_yields, get_popularity, get_description, get_ingredients, get_instructions, \
+    get_image_url, get_meal_type
+from test.fixtures import FIXTURES, read_fixture
+
+
+def extract_by_get_functions(table):
+    """
+    Build the recipe dict by calling every get_* extractor, as scrape_food_recipe_page did
+    """
+    recipe_id = get_id(table)
+    if not recipe_id:
+        return None
+    prep_time, cook_time = get_time(table)
+    values = [('id', recipe_id), ('name', get_name(table)),
+              ('description', get_description(table)), ('image url', get_image_url(table)),
+              ('yields', get_yields(table)), ('prep time', prep_time), ('cook time', cook_time),
+              ('meal types', get_meal_type(table)), ('ingredients', get_ingredients(table)),
+              ('instructions', get_instructions(table)), ('popularity', get_popularity(table))]
+    return {field: value for field, value in values if value}
+
+
+def fixture_table(file_name):
+    """
+    Get the generic table of the saved page in fixtures directory
+    """
+    soup = parse_soup(read_fixture(file_name), RECIPE_PAGE_STRAINER)
+    return soup.find('table', class_='generic')
+
+
+class TestExtractor(unittest.TestCase):
+    """
+    Test class for extractor.py
+    """
+
+    def test_extract_matches_get_functions(self):
+        """
+        Test method extract gives the same dict as the get_* extractors
+        """
+        for file_name in FIXTURES:
+            table = fixture_table(file_name)
+            self.assertEqual(extract_by_get_functions(table), RECIPE_EXTRACTOR.extract(table))
+
+    def test_extract_first_match_in_document_order(self):
+        """
+        Test that single value fields take the first match in document order, as find does
+        """
+        table = BeautifulSoup('<table class="generic"><tr><td>'
+                              '<div><div class="imgFrame"><a href="/r?rid=1">'
+                              '<img src="deep.jpg"/></a></div></div>'
+                              '<img src="shallow.jpg"/>'
+                              '<div class="top"><span>no name</span></div>'
+                              '<div class="top"><h1 class="fn">Second top</h1></div>'
+                              '</td></tr></table>', 'html.parser').table
+        self.assertEqual(extract_by_get_functions(table), RECIPE_EXTRACTOR.extract(table))
+        self.assertEqual('deep.jpg', RECIPE_EXTRACTOR.extract(table)['image url'])
+
+    def test_extract_no_id(self):
+        """
+        Test method extract returns None without id, no image frame or no id in its link
+        """
+        table = BeautifulSoup('<table class="generic"><tr><td><div class="top">'
+                              '<h1 class="fn">No Id</h1></div></td></tr></table>',
+                              'html.parser').table
+        self.assertEqual(None, RECIPE_EXTRACTOR.extract(table))
+        table = BeautifulSoup('<table class="generic"><tr><td>'
+                              '<div class="imgFrame"><a href="/r?rid="><img src="x.jpg"/></a></div>'
+                              '<div class="top"><h1 class="fn">N</h1></div></td></tr></table>',
+                              'html.parser').table
+        self.assertEqual(None, RECIPE_EXTRACTOR.extract(table))
+        self.assertEqual(extract_by_get_functions(table), RECIPE_EXTRACTOR.extract(table))
+
+    def test_minutes_of(self):
+        """
+        Test method minutes_of
+        """
+        self.assertEqual(15, minutes_of('15 mins'))
+        self.assertEqual(120, minutes_of('"2 hr"'))
+        self.assertEqual(75, minutes_of(' 1 hr 15 mins '))
+
+    def test_int_of(self):
+        """
+        Test method int_of, with thousands separators of the most popular recipes
+        """
+        self.assertEqual(6, int_of('6'))
+        self.assertEqual(1234, int_of('1,234'))
+        self.assertEqual(1234567, int_of(' 1,234,567 '))
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertIsNone(int_of('many'))
+            self.assertIsNone(int_of(''))
+
+    def test_id_of(self):
+        """
+        Test method id_of
+        """
+        self.assertEqual('52389300', id_of('/Diary.aspx?pa=rrec&rid=52389300 '))
+        self.assertEqual('123', id_of('123'))
+
+
+if __name__ == '__main__':
+    unittest.main()
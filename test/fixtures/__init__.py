@@ -0,0 +1,15 @@
+"""
+Saved food recipe pages used by the tests of parsing and extraction
+"""
+import os
+
+FIXTURES_DIR = os.path.dirname(__file__)
+FIXTURES = ['recipe_energy_bites.html', 'recipe_low_carb_pancakes.html']
+
+
+def read_fixture(file_name):
+    """
+    Read the saved page in fixtures directory
+    """
+    with open(os.path.join(FIXTURES_DIR, file_name), 'rb') as file:
+        return file.read()
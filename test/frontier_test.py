@@ -0,0 +1,77 @@
+"""
+Test module for frontier
+"""
+import os
+import tempfile
+import unittest
+
+from scraper.frontier import CrawlFrontier
+
+
+class TestCrawlFrontier(unittest.TestCase):
+    """
+    Test class for frontier.py
+    """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'frontier.jsonl')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_resume_from_journal(self):
+        """
+        Test that a loaded journal has the listing pages and recipes done before the interruption
+        """
+        frontier = CrawlFrontier(self.path)
+        frontier.start('http://host/Default.aspx', 'default', 5)
+        frontier.add_listing_urls(['http://host/Default.aspx?pg=0',
+                                   'http://host/Default.aspx?pg=1'])
+        frontier.complete_listing('http://host/Default.aspx?pg=0', ['r1', 'r2', 'r3'])
+        frontier.complete_recipe('r1', '1')
+        frontier.complete_recipe('r3', '3')
+        # interruption cuts the last line
+        with open(self.path, 'a') as file:
+            file.write('{"event": "recipe do')
+
+        resumed = CrawlFrontier.load(self.path)
+        self.assertEqual('http://host/Default.aspx', resumed.url)
+        self.assertEqual('default', resumed.scrape_type)
+        self.assertEqual(5, resumed.target_number)
+        self.assertEqual(2, resumed.stored)
+        self.assertEqual({'1', '3'}, resumed.done_recipe_ids)
+        self.assertEqual(['r2'], resumed.pending_recipe_urls())
+        self.assertTrue(resumed.is_listing_done('http://host/Default.aspx?pg=0'))
+        self.assertFalse(resumed.is_listing_done('http://host/Default.aspx?pg=1'))
+
+        # progress after resume is appended to the same journal
+        resumed.complete_recipe('r2', '2')
+        self.assertEqual([], CrawlFrontier.load(self.path).pending_recipe_urls())
+
+    def test_start_replaces_journal(self):
+        """
+        Test that starting a crawl forgets the progress of the previous one
+        """
+        frontier = CrawlFrontier(self.path)
+        frontier.start('http://host/a', 'default', 5)
+        frontier.complete_recipe('r1', '1')
+        frontier = CrawlFrontier(self.path)
+        frontier.start('http://host/b', 'meal_type', 3)
+        resumed = CrawlFrontier.load(self.path)
+        self.assertEqual('http://host/b', resumed.url)
+        self.assertEqual(0, resumed.stored)
+
+    def test_finish_removes_journal(self):
+        """
+        Test that nothing is left to resume after the crawl is over
+        """
+        frontier = CrawlFrontier(self.path)
+        frontier.start('http://host/a', 'default', 5)
+        frontier.finish()
+        self.assertFalse(os.path.exists(self.path))
+        self.assertIsNone(CrawlFrontier.load(self.path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+"""
+Test module for http cache
+"""
+import os
+import tempfile
+import time
+import unittest
+
+from scraper.http_cache import HttpCache
+
+URL1 = 'https://www.fatsecret.com/recipes/52389300-energy-bites/Default.aspx'
+URL2 = 'https://www.fatsecret.com/recipes/low-carb-pancakes/Default.aspx'
+
+
+class TestHttpCache(unittest.TestCase):
+    """
+    Test class for http_cache.py
+    """
+
+    def setUp(self):
+        """
+        Create an empty cache in a temporary directory
+        """
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = HttpCache(self.directory.name, max_size=100, max_age=60)
+
+    def tearDown(self):
+        """
+        Remove the temporary directory
+        """
+        self.directory.cleanup()
+
+    def test_store_and_lookup(self):
+        """
+        Test methods store, lookup, read_body, conditional_headers
+        """
+        self.assertEqual(None, self.cache.lookup(URL1))
+        self.cache.store(URL1, b'energy bites', {'etag': '"abc"'})
+        entry = self.cache.lookup(URL1)
+        self.assertEqual(b'energy bites', self.cache.read_body(entry))
+        self.assertEqual({'If-None-Match': '"abc"'}, self.cache.conditional_headers(entry))
+        self.cache.store(URL2, b'pancakes', {'last-modified': 'Mon, 01 Mar 2021 00:00:00 GMT'})
+        self.assertEqual({'If-Modified-Since': 'Mon, 01 Mar 2021 00:00:00 GMT'},
+                         self.cache.conditional_headers(self.cache.lookup(URL2)))
+
+    def test_same_body_stored_once(self):
+        """
+        Test that identical bodies of different urls share one file
+        """
+        self.cache.store(URL1, b'same page', {})
+        self.cache.store(URL2, b'same page', {})
+        objects_dir = os.path.join(self.directory.name, 'objects')
+        self.assertEqual(1, sum(len(files) for _, _, files in os.walk(objects_dir)))
+
+    def test_evict(self):
+        """
+        Test method evict by age and by size
+        """
+        self.cache.store(URL1, b'a' * 60, {})
+        self.cache.store(URL2, b'b' * 60, {})
+        self.cache.evict()
+        # only the most recent entry fits in max_size
+        self.assertEqual(None, self.cache.lookup(URL1))
+        self.assertNotEqual(None, self.cache.lookup(URL2))
+        self.cache.max_age = 0
+        time.sleep(0.01)
+        self.cache.evict()
+        self.assertEqual(None, self.cache.lookup(URL2))
+
+
+if __name__ == '__main__':
+    unittest.main()
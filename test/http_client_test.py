@@ -0,0 +1,119 @@
+"""
+Test module for http client
+"""
+import gzip
+import threading
+import time
+import unittest
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import URLError, HTTPError
+
+from scraper.constant import HTTP_BACKOFF_MAX
+from scraper.http_client import HttpClient, HttpResponse, decode_body, is_retryable, \
+    set_cache_only_mode, inherit_cache_only_mode
+from scraper.rate_limit import RateLimiter
+
+
+class TestHttpClient(unittest.TestCase):
+    """
+    Test class for http_client.py
+    Pooling of connections is measured by bench/http_bench.py against the stub server.
+    """
+
+    def test_decode_body(self):
+        """
+        Test method decode_body
+        """
+        body = b'<table class="generic"></table>'
+        raw_deflate = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+        raw_deflate_body = raw_deflate.compress(body) + raw_deflate.flush()
+        self.assertEqual(body, decode_body(body, None))
+        self.assertEqual(body, decode_body(gzip.compress(body), 'gzip'))
+        self.assertEqual(body, decode_body(zlib.compress(body), 'deflate'))
+        self.assertEqual(body, decode_body(raw_deflate_body, 'deflate'))
+        self.assertEqual(body, decode_body(body, 'identity'))
+
+
+    def test_is_retryable(self):
+        """
+        Test that network errors and throttling or server errors are retried, others are not
+        """
+        self.assertTrue(is_retryable(URLError(ConnectionRefusedError())))
+        self.assertTrue(is_retryable(HTTPError('url', 503, 'Service Unavailable', {}, None)))
+        self.assertTrue(is_retryable(HTTPError('url', 429, 'Too Many Requests', {}, None)))
+        self.assertFalse(is_retryable(HTTPError('url', 404, 'Not Found', {}, None)))
+        self.assertFalse(is_retryable(URLError('unknown url type: ftp')))
+
+    def test_throttled_fetch(self):
+        """
+        Test that a Retry-After longer than HTTP_BACKOFF_MAX gives the url up and pauses
+        the host for HTTP_BACKOFF_MAX at most, and that client errors keep the rate
+        """
+        rate_limiter = RateLimiter(4, 1, 10, 1, 0.5)
+        client = HttpClient(rate_limiter=rate_limiter, max_retries=3)
+        sent = []
+
+        def respond(status, headers):
+            def request_once(url, _):
+                sent.append(url)
+                return HttpResponse(url, status, 'reason', headers, b'')
+            client._request_once = request_once  # pylint: disable=protected-access
+
+        respond(429, {'retry-after': '3600'})
+        start = time.monotonic()
+        with self.assertRaises(HTTPError):
+            client.get('http://host/recipe')
+        self.assertEqual(1, len(sent))
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual(2, rate_limiter.rate_of('host'))
+        bucket = rate_limiter._get_bucket('host')  # pylint: disable=protected-access
+        paused_for = bucket.paused_until - time.monotonic()
+        self.assertTrue(0 < paused_for <= HTTP_BACKOFF_MAX)
+
+        rate_limiter = RateLimiter(4, 1, 10, 1, 0.5)
+        client.rate_limiter = rate_limiter
+        respond(404, {})
+        with self.assertRaises(HTTPError):
+            client.get('http://host/recipe')
+        self.assertEqual(4, rate_limiter.rate_of('host'))
+        respond(200, {})
+        self.assertEqual(b'', client.get('http://host/recipe'))
+        self.assertEqual(5, rate_limiter.rate_of('host'))
+
+    def test_cache_only_mode(self):
+        """
+        Test that cache-only mode is set per thread and inherited by worker threads,
+        without changing the setting of the client shared with other threads
+        """
+        client = HttpClient()
+
+        def fetch_error(cache_only=None):
+            # the url cannot be fetched, the error tells whether the network was tried
+            try:
+                client.get('ftp://example.com/recipe', cache_only)
+            except URLError as err:
+                return 'not cached' in str(err.reason)
+            return None
+
+        self.assertFalse(fetch_error())
+        self.assertTrue(fetch_error(cache_only=True))
+        set_cache_only_mode(True)
+        try:
+            self.assertTrue(fetch_error())
+            self.assertFalse(fetch_error(cache_only=False))
+            other_thread = []
+            thread = threading.Thread(target=lambda: other_thread.append(fetch_error()))
+            thread.start()
+            thread.join()
+            self.assertEqual([False], other_thread)
+            with ThreadPoolExecutor(max_workers=2, initializer=inherit_cache_only_mode()) as pool:
+                self.assertEqual([True, True], list(pool.map(lambda _: fetch_error(), range(2))))
+        finally:
+            set_cache_only_mode(None)
+        self.assertFalse(client.cache_only)
+        self.assertFalse(fetch_error())
+
+
+if __name__ == '__main__':
+    unittest.main()
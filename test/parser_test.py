@@ -0,0 +1,82 @@
+"""
+Test module for html parser backends
+"""
+import contextlib
+import importlib.util
+import io
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+
+from scraper.scraper import parse_soup, RECIPE_PAGE_STRAINER, get_id, get_name, get_time, \
+    get_yields, get_popularity, get_description, get_ingredients, get_instructions, \
+    get_image_url, get_meal_type, parse_recipe_page, scrape_food_recipe_page
+from test.fixtures import FIXTURES, read_fixture
+
+EXTRACTORS = [get_id, get_name, get_time, get_yields, get_popularity, get_description,
+              get_ingredients, get_instructions, get_image_url, get_meal_type]
+
+
+def extract_all(html, parser, restricted):
+    """
+    Get the output of every get_* extractor on the page
+    """
+    soup = parse_soup(html, RECIPE_PAGE_STRAINER, parser, restricted)
+    table = soup.find('table', class_='generic')
+    return [extractor(table) for extractor in EXTRACTORS]
+
+
+class TestParser(unittest.TestCase):
+    """
+    Test class for parser backends and restricted parse in scraper.py
+    """
+
+    def test_restricted_parse(self):
+        """
+        Test that restricted parse gives the same output as parsing the whole page
+        """
+        for file_name in FIXTURES:
+            html = read_fixture(file_name)
+            self.assertEqual(extract_all(html, 'html.parser', False),
+                             extract_all(html, 'html.parser', True))
+
+    @unittest.skipIf(importlib.util.find_spec('lxml') is None, 'lxml is not installed')
+    def test_lxml_backend(self):
+        """
+        Test that lxml gives the same output as html.parser
+        """
+        for file_name in FIXTURES:
+            html = read_fixture(file_name)
+            expected = extract_all(html, 'html.parser', False)
+            self.assertEqual(expected, extract_all(html, 'lxml', False))
+            self.assertEqual(expected, extract_all(html, 'lxml', True))
+
+    def test_fixture_values(self):
+        """
+        Test values extracted from the saved pages
+        """
+        energy_bites = extract_all(read_fixture(FIXTURES[0]), 'html.parser', True)
+        self.assertEqual('52389300', energy_bites[0])
+        self.assertEqual((15, None), energy_bites[2])
+        self.assertEqual(None, energy_bites[4])
+        pancakes = extract_all(read_fixture(FIXTURES[1]), 'html.parser', True)
+        self.assertEqual('23613877', pancakes[0])
+        self.assertEqual((5, 5), pancakes[2])
+        self.assertEqual(10, pancakes[4])
+
+
+    def test_parse_in_process_pool(self):
+        """
+        Test that a parser process returns the same recipe dict as parsing in this process
+        """
+        url = 'https://www.fatsecret.com/recipes/52389300-energy-bites/Default.aspx'
+        with contextlib.redirect_stdout(io.StringIO()):
+            for file_name in FIXTURES:
+                html = read_fixture(file_name)
+                expected = scrape_food_recipe_page(url, parse_soup(html, RECIPE_PAGE_STRAINER))
+                with ProcessPoolExecutor(max_workers=1) as parser_pool:
+                    self.assertEqual(expected,
+                                     parser_pool.submit(parse_recipe_page, url, html).result())
+
+
+if __name__ == '__main__':
+    unittest.main()
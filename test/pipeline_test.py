@@ -0,0 +1,91 @@
+"""
+Test module for pipeline
+"""
+import threading
+import time
+import unittest
+
+from scraper.pipeline import Pipeline
+
+
+class TestPipeline(unittest.TestCase):
+    """
+    Test class for pipeline.py
+    """
+
+    def test_items_go_through_stages(self):
+        """
+        Test that output of each stage is the input of the next, and None drops the item
+        """
+        results = []
+        dropped = []
+        lock = threading.Lock()
+
+        def on_result(item):
+            with lock:
+                results.append(item)
+
+        def on_drop(stage_name, item):
+            with lock:
+                dropped.append((stage_name, item))
+
+        pipeline = Pipeline([('double', lambda x: x * 2, 3),
+                             ('odd only', lambda x: None if x % 4 == 0 else x, 2),
+                             ('add one', lambda x: x + 1, 1)],
+                            2, on_result, on_drop).start()
+        for i in range(10):
+            pipeline.put(i)
+        pipeline.close()
+        self.assertEqual([3, 7, 11, 15, 19], sorted(results))
+        self.assertEqual([0, 4, 8, 12, 16], sorted(item for _, item in dropped))
+        self.assertEqual({'odd only'}, {stage_name for stage_name, _ in dropped})
+        self.assertEqual(10, pipeline.stats()['double']['processed'])
+        self.assertEqual(5, pipeline.stats()['add one']['processed'])
+
+    def test_error_drops_item(self):
+        """
+        Test that an error in a stage function drops the item without stopping the worker
+        """
+        dropped = []
+        pipeline = Pipeline([('divide', lambda x: 10 // x, 1)], 4, None,
+                            lambda stage_name, item: dropped.append(item)).start()
+        for i in [1, 0, 2]:
+            pipeline.put(i)
+        pipeline.close()
+        self.assertEqual([0], dropped)
+        self.assertEqual(3, pipeline.stats()['divide']['processed'])
+
+    def test_initializer(self):
+        """
+        Test that the initializer is called by each worker thread before its first item
+        """
+        local = threading.local()
+        initialized = []
+
+        def initialize():
+            local.name = threading.current_thread().name
+            initialized.append(local.name)
+
+        results = []
+        pipeline = Pipeline([('first', lambda x: (x, local.name), 2), ('second', lambda x: x, 1)],
+                            2, results.append, initializer=initialize).start()
+        for i in range(4):
+            pipeline.put(i)
+        pipeline.close()
+        self.assertEqual(['first-0', 'first-1', 'second-0'], sorted(initialized))
+        self.assertEqual(list(range(4)), sorted(item for item, _ in results))
+
+    def test_queue_is_bounded(self):
+        """
+        Test that a slow stage keeps the queue before it within queue size
+        """
+        pipeline = Pipeline([('fast', lambda x: x, 1), ('slow', lambda x: time.sleep(0.01), 1)],
+                            3).start()
+        for i in range(20):
+            pipeline.put(i)
+        pipeline.close()
+        self.assertTrue(pipeline.stats()['slow']['max queued'] <= 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
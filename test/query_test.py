@@ -3,7 +3,10 @@ Test module for query
 """
 import unittest
 
-from api.query import parser, parse_single_query, divide_query_string_and_parse, check_content_type
+from api.query import parser, parse_single_query, divide_query_string_and_parse, \
+    check_content_type, parse, compiled_query, Condition, LogicalExpression, Negation, Query, \
+    QueryCache, QUERY_CACHE, EQUALS, CONTAINS, SEARCH, TEXT_FIELD, INVALID_PAGE, searches_of, \
+    parse_page, cursor_of, after_filter
 
 
 class TestQuery(unittest.TestCase):
@@ -35,7 +38,12 @@ class TestQuery(unittest.TestCase):
         self.assertEqual(-2, parse_single_query(invalid_q1))
         self.assertEqual(-4, parse_single_query(invalid_q2))
         self.assertEqual(('all', {'id': '555'}), parse_single_query(valid_q1))
-        self.assertEqual(('fav', {'cook time': {'$ne': '33'}}), parse_single_query(valid_q2))
+        self.assertEqual(('fav', {'cook time': {'$ne': 33}}), parse_single_query(valid_q2))
+        # numeric fields are compared as stored, id is converted
+        self.assertEqual(('all', {'cook time': {'$gt': 30}}),
+                         parse_single_query('all.cook time: > 30'))
+        self.assertEqual(('all', {'$expr': {'$lt': [{'$toInt': '$id'}, 9]}}),
+                         parse_single_query('all.id: < 9'))
 
     def test_divide_query_string_and_parse(self):
         """
@@ -46,7 +54,7 @@ class TestQuery(unittest.TestCase):
         valid_q = 'all.cook time: 20 AND all.id: 111'
         self.assertEqual(-3, divide_query_string_and_parse(invalid_q1))
         self.assertEqual(-4, divide_query_string_and_parse(invalid_q2))
-        self.assertEqual(('all', {'$and': [{'cook time': '20'}, {'id': '111'}]}),
+        self.assertEqual(('all', {'$and': [{'cook time': 20}, {'id': '111'}]}),
                          divide_query_string_and_parse(valid_q))
 
     def test_check_content_type(self):
@@ -62,6 +70,111 @@ class TestQuery(unittest.TestCase):
         self.assertEqual(0, check_content_type(field_name, cont_str))
         self.assertEqual(0, check_content_type(field_name, cont_int))
 
+    def test_parse(self):
+        """
+        Test method parse gives the Query of conditions with values of the type of the field
+        """
+        conditions = [Condition('cook time', '$gt', 30), Condition('name', SEARCH, 'cake')]
+        self.assertEqual(Query('all', LogicalExpression('$and', conditions)),
+                         parse('all.cook time: > 30 AND all.name: cake'))
+        self.assertEqual(Query('fav', Condition('id', EQUALS, '7')), parse('fav.id: 7'))
+        self.assertEqual(-5, parse('all.yields: many'))
+        self.assertEqual(-6, parse('all.name: < 3'))
+
+    def test_grammar(self):
+        """
+        Test precedence, grouping, NOT of conditions and groups, and BETWEEN
+        """
+        name_a, name_b = Condition('name', SEARCH, 'a'), Condition('name', SEARCH, 'b')
+        yields = Condition('yields', EQUALS, 2)
+        name_b_and_not_yields = LogicalExpression('$and', [name_b, Negation(yields)])
+        self.assertEqual(LogicalExpression('$or', [name_a, name_b_and_not_yields]),
+                         parse('all.name: a OR all.name: b AND NOT all.yields: 2').expression)
+        not_name_a_or_b = Negation(LogicalExpression('$or', [name_a, name_b]))
+        self.assertEqual(LogicalExpression('$and', [not_name_a_or_b, yields]),
+                         parse('NOT (all.name: a OR all.name: b) AND all.yields: 2').expression)
+        self.assertEqual(('all', {'$nor': [{'cook time': {'$gte': 10, '$lte': 30}}]}),
+                         compiled_query('NOT all.cook time: BETWEEN 10 AND 30'))
+        # operators written next to conditions, and words in content, as sent before
+        self.assertEqual(LogicalExpression('$and', [name_a, yields]),
+                         parse('all.name:aANDall.yields:2').expression)
+        self.assertEqual(Condition('name', SEARCH, 'ORANGE (fresh)'),
+                         parse('all.name: ORANGE (fresh)').expression)
+        self.assertEqual(-1, parse('(all.name: a OR all.name: b'))
+        self.assertEqual(-1, parse('all.name: a) AND all.yields: 2'))
+        self.assertEqual(-3, parse('(all.name: a OR fav.name: b)'))
+        self.assertEqual(-6, parse('all.name: BETWEEN 1 AND 2'))
+
+    def test_search(self):
+        """
+        Test words are searched as prefixes of terms, other content as escaped regex
+        """
+        self.assertEqual(('all', {'$and': [
+            {'name terms': {'$elemMatch': {'$gte': 'bak', '$lt': 'bal'}}},
+            {'name terms': {'$elemMatch': {'$gte': 'chicken', '$lt': 'chickeo'}}}]}),
+            compiled_query('all.name: Baked the Chicken'))
+        self.assertEqual(('all', {'name': {'$regex': r'.*the.*'}}), compiled_query('all.name: the'))
+        self.assertEqual(('fav', {'meal types': {'$regex': r'.*a\.\*b.*'}}),
+                         compiled_query('fav.meal types: a.*b'))
+        # text searches every text attribute, NOT of text excludes the words
+        text_filter = compiled_query('all.text: soup')[1]
+        self.assertEqual(4, len(text_filter['$or']))
+        self.assertEqual(Negation(Condition(TEXT_FIELD, SEARCH, 'soup')),
+                         parse('all.text: NOT soup').expression)
+        self.assertEqual(-6, parse('all.text: > 3'))
+        # NOT of a text attribute excludes the words, not only the exact content
+        self.assertEqual(('all', {'$nor': [
+            {'name terms': {'$elemMatch': {'$gte': 'cak', '$lt': 'cal'}}}]}),
+            compiled_query('all.name: NOT cake'))
+        self.assertEqual(('fav', {'$nor': [{'meal types': {'$regex': r'.*Lunch.*'}}]}),
+                         compiled_query('fav.meal types: NOT Lunch'))
+        self.assertEqual(('all', {'id': {'$ne': '42'}}), compiled_query('all.id: NOT 42'))
+        # words searched are found for ranking, not the excluded ones
+        self.assertEqual([('name', 'cak'), ('ingredients', 'cak')],
+                         searches_of(compiled_query('all.name: cake AND all.ingredients: cake '
+                                                    'AND NOT all.description: cake')[1]))
+
+    def test_parse_page(self):
+        """
+        Test methods parse_page, cursor_of and after_filter of the pages of search results
+        """
+        self.assertEqual((50, 'id', None), parse_page(None, None, None, False))
+        self.assertEqual((10, 'id', None), parse_page('10', None, None, True))
+        self.assertEqual((10, 'relevance', None), parse_page('10', 'relevance', None, True))
+        cursor = cursor_of('-popularity', 95, '7')
+        self.assertEqual((5, '-popularity', (95, '7')), parse_page('5', '-popularity', cursor,
+                                                                   False))
+        for limit, sort, page_cursor in [('0', None, None), ('ten', None, None),
+                                         ('1001', None, None), (None, 'relevance', None),
+                                         (None, 'name', None), (None, 'popularity', cursor),
+                                         (None, '-popularity', 'not a cursor')]:
+            self.assertEqual(INVALID_PAGE, parse_page(limit, sort, page_cursor, False))
+
+        self.assertEqual({'id': {'$gt': '7'}}, after_filter('id', 1, '7', '7'))
+        self.assertEqual({'$or': [{'popularity': {'$lt': 95}},
+                                  {'popularity': 95, 'id': {'$lt': '7'}},
+                                  {'popularity': None}]}, after_filter('popularity', -1, 95, '7'))
+        # a missing field is first in ascending order
+        self.assertEqual({'$or': [{'yields': {'$ne': None}}, {'yields': None, 'id': {'$gt': '7'}}]},
+                         after_filter('yields', 1, None, '7'))
+
+    def test_query_cache(self):
+        """
+        Test compiled queries are cached by query string and least recently used are evicted
+        """
+        QUERY_CACHE.clear()
+        self.assertEqual(('all', {'name': {'$regex': '.*.*'}}), compiled_query('all.name:'))
+        self.assertIs(compiled_query('all.name:'), compiled_query(' all.name: '))
+        self.assertEqual(-4, compiled_query('all.what: no'))
+        self.assertEqual({'hits': 2, 'misses': 2, 'size': 2}, QUERY_CACHE.stats())
+
+        cache = QueryCache(2)
+        for query_string in ['a', 'b', 'a', 'c']:
+            cache.get(query_string, str.upper)
+        self.assertEqual({'hits': 1, 'misses': 3, 'size': 2}, cache.stats())
+        self.assertEqual('A', cache.get('a', str.lower))
+        self.assertEqual('b', cache.get('b', str.lower))
+
 
 if __name__ == '__main__':
     unittest.main()
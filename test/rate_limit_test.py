@@ -0,0 +1,94 @@
+"""
+Test module for rate limit
+"""
+import email.utils
+import os
+import time
+import unittest
+
+from scraper.rate_limit import RateLimiter, backoff_delay, retry_after_seconds
+
+
+class TestRateLimit(unittest.TestCase):
+    """
+    Test class for rate_limit.py
+    """
+
+    def test_rate_adapts(self):
+        """
+        Test that the rate goes up on success and down on throttle, within its bounds
+        """
+        rate_limiter = RateLimiter(4, 1, 5, 0.5, 0.5)
+        rate_limiter.record_success('host')
+        self.assertEqual(4.5, rate_limiter.rate_of('host'))
+        for _ in range(10):
+            rate_limiter.record_success('host')
+        self.assertEqual(5, rate_limiter.rate_of('host'))
+        rate_limiter.record_throttle('host')
+        self.assertEqual(2.5, rate_limiter.rate_of('host'))
+        for _ in range(10):
+            rate_limiter.record_throttle('host')
+        self.assertEqual(1, rate_limiter.rate_of('host'))
+        # other hosts keep their own rate
+        self.assertEqual(4, rate_limiter.rate_of('other host'))
+
+    def test_acquire_paces_requests(self):
+        """
+        Test that requests to a host are sent at its rate, and Retry-After pauses the host
+        """
+        rate_limiter = RateLimiter(50, 1, 50, 0, 1)
+        start = time.monotonic()
+        for _ in range(6):
+            rate_limiter.acquire('host')
+        # first request uses the burst token, the next 5 wait 1/50s each
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+        rate_limiter.record_throttle('host', retry_after=0.2)
+        start = time.monotonic()
+        rate_limiter.acquire('host')
+        self.assertGreaterEqual(time.monotonic() - start, 0.19)
+
+    def test_backoff_delay(self):
+        """
+        Test that back off is random within the exponential bound and the cap
+        """
+        for attempt in range(8):
+            delay = backoff_delay(attempt, 0.5, 10)
+            self.assertTrue(0 <= delay <= min(10, 0.5 * 2 ** attempt))
+
+    def test_retry_after_seconds(self):
+        """
+        Test reading Retry-After in seconds and as an HTTP date
+        """
+        self.assertEqual(120, retry_after_seconds('120'))
+        self.assertIsNone(retry_after_seconds(None))
+        self.assertIsNone(retry_after_seconds('soon'))
+        retry_at = email.utils.formatdate(time.time() + 60, usegmt=True)
+        self.assertTrue(55 <= retry_after_seconds(retry_at) <= 60)
+        self.assertEqual(0, retry_after_seconds('Thu, 01 Jan 2015 00:00:00 GMT'))
+
+    @unittest.skipUnless(hasattr(time, 'tzset'), 'the time zone cannot be changed')
+    def test_retry_after_date_in_other_time_zone(self):
+        """
+        Test that an HTTP date in Retry-After is read as UTC when the local time zone is not,
+        with the -0000 zone parsed as a naive datetime too
+        """
+        local_time_zone = os.environ.get('TZ')
+        os.environ['TZ'] = 'Asia/Tokyo'
+        time.tzset()
+        try:
+            for usegmt in (True, False):
+                retry_at = email.utils.formatdate(time.time() + 60, usegmt=usegmt)
+                self.assertTrue(55 <= retry_after_seconds(retry_at) <= 60, retry_at)
+            retry_at = email.utils.formatdate(time.time() + 60).replace('+0000', '-0000')
+            self.assertTrue(55 <= retry_after_seconds(retry_at) <= 60, retry_at)
+        finally:
+            if local_time_zone is None:
+                del os.environ['TZ']
+            else:
+                os.environ['TZ'] = local_time_zone
+            time.tzset()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -35,19 +35,19 @@ class TestRecipeScraper(unittest.TestCase):
         """
         global TABLE_LIST
         prep0, cook0 = get_time(TABLE_LIST[0])
-        self.assertEqual('15', prep0)
+        self.assertEqual(15, prep0)
         self.assertEqual(None, cook0)
         prep1, cook1 = get_time(TABLE_LIST[1])
-        self.assertEqual('5', prep1)
-        self.assertEqual('5', cook1)
+        self.assertEqual(5, prep1)
+        self.assertEqual(5, cook1)
 
     def test_get_yields(self):
         """
         Test method get_yields
         """
         global TABLE_LIST
-        self.assertEqual('6', get_yields(TABLE_LIST[0]))
-        self.assertEqual('1', get_yields(TABLE_LIST[1]))
+        self.assertEqual(6, get_yields(TABLE_LIST[0]))
+        self.assertEqual(1, get_yields(TABLE_LIST[1]))
 
     def test_get_popularity(self):
         """
@@ -55,7 +55,7 @@ class TestRecipeScraper(unittest.TestCase):
         """
         global TABLE_LIST
         self.assertEqual(None, get_popularity(TABLE_LIST[0]))
-        self.assertEqual('10', get_popularity(TABLE_LIST[1]))
+        self.assertEqual(10, get_popularity(TABLE_LIST[1]))
 
     def test_get_image_url(self):
         """
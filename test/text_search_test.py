@@ -0,0 +1,59 @@
+"""
+Test module for text_search
+"""
+import unittest
+
+from scraper.text_search import words_of, stem, search_terms_of, terms_of, terms_values_of, \
+    prefix_range_of, relevance_of
+
+
+class TestTextSearch(unittest.TestCase):
+    """
+    Test class for text_search.py
+    """
+
+    def test_words_of(self):
+        """
+        Test method words_of
+        """
+        self.assertEqual(['creme', 'brulee', '2', 'eggs'], words_of('Crème Brûlée: 2 eggs!'))
+        self.assertEqual([], words_of('--'))
+
+    def test_stem(self):
+        """
+        Test method stem gives one stem for the forms of a word
+        """
+        for words in (['bake', 'baked', 'baking', 'bakes'], ['chop', 'chopped', 'chopping'],
+                      ['tomato', 'tomatoes'], ['berry', 'berries'], ['dish', 'dishes']):
+            self.assertEqual(1, len({stem(word) for word in words}), words)
+        self.assertEqual('string', stem('string'))
+        self.assertEqual('bed', stem('bed'))
+        self.assertEqual('2000', stem('2000'))
+
+    def test_terms_of(self):
+        """
+        Test methods search_terms_of, terms_of and terms_values_of
+        """
+        self.assertEqual(['bak', 'chicken', 'lemon'],
+                         search_terms_of('Baked Chicken with Lemon and baking'))
+        self.assertEqual(['flour', 'sugar'], terms_of(['Sugar', 'flour', 7]))
+        self.assertEqual({'name terms': ['pie'], 'ingredients terms': ['appl']},
+                         terms_values_of({'name': 'Pie', 'ingredients': ['apples'],
+                                          'yields': 2}))
+
+    def test_relevance_of(self):
+        """
+        Test methods prefix_range_of and relevance_of, terms found in the name count the most
+        """
+        self.assertEqual({'$gte': 'chick', '$lt': 'chicl'}, prefix_range_of('chick'))
+        in_name = {'name terms': ['chicken', 'soup'], 'ingredients terms': ['water']}
+        in_ingredients = {'name terms': ['soup'], 'ingredients terms': ['chicken', 'water']}
+        searches = [(attribute, 'chicken') for attribute in ('name', 'ingredients')]
+        self.assertEqual(8, relevance_of(in_name, searches))
+        self.assertEqual(4, relevance_of(in_ingredients, searches))
+        self.assertEqual(4, relevance_of(in_name, [('name', 'chick')]))
+        self.assertEqual(0, relevance_of({}, searches))
+
+
+if __name__ == '__main__':
+    unittest.main()
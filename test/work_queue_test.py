@@ -0,0 +1,181 @@
+"""
+Test module for work_queue, run against a local mongod
+"""
+import time
+import unittest
+
+import pymongo
+
+from scraper.database import Database, get_mongo_client
+from scraper.work_queue import CrawlWorkQueue, START, LISTING, RECIPE, DONE, FAILED
+
+CRAWL_ID = 'work queue test'
+URL = 'https://www.fatsecret.com/Default.aspx?pa=rs'
+
+
+def connect_local_mongod():
+    """
+    Get a Database connected to the local mongod, None if it is not running
+    """
+    mongo_db = Database(get_mongo_client())
+    # the client of Database waits 30 seconds for a server, the check waits 1 second
+    host, port = mongo_db.client.topology_description.server_descriptions().popitem()[0]
+    try:
+        pymongo.MongoClient(host, port, serverSelectionTimeoutMS=1000).admin.command('ping')
+    except pymongo.errors.PyMongoError:
+        return None
+    return mongo_db
+
+
+class TestWorkQueue(unittest.TestCase):
+    """
+    Test class for work_queue.py
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.mongo_db = connect_local_mongod()
+        if cls.mongo_db is None:
+            raise unittest.SkipTest('local mongod is not running')
+
+    def setUp(self):
+        self.clear()
+        self.first = CrawlWorkQueue(self.mongo_db, CRAWL_ID, 'first', lease_timeout=0.2)
+        self.second = CrawlWorkQueue(self.mongo_db, CRAWL_ID, 'second', lease_timeout=0.2)
+        self.first.open(URL, 'default', 2)
+        self.second.open(URL, 'default', 5)
+
+    def tearDown(self):
+        self.clear()
+
+    def clear(self):
+        """
+        Delete the documents of the test crawl
+        """
+        self.mongo_db.crawl_queue_tb.delete_many({'crawl': CRAWL_ID})
+        self.mongo_db.crawls_tb.delete_many({'_id': CRAWL_ID})
+        self.mongo_db.crawl_nodes_tb.delete_many({'crawl': CRAWL_ID})
+
+    def test_lease(self):
+        """
+        Test that a task is leased by one node only, and again by another node once expired
+        """
+        # the start task is added once, the target of the first node wins
+        self.assertEqual(2, self.mongo_db.crawls_tb.find_one({'_id': CRAWL_ID})['target number'])
+        start_task = self.first.lease(START)
+        self.assertEqual(URL, start_task['url'])
+        self.assertIsNone(self.second.lease(START))
+        self.assertEqual(2, self.first.enqueue(['listing 1', 'listing 2'], LISTING))
+        self.assertEqual(1, self.second.enqueue(['listing 2', 'listing 3'], LISTING))
+        self.first.complete(start_task)
+
+        listing_task = self.first.lease(LISTING)
+        self.assertEqual('listing 1', listing_task['url'])
+        self.assertEqual('listing 2', self.second.lease(LISTING)['url'])
+        time.sleep(0.3)
+        # the lease of the first node expired, e.g. the node died
+        self.assertEqual('listing 1', self.second.lease(LISTING)['url'])
+        # completion by the node that lost the lease is ignored and not counted
+        self.assertFalse(self.first.complete(listing_task))
+        self.assertFalse(self.first.fail(listing_task))
+        self.assertNotEqual(DONE, self.mongo_db.crawl_queue_tb.find_one(
+            {'crawl': CRAWL_ID, 'url': 'listing 1'})['state'])
+        self.assertFalse(self.first.is_drained())
+        stats = {node['node']: node for node in self.first.node_stats()}
+        self.assertEqual((1, 0), (stats['first']['done'], stats['first']['failed']))
+
+        # a lease lost to a later lease of the same node is not completed either
+        time.sleep(0.3)
+        lost_task = self.first.lease(LISTING)
+        time.sleep(0.3)
+        task = self.first.lease(LISTING)
+        self.assertEqual(lost_task['url'], task['url'])
+        self.assertFalse(self.first.complete(lost_task))
+        self.assertTrue(self.first.complete(task))
+
+    def test_fail(self):
+        """
+        Test that a failed task is retried until WORK_MAX_ATTEMPTS leases
+        """
+        self.first.enqueue(['recipe 1'], RECIPE)
+        for _ in range(3):
+            task = self.first.lease(RECIPE)
+            self.assertEqual('recipe 1', task['url'])
+            self.first.fail(task)
+        self.assertIsNone(self.second.lease(RECIPE))
+        self.assertEqual(FAILED, self.mongo_db.crawl_queue_tb.find_one(
+            {'crawl': CRAWL_ID, 'url': 'recipe 1'})['state'])
+
+    def test_reserve_recipe(self):
+        """
+        Test that no more recipes than the target are reserved, and the node counters
+        """
+        self.first.enqueue(['recipe 1', 'recipe 2', 'recipe 3'], RECIPE)
+        first_task = self.first.lease(RECIPE)
+        second_task = self.second.lease(RECIPE)
+        third_task = self.first.lease(RECIPE)
+        self.assertTrue(self.first.reserve_recipe(first_task))
+        self.assertTrue(self.second.reserve_recipe(second_task))
+        self.assertFalse(self.first.reserve_recipe(third_task))
+        # a recipe that cannot be scraped frees its reservation
+        self.second.unreserve_recipe(second_task)
+        self.assertTrue(self.first.reserve_recipe(third_task))
+        self.assertTrue(self.first.complete(first_task, stored=True))
+        self.assertFalse(self.first.is_target_reached())
+        self.assertTrue(self.first.complete(third_task, stored=True))
+        self.assertTrue(self.first.is_target_reached())
+
+        self.second.release(second_task)
+        stats = {node['node']: node for node in self.first.node_stats()}
+        self.assertEqual(2, stats['first']['stored'])
+        self.assertEqual(2, stats['first']['leased'])
+        self.assertEqual(1, stats['second']['leased'])
+        self.assertEqual(0, stats['second']['done'])
+        self.assertFalse(self.first.is_drained())
+        self.first.complete(self.first.lease(START))
+        self.first.complete(self.first.lease(RECIPE))
+        self.assertTrue(self.first.is_drained())
+
+    def test_reservation_of_dead_node(self):
+        """
+        Test that the reservation of a node dying before it finishes its recipe is freed
+        with its lease, so another node still reaches the target
+        """
+        self.first.enqueue(['recipe 1', 'recipe 2', 'recipe 3'], RECIPE)
+        self.assertTrue(self.first.reserve_recipe(self.first.lease(RECIPE)))
+        # the first node dies here, its recipe is in flight until its lease expires
+        second_task = self.second.lease(RECIPE)
+        self.assertTrue(self.second.reserve_recipe(second_task))
+        third_task = self.second.lease(RECIPE)
+        self.assertFalse(self.second.reserve_recipe(third_task))
+        self.second.release(third_task)
+        self.assertTrue(self.second.complete(second_task, stored=True))
+        time.sleep(0.3)
+
+        task = self.second.lease(RECIPE)
+        self.assertEqual('recipe 1', task['url'])
+        self.assertTrue(self.second.reserve_recipe(task))
+        self.assertTrue(self.second.complete(task, stored=True))
+        self.assertTrue(self.second.is_target_reached())
+
+    def test_store_after_lost_lease(self):
+        """
+        Test that the recipe of a node that lost its lease is not counted as stored,
+        only the recipe of the node holding the lease is
+        """
+        self.first.enqueue(['recipe 1'], RECIPE)
+        lost_task = self.first.lease(RECIPE)
+        self.assertTrue(self.first.reserve_recipe(lost_task))
+        time.sleep(0.3)
+        task = self.second.lease(RECIPE)
+        self.assertTrue(self.second.reserve_recipe(task))
+        # the first node stores its recipe after its lease expired
+        self.assertFalse(self.first.complete(lost_task, stored=True))
+        self.assertEqual(0, self.mongo_db.crawls_tb.find_one({'_id': CRAWL_ID})['stored'])
+        self.assertTrue(self.second.complete(task, stored=True))
+        self.assertEqual(1, self.mongo_db.crawls_tb.find_one({'_id': CRAWL_ID})['stored'])
+        stats = {node['node']: node for node in self.first.node_stats()}
+        self.assertEqual((0, 1), (stats['first']['stored'], stats['second']['stored']))
+
+if __name__ == '__main__':
+    unittest.main()